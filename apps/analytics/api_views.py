@@ -5,9 +5,10 @@ from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from django.db.models import Sum, Count, F
-from django.db.models.functions import TruncMonth
-from operations.models import DailyRecord, Maintenance, Transaction
+from django.db.models import F, Sum
+from common import series
+from operations.models import DailyRecord, Transaction, UserMonthlyStats
+from datetime import date
 from io import BytesIO
 
 
@@ -148,30 +149,34 @@ class FiscalPreviewView(APIView):
         month = request.query_params.get("month")
         year = request.query_params.get("year")
 
-        records = DailyRecord.objects.filter(
-            user=user, date__month=month, date__year=year, is_active=False
-        )
-        total_income = float(
-            records.aggregate(Sum("total_income"))["total_income__sum"] or 0
-        )
-
-        transactions = Transaction.objects.filter(
-            record__user=user, record__date__month=month, record__date__year=year
-        )
+        try:
+            period = date(int(year), int(month), 1)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Informe month e year válidos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        # CORREÇÃO AQUI: Filtrando pela Flag
-        fuel_total = float(
-            transactions.filter(category__is_fuel=True).aggregate(Sum("amount"))[
-                "amount__sum"
-            ]
-            or 0
-        )
-        maint_total = float(
-            transactions.filter(category__is_maintenance=True).aggregate(Sum("amount"))[
-                "amount__sum"
-            ]
-            or 0
-        )
+        stats = UserMonthlyStats.objects.filter(user=user, month=period).first()
+        total_income = fuel_total = maint_total = 0.0
+        if stats:
+            # A receita fiscal considera só plantões encerrados.
+            open_income = (
+                DailyRecord.objects.filter(
+                    user=user,
+                    is_active=True,
+                    date__year=period.year,
+                    date__month=period.month,
+                )
+                .values_list("total_income", flat=True)
+                .first()
+            )
+            total_income = float(stats.income - (open_income or 0))
+            # Uma categoria marcada como combustível e manutenção conta só em
+            # maint_total (a divisão dos consolidados), e o custo sai da base
+            # uma única vez.
+            fuel_total = float(stats.fuel_cost)
+            maint_total = float(stats.maintenance_cost)
 
         return Response(
             {
@@ -192,45 +197,44 @@ class MonthlyReportView(APIView):
     def get(self, request):
         user = request.user
 
-        records_qs = (
-            DailyRecord.objects.filter(user=user)
-            .annotate(month=TruncMonth("date"))
-            .values("month")
-            .annotate(
-                total_income=Sum("total_income"),
-                days=Count("id"),
-                total_km=Sum(F("end_km") - F("start_km")),
-            )
-            .order_by("-month")
-        )
-
-        ops_qs = (
-            Transaction.objects.filter(
-                record__user=user, type="COST", category__is_maintenance=False
+        # Um consolidado por mês trabalhado (ver operations.rollups), com o
+        # lucro acumulado calculado pelo banco (common.series).
+        months = list(
+            series.annotate(
+                UserMonthlyStats.objects.filter(user=user, shifts__gt=0).order_by(
+                    "-month"
+                ),
+                F("income")
+                - F("fuel_cost")
+                - F("other_cost")
+                - F("maintenance_log_cost"),
+                date_field="month",
             )
-            .annotate(month=TruncMonth("record__date"))
-            .values("month")
-            .annotate(op_cost=Sum("amount"))
         )
-        ops_dict = {item["month"]: item["op_cost"] for item in ops_qs}
-
-        maint_qs = (
-            Maintenance.objects.filter(user=user)
-            .annotate(month=TruncMonth("date"))
-            .values("month")
-            .annotate(maint_cost=Sum("cost"))
-        )
-        maint_dict = {item["month"]: item["maint_cost"] for item in maint_qs}
+        trend = {}
+        if months:
+            # Média móvel de 3 meses no calendário: mês sem plantão conta zero.
+            trend = {
+                point["date"]: point
+                for point in series.fill(
+                    months,
+                    months[-1].month,
+                    months[0].month,
+                    date_field="month",
+                    step="month",
+                    window=3,
+                )
+            }
 
         data = []
-        for item in records_qs:
-            month_date = item["month"]
+        for stats in months:
+            month_date = stats.month
 
-            op_cost = ops_dict.get(month_date, 0) or 0
-            maintenance_cost = maint_dict.get(month_date, 0) or 0
+            op_cost = stats.fuel_cost + stats.other_cost
+            maintenance_cost = stats.maintenance_log_cost
 
-            total_income = item["total_income"] or 0
-            total_km = item["total_km"] or 0
+            total_income = stats.income
+            total_km = stats.km
 
             total_cost_real = op_cost + maintenance_cost
             profit = total_income - total_cost_real
@@ -243,7 +247,7 @@ class MonthlyReportView(APIView):
                 {
                     "month": month_date.strftime("%Y-%m"),
                     "display_month": month_date.strftime("%B/%Y"),
-                    "days_worked": item["days"],
+                    "days_worked": stats.shifts,
                     "km_driven": total_km,
                     "financial": {
                         "income": total_income,
@@ -257,6 +261,12 @@ class MonthlyReportView(APIView):
                         "cost_per_km": round(cost_per_km, 2),
                         "profit_per_km": round(profit_per_km, 2),
                     },
+                    "trend": {
+                        "cumulative_profit": trend[month_date]["cumulative"],
+                        "profit_moving_average": round(
+                            trend[month_date]["average"], 2
+                        ),
+                    },
                 }
             )
 
@@ -1,3 +1,82 @@
+import datetime
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from operations.models import Category, DailyRecord, Transaction
+from vehicles.models import Vehicle
+
+
+class FiscalPreviewTests(TestCase):
+    URL = "/api/analytics/fiscal-preview/?month=1&year=2025"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista",
+            "motorista@example.com",
+            "senha-forte-123",
+            is_pro_legacy=True,
+        )
+        vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        income = Category.objects.create(user=cls.user, name="Corridas", type="INCOME")
+        fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+        repair = Category.objects.get(user=cls.user, name="Manutenção")
+        both = Category.objects.create(
+            user=cls.user,
+            name="Troca de óleo no posto",
+            type="COST",
+            is_fuel=True,
+            is_maintenance=True,
+        )
+        closed, open_ = (
+            DailyRecord.objects.create(
+                user=cls.user,
+                vehicle=vehicle,
+                date=datetime.date(2025, 1, day),
+                start_km=1000,
+                end_km=end_km,
+                is_active=end_km is None,
+            )
+            for day, end_km in ((6, 1100), (7, None))
+        )
+        for record, category, kind, amount in (
+            (closed, income, "INCOME", 500),
+            (open_, income, "INCOME", 80),
+            (closed, fuel, "COST", 100),
+            (closed, repair, "COST", 60),
+            (open_, both, "COST", 40),
+        ):
+            Transaction.objects.create(
+                record=record, category=category, type=kind, amount=amount
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_category_with_both_flags_counts_once_as_maintenance(self):
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 200)
+        # A receita só considera plantões encerrados; os custos, o mês todo.
+        self.assertEqual(response.data["total_income"], 500)
+        self.assertEqual(response.data["fuel_total"], 100)
+        self.assertEqual(response.data["maint_total"], 100)
+        self.assertEqual(response.data["tax_base"], 300)
+
+    def test_requires_pro(self):
+        self.user.is_pro_legacy = False
+        self.user.save()
+
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_period(self):
+        response = self.client.get("/api/analytics/fiscal-preview/?month=13&year=x")
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
@@ -3,12 +3,11 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.db.models import Sum, F
-from django.db.models.functions import TruncMonth
-from operations.models import DailyRecord, Maintenance, Transaction
+from django.db.models import F
+from common import series
+from operations.models import DailyRecord, UserMonthlyStats
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import models
 
 
 class MonthlyPerformanceView(LoginRequiredMixin, TemplateView):
@@ -18,53 +17,53 @@ class MonthlyPerformanceView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        daily_qs = (
-            DailyRecord.objects.filter(user=user)
-            .annotate(month=TruncMonth("date"))
-            .values("month")
-            .annotate(
-                total_income=Sum("total_income"),
-                total_km=Sum(F("end_km") - F("start_km")),
-                days_count=models.Count("id"),
+        # Um consolidado por mês trabalhado (ver operations.rollups), com o
+        # lucro de cada mês calculado pelo banco (common.series).
+        months = list(
+            series.annotate(
+                UserMonthlyStats.objects.filter(user=user, shifts__gt=0).order_by(
+                    "-month"
+                ),
+                F("income")
+                - F("fuel_cost")
+                - F("other_cost")
+                - F("maintenance_log_cost"),
+                date_field="month",
             )
-            .order_by("-month")
         )
-
-        ops_qs = (
-            Transaction.objects.filter(
-                record__user=user, type="COST", category__is_maintenance=False
-            )
-            .annotate(month=TruncMonth("record__date"))
-            .values("month")
-            .annotate(op_cost=Sum("amount"))
-        )
-        ops_dict = {item["month"]: item["op_cost"] for item in ops_qs}
-
-        maint_qs = (
-            Maintenance.objects.filter(user=user)
-            .annotate(month=TruncMonth("date"))
-            .values("month")
-            .annotate(total_maint_cost=Sum("cost"))
-        )
-        maint_dict = {item["month"]: item["total_maint_cost"] for item in maint_qs}
+        trend = {}
+        if months:
+            # Acumulado e média móvel de 3 meses no calendário: mês sem
+            # plantão conta zero.
+            trend = {
+                point["date"]: point
+                for point in series.fill(
+                    months,
+                    months[-1].month,
+                    months[0].month,
+                    date_field="month",
+                    step="month",
+                    window=3,
+                )
+            }
 
         report_data = []
-        for item in daily_qs:
-            month = item["month"]
+        for stats in months:
+            month = stats.month
 
-            income = item["total_income"] or 0
-            km = item["total_km"] or 0
+            income = stats.income
+            km = stats.km
 
-            op_cost = ops_dict.get(month, 0) or 0
-            maint_cost = maint_dict.get(month, 0) or 0
+            op_cost = stats.fuel_cost + stats.other_cost
+            maint_cost = stats.maintenance_log_cost
 
             total_cost = op_cost + maint_cost
-            profit = income - total_cost
+            profit = stats.series_value
 
             report_data.append(
                 {
                     "month": month,
-                    "days": item["days_count"],
+                    "days": stats.shifts,
                     "km": km,
                     "income": income,
                     "total_cost": total_cost,
@@ -73,6 +72,8 @@ class MonthlyPerformanceView(LoginRequiredMixin, TemplateView):
                     "profit": profit,
                     "income_per_km": (income / km) if km > 0 else 0,
                     "cost_per_km": (total_cost / km) if km > 0 else 0,
+                    "cumulative_profit": trend[month]["cumulative"],
+                    "profit_average": trend[month]["average"],
                 }
             )
 
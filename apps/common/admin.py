@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Banner
+from .models import Banner, Job
 
 
 @admin.register(Banner)
@@ -13,3 +13,11 @@ class BannerAdmin(admin.ModelAdmin):
         return obj.clicks
 
     show_clicks.short_description = "Cliques Totais"
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "dedupe_key", "status", "attempts", "run_after", "locked_by")
+    list_filter = ("status", "name")
+    search_fields = ("name", "dedupe_key", "last_error")
+    readonly_fields = ("created_at", "updated_at", "locked_at", "locked_by", "last_error")
@@ -1,7 +1,8 @@
 from django.urls import path
-from .api_views import BannerListView, BannerClickView
+from .api_views import BannerListView, BannerClickView, WriteMetricsView
 
 urlpatterns = [
     path("banners/", BannerListView.as_view(), name="api_banners"),
     path("banners/<int:pk>/click/", BannerClickView.as_view(), name="api_banner_click"),
+    path("metrics/writes/", WriteMetricsView.as_view(), name="api_write_metrics"),
 ]
\ No newline at end of file
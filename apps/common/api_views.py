@@ -2,6 +2,7 @@ from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from . import metrics
 from .models import Banner
 from .serializers import BannerSerializer
 
@@ -41,3 +42,15 @@ class BannerClickView(APIView):
             banner.save()
 
         return Response({"link": banner.link}, status=status.HTTP_200_OK)
+
+
+class WriteMetricsView(APIView):
+    """
+    Percentis (p50/p95/p99) de queries, tempo no banco e tempo de view dos
+    caminhos de escrita instrumentados, mais a query mais lenta de cada um.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.report())
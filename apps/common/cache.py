@@ -0,0 +1,120 @@
+"""
+Versões de dados por entidade, guardadas num cache compartilhado.
+
+Cada entidade (um veículo, um usuário) tem uma versão no cache, e os dados
+derivados dela ficam em chaves que incluem essa versão: uma escrita troca a
+versão e as chaves antigas simplesmente deixam de ser lidas (expiram
+sozinhas pelo TIMEOUT). A versão é o instante da última troca em
+nanossegundos, sempre acima da anterior, então também serve de
+Last-Modified sem ler os dados.
+
+vehicles.cache e core.cache são instâncias de VersionedCache. O backend
+precisa ser compartilhado entre os processos (ver common.checks).
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class VersionedCache:
+    def __init__(self, prefix, alias_setting, timeout_setting):
+        self.prefix = prefix
+        self.alias_setting = alias_setting
+        self.timeout_setting = timeout_setting
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, self.alias_setting, "default")]
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.timeout_setting, 60 * 60 * 24)
+
+    def version_key(self, pk):
+        return f"{self.prefix}:{pk}:version"
+
+    def key(self, pk, version, name):
+        return f"{self.prefix}:{pk}:{version}:{name}"
+
+    def get_version(self, pk):
+        """
+        Versão atual da entidade. Quando a chave some (expirou ou foi
+        descartada pelo backend) recomeça a partir do relógio, sempre acima
+        de qualquer versão anterior, para nunca reaproveitar dados antigos.
+        """
+        key = self.version_key(pk)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def get_versions(self, pks):
+        """{pk: versão} numa ida ao cache (mais uma por versão ausente)."""
+        keys = {pk: self.version_key(pk) for pk in pks}
+        found = self.cache.get_many(keys.values())
+        return {
+            pk: found[key] if key in found else self.get_version(pk)
+            for pk, key in keys.items()
+        }
+
+    def _bump(self, pks):
+        keys = [self.version_key(pk) for pk in pks]
+        current = self.cache.get_many(keys)
+        now = time.time_ns()
+        # Duas trocas concorrentes gravam valores novos; nenhuma volta a uma
+        # versão já usada.
+        self.cache.set_many(
+            {key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None
+        )
+
+    def bump_version(self, *pks):
+        """
+        Invalida os dados das entidades informadas. Troca a versão na hora e
+        de novo após o commit: uma leitura concorrente que tenha guardado
+        dados anteriores ao commit com a versão intermediária também é
+        descartada.
+        """
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return
+
+        self._bump(pks)
+        transaction.on_commit(lambda: self._bump(pks))
+
+    def get_or_build(self, pk, version, name, builder):
+        """Lê `name` da `version` informada ou o monta com `builder()`."""
+        key = self.key(pk, version, name)
+        value = self.cache.get(key)
+        if value is None:
+            value = builder()
+            self.cache.set(key, value, timeout=self.timeout)
+        return value
+
+    def get_or_build_many(self, pks, name, builder):
+        """
+        {pk: valor} das entidades informadas, lidos em duas idas ao cache
+        (versões e valores). Os que faltam são montados juntos por
+        `builder(pks_faltantes)`, que devolve {pk: valor}.
+        """
+        versions = self.get_versions(pks)
+        keys = {pk: self.key(pk, version, name) for pk, version in versions.items()}
+
+        found = self.cache.get_many(keys.values())
+        values = {pk: found[key] for pk, key in keys.items() if key in found}
+        missing = [pk for pk in keys if pk not in values]
+        if missing:
+            built = builder(missing)
+            self.cache.set_many(
+                {keys[pk]: built[pk] for pk in missing}, timeout=self.timeout
+            )
+            values.update(built)
+        return values
+
+
+def modified(version):
+    """Last-Modified (segundos desde a época) de uma versão."""
+    return version // 10**9
@@ -0,0 +1,61 @@
+"""
+Verificações de sistema (manage.py check) da configuração de cache.
+
+As versões de dados de vehicles.cache (e dos demais caches versionados)
+só invalidam os blocos de todos os processos se o cache for compartilhado.
+Um backend local a cada processo, como o LocMemCache, deixa os outros
+workers do gunicorn servindo dados antigos até o TIMEOUT. Com os jobs em
+fila a exigência vale mesmo com um só worker web, pois quem invalida é o
+processo de `run_workers`.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_cache_aliases():
+    """(alias, uso) dos caches que todos os processos precisam enxergar."""
+    vehicle_stats = getattr(settings, "VEHICLE_STATS_CACHE", "default")
+    dashboard = getattr(settings, "DASHBOARD_CACHE", "default")
+    yield vehicle_stats, "estatísticas dos veículos (VEHICLE_STATS_CACHE)"
+    yield dashboard, "resumo da dashboard (DASHBOARD_CACHE)"
+    metrics = getattr(settings, "WRITE_METRICS", {})
+    if metrics.get("ENABLED", True):
+        yield (
+            metrics.get("CACHE", "default"),
+            "métricas de escrita (WRITE_METRICS['CACHE'])",
+        )
+    if getattr(settings, "JOBS", {}).get("MODE") == "queue":
+        # Os jobs de run_workers invalidam esses caches de outro processo.
+        usage = "invalidações dos jobs em fila (JOBS['MODE'] = 'queue')"
+        yield vehicle_stats, usage
+        yield dashboard, usage
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    usages = {}
+    for alias, usage in shared_cache_aliases():
+        usages.setdefault(alias, []).append(usage)
+
+    errors = []
+    for alias, alias_usages in usages.items():
+        backend = settings.CACHES.get(alias, {}).get("BACKEND")
+        if backend in PROCESS_LOCAL_BACKENDS:
+            errors.append(
+                Error(
+                    f"O cache '{alias}', usado em {', '.join(alias_usages)}, "
+                    f"é local a cada processo ({backend}).",
+                    hint=(
+                        "Use um backend compartilhado (DatabaseCache, Redis "
+                        "ou Memcached) para este alias."
+                    ),
+                    id="common.E001",
+                )
+            )
+    return errors
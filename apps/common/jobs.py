@@ -0,0 +1,162 @@
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco.
+
+Os apps registram funções com `@register("nome")` e pedem a execução com
+`enqueue("nome", payload, key=...)`. Com JOBS["MODE"] = "sync" (padrão) a
+função roda na hora, dentro da requisição, como sempre rodou. Com "queue" o
+job é gravado só depois do commit da escrita principal e executado pelos
+workers de `manage.py run_workers`; jobs pendentes com a mesma `key` se
+agrupam num só.
+
+Os workers reservam jobs com SELECT ... FOR UPDATE SKIP LOCKED quando o
+banco suporta; no SQLite cada reserva é um UPDATE condicional (só um worker
+consegue mudar o job de PENDING para RUNNING). Jobs reservados por um
+worker que morreu voltam à fila depois de JOBS["LEASE_SECONDS"].
+"""
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "MODE": "sync",
+    "BATCH_SIZE": 20,
+    "POLL_SECONDS": 1.0,
+    "LEASE_SECONDS": 300,
+    "MAX_ATTEMPTS": 5,
+}
+
+registry = {}
+
+
+def config(key):
+    return getattr(settings, "JOBS", {}).get(key, DEFAULTS[key])
+
+
+def deferred():
+    """True quando os jobs vão para a fila em vez de rodar na hora."""
+    return config("MODE") == "queue"
+
+
+def register(name):
+    def decorator(func):
+        registry[name] = func
+        return func
+
+    return decorator
+
+
+def _insert(name, payload, key):
+    try:
+        with transaction.atomic():
+            Job.objects.create(name=name, payload=payload, dedupe_key=key)
+    except IntegrityError:
+        # Já há um job pendente com a mesma chave: ele fará o trabalho.
+        pass
+
+
+def enqueue(name, payload=None, key=""):
+    """
+    Pede a execução do job `name`. No modo "queue" o job só é gravado
+    depois do commit da transação atual (nada fica na fila se a escrita
+    for desfeita).
+    """
+    if name not in registry:
+        raise KeyError(f"Job desconhecido: {name}")
+    payload = payload or {}
+
+    if not deferred():
+        registry[name](**payload)
+        return
+
+    transaction.on_commit(lambda: _insert(name, payload, key))
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    lease = now - timedelta(seconds=config("LEASE_SECONDS"))
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_at__lt=lease)
+    )
+
+
+def claim(worker, limit=None):
+    """Reserva até `limit` jobs para `worker` e devolve a lista."""
+    limit = limit or config("BATCH_SIZE")
+    now = timezone.now()
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(
+                _claimable(now)
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:limit]
+            )
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, locked_at=now, locked_by=worker
+            )
+    else:
+        jobs = []
+        for job in _claimable(now).order_by("id")[:limit]:
+            won = (
+                _claimable(now)
+                .filter(pk=job.pk, status=job.status, locked_at=job.locked_at)
+                .update(status=Job.RUNNING, locked_at=now, locked_by=worker)
+            )
+            if won:
+                jobs.append(job)
+    return jobs
+
+
+def run(job):
+    """
+    Executa um job reservado. Sucesso apaga o job; falha volta para a fila
+    com espera crescente até JOBS["MAX_ATTEMPTS"], depois fica FAILED.
+    """
+    try:
+        with transaction.atomic():
+            registry[job.name](**job.payload)
+    except Exception:
+        attempts = job.attempts + 1
+        failed = attempts >= config("MAX_ATTEMPTS")
+        logger.exception("Job %s (%s) falhou", job.pk, job.name)
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.FAILED if failed else Job.PENDING,
+                    attempts=attempts,
+                    run_after=timezone.now() + timedelta(seconds=2**attempts),
+                    locked_at=None,
+                    locked_by="",
+                    last_error=traceback.format_exc(),
+                )
+        except IntegrityError:
+            # Outro job pendente com a mesma chave já cobre esta tentativa.
+            Job.objects.filter(pk=job.pk).delete()
+        return False
+
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Reserva e executa um lote. Devolve quantos jobs foram processados."""
+    jobs = claim(worker or worker_id(), limit)
+    for job in jobs:
+        run(job)
+    return len(jobs)
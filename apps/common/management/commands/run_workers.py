@@ -0,0 +1,92 @@
+import multiprocessing
+import signal
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from common import jobs
+
+
+def work(index, options):
+    """Laço de um worker: reserva e executa lotes até receber SIGTERM."""
+    django.setup()
+    worker = f"{jobs.worker_id()}#{index}"
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        close_old_connections()
+        done = jobs.run_pending(worker, options["batch_size"])
+        if options["once"] and not done:
+            break
+        if not done:
+            time.sleep(options["poll"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa os jobs em segundo plano (common.jobs) com N processos. "
+        "Só é necessário com JOBS_MODE=queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Quantidade de processos worker.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=jobs.config("BATCH_SIZE"),
+            help="Jobs reservados por vez em cada worker.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=jobs.config("POLL_SECONDS"),
+            help="Espera (segundos) quando a fila está vazia.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Esvazia a fila e sai (útil em cron e testes).",
+        )
+
+    def handle(self, *args, **options):
+        count = max(1, options["workers"])
+        options = {key: options[key] for key in ("batch_size", "poll", "once")}
+
+        if count == 1:
+            work(0, options)
+            return
+
+        # Cada processo abre as próprias conexões.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(index, options), daemon=True)
+            for index in range(count)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"{count} workers iniciados.")
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+        self.stdout.write(self.style.SUCCESS("Workers encerrados."))
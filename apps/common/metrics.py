@@ -0,0 +1,229 @@
+"""
+Instrumentação dos caminhos de escrita.
+
+Views marcadas com `metrics_tag` têm as requisições de escrita (POST, PUT,
+PATCH, DELETE) medidas por WriteMetricsMiddleware: número de queries, tempo
+total no banco, a query mais lenta e o tempo da view. Trechos internos (o
+sinal de totais, por exemplo) são medidos com `measure()`.
+
+As amostras ficam num buffer circular por processo; de tempos em tempos
+(WRITE_METRICS["FLUSH_SECONDS"]) cada processo publica o seu buffer no
+cache, e `report()` junta os buffers de todos os processos vivos para
+calcular os percentis. O custo por requisição é um execute_wrapper e alguns
+perf_counter(); o banco só é tocado no flush, e apenas se o cache for o
+DatabaseCache.
+
+WRITE_METRICS["CACHE"] precisa ser um cache compartilhado entre os
+processos (ver common.checks): num LocMemCache cada processo só enxerga o
+próprio buffer e o relatório sai por processo.
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+DEFAULTS = {
+    "ENABLED": True,
+    "CACHE": "default",
+    # Amostras guardadas por endpoint em cada processo.
+    "WINDOW": 500,
+    "FLUSH_SECONDS": 30,
+    "SQL_MAX_LENGTH": 500,
+}
+
+INDEX_KEY = "write_metrics:processes"
+PERCENTILES = (50, 95, 99)
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def config(key):
+    return getattr(settings, "WRITE_METRICS", {}).get(key, DEFAULTS[key])
+
+
+class QueryTimer:
+    """execute_wrapper que conta queries, soma o tempo e guarda a mais lenta."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_sql = ""
+        self.slowest_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.slowest_seconds:
+                self.slowest_seconds = elapsed
+                self.slowest_sql = sql
+
+
+class Recorder:
+    """Buffer circular de amostras por endpoint, deste processo."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=config("WINDOW")))
+        self.last_flush = time.monotonic()
+        self.process_key = f"write_metrics:{socket.gethostname()}:{os.getpid()}"
+
+    def add(self, name, timer, seconds):
+        sample = {
+            "queries": timer.count,
+            "db_ms": round(timer.seconds * 1000, 2),
+            "view_ms": round(seconds * 1000, 2),
+            "slowest_ms": round(timer.slowest_seconds * 1000, 2),
+            "slowest_sql": timer.slowest_sql[: config("SQL_MAX_LENGTH")],
+        }
+        with self.lock:
+            self.samples[name].append(sample)
+            due = time.monotonic() - self.last_flush >= config("FLUSH_SECONDS")
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {name: list(samples) for name, samples in self.samples.items()}
+
+    def flush(self):
+        """Publica o buffer deste processo no cache (com índice de processos)."""
+        cache = caches[config("CACHE")]
+        timeout = config("FLUSH_SECONDS") * 10
+        with self.lock:
+            self.last_flush = time.monotonic()
+        cache.set(self.process_key, self.snapshot(), timeout)
+
+        index = cache.get(INDEX_KEY) or {}
+        now = time.time()
+        index = {k: seen for k, seen in index.items() if now - seen < timeout}
+        index[self.process_key] = now
+        cache.set(INDEX_KEY, index, timeout)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+
+recorder = Recorder()
+
+
+@contextmanager
+def measure(name):
+    """Mede as queries e o tempo do bloco como uma amostra de `name`."""
+    if not config("ENABLED"):
+        yield
+        return
+
+    timer = QueryTimer()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(timer):
+            yield
+    finally:
+        recorder.add(name, timer, time.perf_counter() - start)
+
+
+def percentile(values, pct):
+    """Percentil por posição mais próxima (`values` já ordenados)."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(samples):
+    result = {"count": len(samples)}
+    for field in ("view_ms", "db_ms", "queries"):
+        values = sorted(s[field] for s in samples)
+        result[field] = {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+        result[field]["max"] = values[-1] if values else None
+
+    slowest = max(samples, key=lambda s: s["slowest_ms"], default=None)
+    result["slowest_query"] = (
+        {"ms": slowest["slowest_ms"], "sql": slowest["slowest_sql"]}
+        if slowest and slowest["slowest_sql"]
+        else None
+    )
+    return result
+
+
+def report():
+    """
+    Percentis por endpoint juntando os buffers publicados por todos os
+    processos (o deste processo entra sempre, mesmo antes do flush).
+    """
+    cache = caches[config("CACHE")]
+    buffers = {recorder.process_key: recorder.snapshot()}
+    keys = [k for k in cache.get(INDEX_KEY) or {} if k != recorder.process_key]
+    buffers.update(cache.get_many(keys))
+
+    merged = defaultdict(list)
+    for snapshot in buffers.values():
+        for name, samples in snapshot.items():
+            merged[name].extend(samples)
+
+    return {
+        "processes": len(buffers),
+        "endpoints": {name: summarize(merged[name]) for name in sorted(merged)},
+    }
+
+
+def endpoint_name(request, view_func):
+    """
+    Nome do endpoint para a requisição, ou None se a view não é medida.
+    ViewSets do DRF usam a ação (TransactionViewSet → transactions.create).
+    """
+    if request.method not in UNSAFE_METHODS:
+        return None
+
+    view_class = getattr(view_func, "view_class", None) or getattr(
+        view_func, "cls", None
+    )
+    tag = getattr(view_class, "metrics_tag", None)
+    if not tag:
+        return None
+
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+    else:
+        action = request.method.lower()
+    return f"{tag}.{action}"
+
+
+class WriteMetricsMiddleware:
+    """
+    Mede as requisições de escrita das views com `metrics_tag`. Deve ser o
+    último middleware, para a medição começar logo antes da view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        stack = getattr(request, "_write_metrics", None)
+        if stack is not None:
+            stack.close()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not config("ENABLED"):
+            return None
+
+        name = endpoint_name(request, view_func)
+        if name is not None:
+            request._write_metrics = ExitStack()
+            request._write_metrics.enter_context(measure(name))
+        return None
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_alter_banner_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('name', models.CharField(max_length=100, verbose_name='Tarefa')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('dedupe_key', models.CharField(blank=True, max_length=100, verbose_name='Chave de Agrupamento')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('RUNNING', 'Executando'), ('FAILED', 'Falhou')], default='PENDING', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar a partir de')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Reservado em')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último Erro')),
+            ],
+            options={
+                'verbose_name': 'Tarefa em Segundo Plano',
+                'verbose_name_plural': 'Tarefas em Segundo Plano',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='common_job_status_309534_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'PENDING'), models.Q(('dedupe_key', ''), _negated=True)), fields=('name', 'dedupe_key'), name='unique_pending_job_per_key')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class TimeStampedModel(models.Model):
@@ -27,3 +28,48 @@ class Banner(TimeStampedModel):
 
     def __str__(self):
         return self.title
+
+
+class Job(TimeStampedModel):
+    """
+    Tarefa em segundo plano (ver common.jobs). Jobs concluídos são
+    apagados; os que esgotam as tentativas ficam como FAILED para análise.
+    """
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    FAILED = "FAILED"
+    STATUS_CHOICES = (
+        (PENDING, "Pendente"),
+        (RUNNING, "Executando"),
+        (FAILED, "Falhou"),
+    )
+
+    name = models.CharField("Tarefa", max_length=100)
+    payload = models.JSONField("Parâmetros", default=dict, blank=True)
+    dedupe_key = models.CharField("Chave de Agrupamento", max_length=100, blank=True)
+    status = models.CharField(
+        "Status", max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField("Tentativas", default=0)
+    run_after = models.DateTimeField("Executar a partir de", default=timezone.now)
+    locked_at = models.DateTimeField("Reservado em", null=True, blank=True)
+    locked_by = models.CharField("Worker", max_length=100, blank=True)
+    last_error = models.TextField("Último Erro", blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "run_after"])]
+        constraints = [
+            # Um só job pendente por chave: rajadas de escrita se agrupam.
+            models.UniqueConstraint(
+                fields=["name", "dedupe_key"],
+                condition=models.Q(status="PENDING") & ~models.Q(dedupe_key=""),
+                name="unique_pending_job_per_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
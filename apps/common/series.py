@@ -0,0 +1,144 @@
+"""
+Séries temporais para gráficos: valor por período, acumulado e média móvel
+sobre um calendário completo (períodos sem dados entram com zero).
+
+`annotate` pendura no queryset as window functions (Window(Sum(...),
+order_by=data)): o valor do período, o acumulado, que pode recomeçar a cada
+mês ou ano, e o total corrido. `fill` percorre o calendário gerado entre
+`start` e `end` e preenche as lacunas. A média móvel dos últimos `window`
+períodos é a diferença entre totais corridos, então períodos vazios contam
+como zero. `build` junta os dois passos.
+
+O queryset deve ter no máximo uma linha por período, como os consolidados
+de operations.rollups.
+"""
+
+from datetime import timedelta
+
+from django.db.models import F, Sum, Window
+from django.db.models.functions import TruncMonth, TruncYear
+
+STEPS = ("day", "month")
+RESETS = {"month": TruncMonth, "year": TruncYear}
+
+
+def shift(date, step, periods):
+    """`date` deslocada `periods` períodos (negativo volta no tempo)."""
+    if step == "day":
+        return date + timedelta(days=periods)
+    months = date.year * 12 + date.month - 1 + periods
+    return date.replace(year=months // 12, month=months % 12 + 1, day=1)
+
+
+def calendar(start, end, step="day"):
+    """Datas de `start` a `end` (inclusive), dia a dia ou mês a mês."""
+    if step not in STEPS:
+        raise ValueError(f"Passo desconhecido: {step}")
+    if step == "month":
+        start = start.replace(day=1)
+    date = start
+    while date <= end:
+        yield date
+        date = shift(date, step, 1)
+
+
+def _bucket(date, step):
+    return date if step == "day" else (date.year, date.month)
+
+
+def _partition(date, reset):
+    if reset == "month":
+        return (date.year, date.month)
+    if reset == "year":
+        return date.year
+    return None
+
+
+def annotate(queryset, value, *, date_field="date", reset=None):
+    """
+    Anota `series_value`, `series_cumulative` (recomeça a cada `reset`,
+    "month" ou "year") e `series_running` (total corrido desde a primeira
+    linha do queryset), tudo calculado pelo banco.
+    """
+    order_by = F(date_field).asc()
+    partition_by = [RESETS[reset](date_field)] if reset is not None else None
+    return queryset.annotate(
+        series_value=value,
+        series_cumulative=Window(
+            Sum(value), partition_by=partition_by, order_by=order_by
+        ),
+        series_running=Window(Sum(value), order_by=order_by),
+    )
+
+
+def _get(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def fill(rows, start, end, *, date_field="date", step="day", reset=None, window=None):
+    """
+    [{"date", "value", "cumulative"[, "average"]}] de cada período do
+    calendário, a partir das linhas anotadas por `annotate`. Linhas fora do
+    calendário não aparecem nem entram na média; antes de completar `window`
+    períodos, a média usa os períodos disponíveis.
+    """
+    rows = sorted(rows, key=lambda row: _get(row, date_field))
+    position = 0
+    cumulative = running = 0
+    partition = before_start = None
+    points, totals = [], []
+
+    for date in calendar(start, end, step):
+        bucket = _bucket(date, step)
+        value = 0
+        while position < len(rows):
+            row = rows[position]
+            row_date = _get(row, date_field)
+            if _bucket(row_date, step) > bucket:
+                break
+            if _bucket(row_date, step) == bucket:
+                value = _get(row, "series_value") or 0
+            cumulative = _get(row, "series_cumulative") or 0
+            running = _get(row, "series_running") or 0
+            partition = _partition(row_date, reset)
+            position += 1
+
+        if before_start is None:
+            before_start = running - value
+        if reset is not None and partition != _partition(date, reset):
+            cumulative, partition = 0, _partition(date, reset)
+        totals.append(running - before_start)
+
+        point = {"date": date, "value": value, "cumulative": cumulative}
+        if window:
+            previous = totals[-1 - window] if len(totals) > window else 0
+            point["average"] = (totals[-1] - previous) / min(len(totals), window)
+        points.append(point)
+    return points
+
+
+def build(
+    queryset,
+    value,
+    start,
+    end,
+    *,
+    date_field="date",
+    step="day",
+    reset=None,
+    window=None,
+):
+    """Série de `start` a `end` numa única consulta: filtra, anota e preenche."""
+    queryset = queryset.filter(
+        **{f"{date_field}__gte": start, f"{date_field}__lte": end}
+    )
+    rows = annotate(queryset, value, date_field=date_field, reset=reset)
+    return fill(
+        rows,
+        start,
+        end,
+        date_field=date_field,
+        step=step,
+        reset=reset,
+        window=window,
+    )
@@ -1,3 +1,473 @@
-from django.test import TestCase
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from operations.models import Category, DailyRecord, UserDailyStats
+from vehicles.models import Vehicle
+
+from . import jobs, metrics, series
+from .checks import check_shared_caches
+from .models import Job
+
+QUEUE = {"MODE": "queue", "BATCH_SIZE": 20, "LEASE_SECONDS": 300, "MAX_ATTEMPTS": 3}
+
+LOCAL = "django.core.cache.backends.locmem.LocMemCache"
+SHARED = "django.core.cache.backends.db.DatabaseCache"
+
+
+class JobTestMixin:
+    """Registra jobs de teste sem tocar no registro dos apps."""
+
+    def setUp(self):
+        self.calls = []
+        patcher = mock.patch.dict(
+            jobs.registry,
+            {"tests.record": self.record, "tests.fail": self.fail_job},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, value=None):
+        self.calls.append(value)
+
+    def fail_job(self, value=None):
+        # O efeito colateral deve ser desfeito junto com a falha.
+        Job.objects.create(name="tests.side_effect")
+        raise RuntimeError("falhou")
+
+
+class EnqueueTests(JobTestMixin, TestCase):
+    def test_sync_mode_runs_immediately(self):
+        with override_settings(JOBS={"MODE": "sync"}):
+            jobs.enqueue("tests.record", {"value": 1}, key="a")
+
+        self.assertEqual(self.calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_unknown_job_raises(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue("tests.desconhecido")
+
+    @override_settings(JOBS=QUEUE)
+    def test_queue_mode_writes_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue("tests.record", {"value": 1}, key="a")
+            self.assertFalse(Job.objects.exists())
+
+        job = Job.objects.get()
+        self.assertEqual(job.payload, {"value": 1})
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(self.calls, [])
+
+    @override_settings(JOBS=QUEUE)
+    def test_pending_jobs_with_same_key_are_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue("tests.record", {"value": 1}, key="a")
+            jobs.enqueue("tests.record", {"value": 2}, key="a")
+            jobs.enqueue("tests.record", {"value": 3}, key="b")
+            jobs.enqueue("tests.record", {"value": 4})
+            jobs.enqueue("tests.record", {"value": 5})
+
+        self.assertEqual(
+            sorted(Job.objects.values_list("dedupe_key", flat=True)),
+            ["", "", "a", "b"],
+        )
+
+    @override_settings(JOBS=QUEUE)
+    def test_running_job_does_not_block_new_one(self):
+        Job.objects.create(name="tests.record", dedupe_key="a", status=Job.RUNNING)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue("tests.record", key="a")
+
+        self.assertEqual(Job.objects.filter(dedupe_key="a").count(), 2)
+
+    @override_settings(JOBS=QUEUE)
+    def test_rolled_back_write_enqueues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    jobs.enqueue("tests.record", key="a")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOBS=QUEUE)
+class ClaimTests(JobTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.ready = Job.objects.create(name="tests.record")
+        self.later = Job.objects.create(
+            name="tests.record", run_after=now + timedelta(minutes=5)
+        )
+        self.expired = Job.objects.create(
+            name="tests.record",
+            status=Job.RUNNING,
+            locked_at=now - timedelta(seconds=301),
+            locked_by="morto",
+        )
+        self.leased = Job.objects.create(
+            name="tests.record",
+            status=Job.RUNNING,
+            locked_at=now - timedelta(seconds=10),
+            locked_by="vivo",
+        )
+        self.failed = Job.objects.create(name="tests.record", status=Job.FAILED)
+
+    def assert_claims(self):
+        claimed = jobs.claim("w1")
+
+        self.assertEqual([job.pk for job in claimed], [self.ready.pk, self.expired.pk])
+        for job in Job.objects.filter(pk__in=[self.ready.pk, self.expired.pk]):
+            self.assertEqual(job.status, Job.RUNNING)
+            self.assertEqual(job.locked_by, "w1")
+        self.assertEqual(Job.objects.get(pk=self.leased.pk).locked_by, "vivo")
+        # O que já foi reservado não volta para o próximo worker.
+        self.assertEqual(jobs.claim("w2"), [])
+
+    def test_claim_with_skip_locked(self):
+        with mock.patch.object(
+            connection.features, "has_select_for_update_skip_locked", True
+        ):
+            self.assert_claims()
+
+    def test_claim_with_conditional_update(self):
+        with mock.patch.object(
+            connection.features, "has_select_for_update_skip_locked", False
+        ):
+            self.assert_claims()
+
+    def test_claim_respects_limit(self):
+        self.assertEqual([job.pk for job in jobs.claim("w1", limit=1)], [self.ready.pk])
+
+    def test_conditional_update_skips_jobs_taken_meanwhile(self):
+        claimable = jobs._claimable
+        calls = []
+
+        def racing(now):
+            calls.append(now)
+            if len(calls) == 2:
+                # Outro worker reserva o primeiro job entre a leitura e o UPDATE.
+                Job.objects.filter(pk=self.ready.pk).update(
+                    status=Job.RUNNING, locked_at=now, locked_by="w2"
+                )
+            return claimable(now)
+
+        with mock.patch.object(
+            connection.features, "has_select_for_update_skip_locked", False
+        ), mock.patch.object(jobs, "_claimable", racing):
+            claimed = jobs.claim("w1")
+
+        self.assertEqual([job.pk for job in claimed], [self.expired.pk])
+        self.assertEqual(Job.objects.get(pk=self.ready.pk).locked_by, "w2")
+
+
+@override_settings(JOBS=QUEUE)
+class RunTests(JobTestMixin, TestCase):
+    def claimed(self, name, **fields):
+        Job.objects.create(name=name, payload={"value": 1}, **fields)
+        return jobs.claim("w1")[0]
+
+    def test_success_deletes_job(self):
+        job = self.claimed("tests.record")
+
+        self.assertTrue(jobs.run(job))
+        self.assertEqual(self.calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failure_retries_with_backoff(self):
+        job = self.claimed("tests.fail", attempts=1)
+        before = timezone.now()
+
+        with self.assertLogs("common.jobs", "ERROR"):
+            self.assertFalse(jobs.run(job))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(job.locked_at)
+        self.assertEqual(job.locked_by, "")
+        self.assertIn("RuntimeError: falhou", job.last_error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=4))
+        self.assertLess(job.run_after, timezone.now() + timedelta(seconds=5))
+        # O efeito colateral do job com falha foi desfeito.
+        self.assertFalse(Job.objects.filter(name="tests.side_effect").exists())
+
+    def test_last_attempt_marks_failed(self):
+        job = self.claimed("tests.fail", attempts=2)
+
+        with self.assertLogs("common.jobs", "ERROR"):
+            self.assertFalse(jobs.run(job))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+
+    def test_failed_retry_is_dropped_when_key_is_pending_again(self):
+        job = self.claimed("tests.fail", dedupe_key="a")
+        Job.objects.create(name="tests.fail", dedupe_key="a")
+
+        with self.assertLogs("common.jobs", "ERROR"):
+            self.assertFalse(jobs.run(job))
+
+        self.assertEqual(Job.objects.get().status, Job.PENDING)
+        self.assertEqual(Job.objects.get().attempts, 0)
+
+    def test_run_pending_processes_a_batch(self):
+        for value in range(3):
+            Job.objects.create(name="tests.record", payload={"value": value})
+
+        self.assertEqual(jobs.run_pending("w1", limit=2), 2)
+        self.assertEqual(self.calls, [0, 1])
+        self.assertEqual(jobs.run_pending("w1"), 1)
+        self.assertEqual(jobs.run_pending("w1"), 0)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def errors(self, backend, **settings):
+        caches = {"default": {"BACKEND": backend, "LOCATION": "django_cache"}}
+        with override_settings(CACHES=caches, **settings):
+            return check_shared_caches(None)
+
+    def test_shared_backend_passes(self):
+        self.assertEqual(self.errors(SHARED, JOBS=QUEUE), [])
+
+    def test_process_local_backend_is_rejected_once_per_alias(self):
+        errors = self.errors(LOCAL, JOBS=QUEUE)
+
+        self.assertEqual([error.id for error in errors], ["common.E001"])
+        self.assertIn("DASHBOARD_CACHE", errors[0].msg)
+        self.assertIn("JOBS['MODE'] = 'queue'", errors[0].msg)
+
+
+class SeriesTests(TestCase):
+    """Séries temporais (common.series) sobre os consolidados diários."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        for day, income in [
+            (date(2025, 1, 29), 10),
+            (date(2025, 1, 31), 20),
+            (date(2025, 2, 2), 40),
+            (date(2025, 2, 3), 5),
+        ]:
+            UserDailyStats.objects.create(user=cls.user, date=day, income=income)
+
+    def build(self, start, end, **kwargs):
+        return series.build(
+            UserDailyStats.objects.filter(user=self.user),
+            F("income"),
+            start,
+            end,
+            **kwargs,
+        )
+
+    def column(self, points, name):
+        return [point[name] for point in points]
+
+    def test_fill_gaps_with_zero(self):
+        points = self.build(date(2025, 1, 29), date(2025, 2, 3))
+
+        self.assertEqual(
+            self.column(points, "date"),
+            [date(2025, 1, d) for d in (29, 30, 31)]
+            + [date(2025, 2, d) for d in (1, 2, 3)],
+        )
+        self.assertEqual(self.column(points, "value"), [10, 0, 20, 0, 40, 5])
+        self.assertEqual(self.column(points, "cumulative"), [10, 10, 30, 30, 70, 75])
+
+    def test_reset_month_restarts_cumulative(self):
+        points = self.build(date(2025, 1, 30), date(2025, 2, 3), reset="month")
+
+        # 1º de fevereiro não tem linha e já começa a nova partição.
+        self.assertEqual(self.column(points, "cumulative"), [0, 20, 0, 40, 45])
+
+    def test_month_step(self):
+        points = self.build(date(2025, 1, 1), date(2025, 3, 31), step="month")
+
+        self.assertEqual(
+            self.column(points, "date"),
+            [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)],
+        )
+
+    def test_rows_before_start_only_offset_the_average(self):
+        rows = series.annotate(
+            UserDailyStats.objects.filter(user=self.user), F("income")
+        )
+        points = series.fill(rows, date(2025, 1, 31), date(2025, 2, 3), window=2)
+
+        # O acumulado vem do banco e inclui o dia 29; a média não.
+        self.assertEqual(self.column(points, "cumulative"), [30, 30, 70, 75])
+        self.assertEqual(self.column(points, "average"), [20, 10, 20, 22.5])
+
+    def test_moving_average_uses_available_periods_first(self):
+        points = self.build(date(2025, 1, 29), date(2025, 2, 2), window=3)
+
+        self.assertEqual(
+            self.column(points, "average"),
+            [10, 5, 10, Decimal(20) / 3, 20],
+        )
+
+    def test_fill_accepts_dicts(self):
+        rows = [
+            {
+                "date": date(2025, 1, 2),
+                "series_value": 3,
+                "series_cumulative": 3,
+                "series_running": 3,
+            }
+        ]
+        points = series.fill(rows, date(2025, 1, 1), date(2025, 1, 3))
+
+        self.assertEqual(self.column(points, "value"), [0, 3, 0])
+        self.assertEqual(self.column(points, "cumulative"), [0, 3, 3])
+
+    def test_unknown_step_raises(self):
+        with self.assertRaises(ValueError):
+            list(series.calendar(date(2025, 1, 1), date(2025, 1, 2), step="week"))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": LOCAL}},
+    WRITE_METRICS={"ENABLED": True, "CACHE": "default", "FLUSH_SECONDS": 3600},
+)
+class WriteMetricsTests(TestCase):
+    """Amostras dos caminhos de escrita (common.metrics) e o relatório."""
+
+    URL = "/api/common/metrics/writes/"
+
+    def setUp(self):
+        caches["default"].clear()
+        metrics.recorder.reset()
+        self.addCleanup(metrics.recorder.reset)
+
+    def sample(self, **values):
+        return {
+            "queries": 1,
+            "db_ms": 1.0,
+            "view_ms": 2.0,
+            "slowest_ms": 1.0,
+            "slowest_sql": "SELECT 1",
+            **values,
+        }
+
+    def test_measure_counts_the_block_queries(self):
+        User = get_user_model()
+        with metrics.measure("tests.block"):
+            User.objects.count()
+            User.objects.exists()
+        User.objects.count()
+
+        (sample,) = metrics.recorder.snapshot()["tests.block"]
+        self.assertEqual(sample["queries"], 2)
+        self.assertTrue(sample["slowest_sql"].startswith("SELECT"))
+        self.assertGreaterEqual(sample["view_ms"], sample["db_ms"])
+
+    def test_measure_is_a_no_op_when_disabled(self):
+        with override_settings(WRITE_METRICS={"ENABLED": False}):
+            with metrics.measure("tests.block"):
+                get_user_model().objects.count()
+
+        self.assertEqual(metrics.recorder.snapshot(), {})
+
+    def test_flush_publishes_the_buffer_and_prunes_dead_processes(self):
+        cache = caches["default"]
+        cache.set(metrics.INDEX_KEY, {"write_metrics:morto:1": time.time() - 10**6})
+        with metrics.measure("tests.block"):
+            pass
+
+        metrics.recorder.flush()
+
+        self.assertEqual(
+            cache.get(metrics.recorder.process_key), metrics.recorder.snapshot()
+        )
+        self.assertEqual(
+            list(cache.get(metrics.INDEX_KEY)), [metrics.recorder.process_key]
+        )
+
+    def test_add_flushes_when_due(self):
+        # O último flush foi há mais de FLUSH_SECONDS.
+        metrics.recorder.last_flush = time.monotonic() - 3600
+        with metrics.measure("tests.block"):
+            pass
+
+        published = caches["default"].get(metrics.recorder.process_key)
+        self.assertEqual(len(published["tests.block"]), 1)
+
+    def test_report_merges_every_process(self):
+        cache = caches["default"]
+        other = "write_metrics:outro:2"
+        cache.set(other, {"tests.block": [self.sample(queries=9, view_ms=50.0)]})
+        cache.set(metrics.INDEX_KEY, {other: time.time()})
+        metrics.recorder.samples["tests.block"].extend(
+            self.sample(queries=n) for n in (1, 2, 3)
+        )
+
+        report = metrics.report()
+
+        self.assertEqual(report["processes"], 2)
+        block = report["endpoints"]["tests.block"]
+        self.assertEqual(block["count"], 4)
+        self.assertEqual(block["queries"], {"p50": 2, "p95": 9, "p99": 9, "max": 9})
+        self.assertEqual(block["view_ms"]["max"], 50.0)
+        self.assertEqual(block["slowest_query"], {"ms": 1.0, "sql": "SELECT 1"})
+
+    def test_write_requests_are_measured_and_reported_to_admins(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "senha-forte-123"
+        )
+        vehicle = Vehicle.objects.create(
+            user=user, model_name="Onix", initial_km=1000
+        )
+        record = DailyRecord.objects.create(
+            user=user, vehicle=vehicle, date=date(2025, 1, 1), start_km=1000
+        )
+        income = Category.objects.create(user=user, name="Corridas", type="INCOME")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        client.post(
+            "/api/operations/transactions/",
+            {
+                "record": record.pk,
+                "category": income.pk,
+                "type": "INCOME",
+                "amount": 50,
+            },
+            format="json",
+        )
+        # Leituras não são medidas.
+        client.get("/api/operations/transactions/")
+
+        self.assertEqual(client.get(self.URL).status_code, 403)
+        client.force_authenticate(admin)
+        response = client.get(self.URL)
+
+        self.assertEqual(response.status_code, 200)
+        endpoints = response.data["endpoints"]
+        self.assertEqual(
+            sorted(endpoints), ["signal.record_totals.save", "transactions.create"]
+        )
+        self.assertEqual(endpoints["transactions.create"]["count"], 1)
+        self.assertGreater(endpoints["transactions.create"]["queries"]["max"], 1)
@@ -3,19 +3,32 @@ from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from django.db.models import Sum, F
+from django.db.models import F, Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from datetime import timedelta, datetime
-from operations.models import DailyRecord, Category
+from common import series
+from operations.models import DailyRecord, Category, UserDailyStats
 from .serializers import (
     DashboardCategorySerializer,
     DashboardRecordSerializer,
     ActiveShiftSerializer,
 )
 from vehicles.models import Vehicle
+from vehicles.serializers import MaintenanceForecastSerializer
+from . import cache as dashboard_cache
 
 
 class DashboardSummaryView(APIView):
+    """
+    Resumo do mês para a dashboard do app. Responde com um número fixo de
+    consultas, independente da quantidade de plantões, veículos ou
+    categorias do usuário. O resumo fica em core.cache até a próxima
+    escrita do usuário, e requisições com If-None-Match/If-Modified-Since
+    em dia recebem 304.
+    """
+
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -32,13 +45,36 @@ class DashboardSummaryView(APIView):
             target_month = now.month
             target_year = now.year
 
-        today_income = (
-            DailyRecord.objects.filter(user=user, date=today_date).aggregate(
-                t=Sum("total_income")
-            )["t"]
-            or 0
+        # ETag e Last-Modified saem só da versão: o 304 não lê o resumo.
+        version = dashboard_cache.get_version(user.pk)
+        etag = quote_etag(
+            f"{user.pk}-{target_year}-{target_month}-{today_date}-{version}"
+        )
+        modified = dashboard_cache.last_modified(version)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(modified),
+            "Cache-Control": "private, no-cache",
+        }
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+
+        data = dashboard_cache.get_or_build(
+            user.pk,
+            version,
+            f"{target_year}-{target_month}:{today_date}",
+            lambda: self.build_summary(
+                user, base_date, target_month, target_year, today_date
+            ),
         )
+        return Response(data, headers=headers)
 
+    def build_summary(self, user, base_date, target_month, target_year, today_date):
         first_day_month = base_date.replace(day=1)
         next_month = (base_date.replace(day=28) + timedelta(days=4)).replace(day=1)
         last_day_month = next_month - timedelta(days=1)
@@ -46,48 +82,55 @@ class DashboardSummaryView(APIView):
         last_month_end = first_day_month - timedelta(days=1)
         first_day_last_month = last_month_end.replace(day=1)
 
-        records_qs = DailyRecord.objects.filter(
-            user=user, date__range=[first_day_month, last_day_month]
-        )
-
-        aggregates = records_qs.aggregate(
-            total_inc=Sum("total_income"),
-            total_cost=Sum("total_cost"),
-            total_km=Sum(F("end_km") - F("start_km")),
+        # Consolidados diários dos dois meses e de hoje, no máximo 63 linhas
+        # (ver operations.rollups): KPIs, receita do dia e gráfico. O lucro
+        # acumulado de cada mês vem do banco (common.series).
+        rows = list(
+            series.annotate(
+                UserDailyStats.objects.filter(
+                    Q(date__range=[first_day_last_month, last_day_month])
+                    | Q(date=today_date),
+                    user=user,
+                ),
+                F("income") - F("cost"),
+                reset="month",
+            )
         )
-
-        income = aggregates["total_inc"] or 0
-        cost = aggregates["total_cost"] or 0
-        km = aggregates["total_km"] or 0
+        days = {stats.date: stats for stats in rows}
+        month_days = [
+            stats
+            for date, stats in days.items()
+            if first_day_month <= date <= last_day_month
+        ]
+
+        today_income = days[today_date].income if today_date in days else 0
+        income = sum(stats.income for stats in month_days)
+        cost = sum(stats.cost for stats in month_days)
+        km = sum(stats.km for stats in month_days)
         profit = income - cost
 
         income_per_km = (income / km) if km > 0 else 0
         cost_per_km = (cost / km) if km > 0 else 0
 
-        def get_accumulated_data(start_date, end_date):
-            recs = DailyRecord.objects.filter(
-                user=user, date__range=[start_date, end_date]
-            ).values("date", "total_income", "total_cost")
-
-            daily_map = {
-                r["date"].day: (r["total_income"] - r["total_cost"]) for r in recs
-            }
+        month_records = DailyRecord.objects.filter(
+            user=user, date__range=[first_day_month, last_day_month]
+        ).select_related("vehicle").order_by("-date")
 
-            data = []
-            accumulated = 0
+        points = series.fill(
+            rows, first_day_last_month, last_day_month, reset="month"
+        )
 
+        def get_accumulated_data(start_date, end_date):
             is_current_month = (
                 end_date.month == today_date.month and end_date.year == today_date.year
             )
             limit_date = min(end_date, today_date) if is_current_month else end_date
 
-            days_range = (limit_date - start_date).days + 1
-
-            for i in range(1, days_range + 1):
-                day_profit = daily_map.get(i, 0)
-                accumulated += day_profit
-                data.append({"day": i, "value": float(accumulated)})
-            return data
+            return [
+                {"day": point["date"].day, "value": float(point["cumulative"])}
+                for point in points
+                if start_date <= point["date"] <= limit_date
+            ]
 
         comparison_chart = {
             "current": get_accumulated_data(first_day_month, last_day_month),
@@ -99,50 +142,58 @@ class DashboardSummaryView(APIView):
             ActiveShiftSerializer(active_shift).data if active_shift else None
         )
 
-        current_vehicle = (
-            active_shift.vehicle
-            if active_shift
-            else Vehicle.objects.filter(user=user, is_active=True).first()
-        )
-        vehicle_stats = {"fuel_avg": 0, "maintenance": None}
+        # with_metrics sem blocos pesados anota o necessário para
+        # fuel_average e maintenance_status e traz a previsão por JOIN.
+        vehicles = Vehicle.objects.with_metrics(include=())
+        if active_shift:
+            vehicles = vehicles.filter(pk=active_shift.vehicle_id)
+        else:
+            vehicles = vehicles.filter(user=user, is_active=True).order_by("pk")
+        current_vehicle = vehicles.first()
+
+        vehicle_stats = {"fuel_avg": 0, "maintenance": None, "forecast": None}
         if current_vehicle:
             vehicle_stats["fuel_avg"] = current_vehicle.fuel_average or 0
             vehicle_stats["maintenance"] = current_vehicle.maintenance_status
-
-        income_cats = Category.objects.filter(user=user, type="INCOME")
-        cost_cats = Category.objects.filter(user=user, type="COST")
-
-        month_records = records_qs.order_by("-date")
-
-        return Response(
-            {
-                "period": f"{base_date.strftime('%B')}/{target_year}",
-                "period_query": {"month": target_month, "year": target_year},
-                "today": {"income": today_income},
-                "kpi": {
-                    "income": income,
-                    "cost": cost,
-                    "profit": profit,
-                    "km_driven": km,
-                    "income_per_km": round(income_per_km, 2),
-                    "cost_per_km": round(cost_per_km, 2),
-                },
-                "vehicle_stats": vehicle_stats,
-                "active_shift": active_shift_data,
-                "lists": {
-                    "recent_records": DashboardRecordSerializer(
-                        month_records, many=True
-                    ).data,
-                    "income_categories": DashboardCategorySerializer(
-                        income_cats, many=True
-                    ).data,
-                    "cost_categories": DashboardCategorySerializer(
-                        cost_cats, many=True
-                    ).data,
-                },
-                "comparison_chart": comparison_chart,
-            }
+            forecast = getattr(current_vehicle, "maintenance_forecast", None)
+            if forecast:
+                vehicle_stats["forecast"] = MaintenanceForecastSerializer(
+                    forecast
+                ).data
+
+        categories = list(
+            Category.objects.filter(user=user, type__in=["INCOME", "COST"])
         )
+        income_cats = [c for c in categories if c.type == "INCOME"]
+        cost_cats = [c for c in categories if c.type == "COST"]
+
+        return {
+            "period": f"{base_date.strftime('%B')}/{target_year}",
+            "period_query": {"month": target_month, "year": target_year},
+            "today": {"income": today_income},
+            "kpi": {
+                "income": income,
+                "cost": cost,
+                "profit": profit,
+                "km_driven": km,
+                "income_per_km": round(income_per_km, 2),
+                "cost_per_km": round(cost_per_km, 2),
+            },
+            "vehicle_stats": vehicle_stats,
+            "active_shift": active_shift_data,
+            "lists": {
+                "recent_records": DashboardRecordSerializer(
+                    month_records, many=True
+                ).data,
+                "income_categories": DashboardCategorySerializer(
+                    income_cats, many=True
+                ).data,
+                "cost_categories": DashboardCategorySerializer(
+                    cost_cats, many=True
+                ).data,
+            },
+            "comparison_chart": comparison_chart,
+        }
 
 
 class ExportReportView(APIView):
@@ -0,0 +1,29 @@
+"""
+Cache do resumo da dashboard (DashboardSummaryView).
+
+Cada usuário tem uma versão de dados (common.cache). Toda escrita em
+plantões, transações, categorias, veículos e manutenções do usuário chama
+bump_version() (ver operations.signals e as escritas em lote), e o resumo
+de cada (mês, ano) fica numa chave que inclui essa versão. ETag e
+Last-Modified da resposta saem só da versão: uma atualização da tela com o
+ETag em dia recebe 304 com uma única leitura do cache, sem ler nem montar
+o resumo.
+"""
+
+from common.cache import VersionedCache, modified
+
+versions = VersionedCache("dashboard", "DASHBOARD_CACHE", "DASHBOARD_CACHE_TIMEOUT")
+
+get_version = versions.get_version
+bump_version = versions.bump_version
+last_modified = modified
+
+
+def get_or_build(user_id, version, period, builder):
+    """
+    Resumo do `period` na `version` informada, montado com `builder()`
+    quando não está no cache. A versão vem de quem chama, lida antes da
+    montagem, para que um resumo montado durante uma escrita concorrente
+    fique numa versão que ninguém mais lê.
+    """
+    return versions.get_or_build(user_id, version, period, builder)
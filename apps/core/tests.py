@@ -1,3 +1,197 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import cache as dashboard_cache
+from operations.models import Category, DailyRecord, Transaction
+from vehicles.models import Vehicle
+
+# As contagens de consultas medem o app, não o DatabaseCache das versões.
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class DashboardSummaryQueryTests(TestCase):
+    """
+    A dashboard é o endpoint mais acessado: o número de consultas não pode
+    crescer com plantões, veículos, abastecimentos ou categorias.
+    """
+
+    QUERIES = 5
+    URL = "/api/core/dashboard/?month=1&year=2025"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.fuel = Category.objects.filter(user=cls.user, is_fuel=True).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_day(self, date, vehicle=None, income=100, cost=30, active=False):
+        record = DailyRecord.objects.create(
+            user=self.user,
+            vehicle=vehicle or self.vehicle,
+            date=date,
+            start_km=1000,
+            end_km=None if active else 1100,
+            is_active=active,
+        )
+        Transaction.objects.create(
+            record=record, type="INCOME", category=self.income, amount=income
+        )
+        Transaction.objects.create(
+            record=record,
+            type="COST",
+            category=self.fuel,
+            amount=cost,
+            liters=10,
+            actual_km=1000 + date.toordinal() % 1000,
+        )
+        return record
+
+    def test_query_count_does_not_grow(self):
+        self.add_day(datetime.date(2025, 1, 1))
+        with self.assertNumQueries(self.QUERIES):
+            self.client.get(self.URL)
+
+        other = Vehicle.objects.create(
+            user=self.user, model_name="HB20", initial_km=500
+        )
+        for day in range(2, 30):
+            self.add_day(datetime.date(2025, 1, day), vehicle=other)
+            self.add_day(datetime.date(2024, 12, day))
+        Category.objects.create(user=self.user, name="Gorjetas", type="INCOME")
+        self.add_day(timezone.now().date(), vehicle=other, active=True)
+
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["lists"]["recent_records"]), 29)
+        self.assertIsNotNone(response.data["active_shift"])
+
+    def test_summary_values(self):
+        self.add_day(datetime.date(2025, 1, 2), income=200, cost=50)
+        self.add_day(datetime.date(2025, 1, 3), income=10, cost=0)
+        self.add_day(datetime.date(2024, 12, 31), income=80, cost=20)
+        self.add_day(timezone.now().date(), income=70, cost=0, active=True)
+
+        data = self.client.get(self.URL).data
+
+        self.assertEqual(data["today"]["income"], Decimal("70.00"))
+        self.assertEqual(data["kpi"]["income"], Decimal("210.00"))
+        self.assertEqual(data["kpi"]["profit"], Decimal("160.00"))
+        self.assertEqual(data["kpi"]["km_driven"], 200)
+
+        current = data["comparison_chart"]["current"]
+        self.assertEqual(len(current), 31)
+        self.assertEqual(current[0]["value"], 0)
+        self.assertEqual(current[1]["value"], 150.0)
+        self.assertEqual(current[-1]["value"], 160.0)
+        self.assertEqual(data["comparison_chart"]["last"][-1]["value"], 60.0)
+
+    def test_conditional_get(self):
+        record = self.add_day(datetime.date(2025, 1, 2))
+        first = self.client.get(self.URL)
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.URL)
+            not_modified = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+            since = self.client.get(
+                self.URL, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+            )
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], etag)
+        self.assertEqual(since.status_code, 304)
+
+        Transaction.objects.create(
+            record=record, type="INCOME", category=self.income, amount=5
+        )
+        changed = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.data["kpi"]["income"], Decimal("105.00"))
+
+
+
+class DashboardConditionalGetTests(TestCase):
+    """
+    304 com o cache configurado em settings (sem LOCAL_CACHES): só a versão
+    do usuário é lida, nunca o resumo nem as tabelas do app.
+    """
+
+    URL = "/api/core/dashboard/?month=1&year=2025"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.first = self.client.get(self.URL)
+
+    def conditional_get(self, **headers):
+        with mock.patch.object(
+            dashboard_cache, "get_or_build", side_effect=AssertionError
+        ), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.URL, **headers)
+
+        # O DatabaseCache lê a versão na tabela de cache (uma consulta);
+        # Redis ou Memcached não tocam o banco.
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+        for query in ctx.captured_queries:
+            self.assertIn(settings.CACHES["default"].get("LOCATION", ""), query["sql"])
+            self.assertIn(f"dashboard:{self.user.pk}:version", query["sql"])
+        return response
+
+    def test_if_none_match(self):
+        response = self.conditional_get(HTTP_IF_NONE_MATCH=self.first["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.first["ETag"])
+        self.assertEqual(response["Last-Modified"], self.first["Last-Modified"])
+
+    def test_if_modified_since(self):
+        response = self.conditional_get(
+            HTTP_IF_MODIFIED_SINCE=self.first["Last-Modified"]
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_bumped_version_rebuilds(self):
+        dashboard_cache.bump_version(self.user.pk)
+
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=self.first["ETag"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], self.first["ETag"])
+        self.assertEqual(response.data, self.first.data)
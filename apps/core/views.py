@@ -1,7 +1,6 @@
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, F
-from operations.models import DailyRecord, Category
+from operations.models import DailyRecord, Category, UserLifetimeStats
 
 
 class PricingView(TemplateView):
@@ -24,16 +23,13 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             )
             context["cost_categories"] = Category.objects.filter(user=user, type="COST")
 
-        qs = DailyRecord.objects.filter(user=user)
-        aggregates = qs.aggregate(
-            total_inc=Sum("total_income"),
-            total_cost=Sum("total_cost"),
-            total_km=Sum(F("end_km") - F("start_km")),
-        )
+        # Totais de toda a vida numa linha só (ver operations.rollups): a
+        # leitura não cresce com o histórico. Sem linha, ainda não há dados.
+        lifetime = UserLifetimeStats.objects.filter(user=user).first()
 
-        income = aggregates["total_inc"] or 0
-        cost = aggregates["total_cost"] or 0
-        km = aggregates["total_km"] or 0
+        income = lifetime.income if lifetime else 0
+        cost = lifetime.cost if lifetime else 0
+        km = lifetime.km if lifetime else 0
 
         context["kpis"] = {
             "income": income,
@@ -44,6 +40,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             "cost_per_km": (cost / km) if km > 0 else 0,
         }
 
-        context["recent_records"] = qs.filter(is_active=False).order_by("-date")[:5]
+        context["recent_records"] = DailyRecord.objects.filter(
+            user=user, is_active=False
+        ).order_by("-date")[:5]
 
         return context
@@ -1,6 +1,19 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import DailyRecord, Maintenance, Category, Transaction
+from .models import (
+    DailyRecord,
+    Maintenance,
+    Category,
+    Transaction,
+    FuelCycle,
+    MaintenanceForecast,
+    SyncMutation,
+    LedgerEntry,
+    LedgerCheckpoint,
+    UserDailyStats,
+    UserMonthlyStats,
+    UserLifetimeStats,
+)
 
 admin.site.site_header = "DriverFinance Admin"
 admin.site.site_title = "Portal Administrativo"
@@ -143,6 +156,7 @@ class MaintenanceAdmin(admin.ModelAdmin):
     search_fields = ("title", "description", "vehicle__plate", "user__username")
     date_hierarchy = "date"
     autocomplete_fields = ["user", "vehicle", "transaction"]
+    list_select_related = ("vehicle",)
 
     def status_display(self, obj):
         if not obj.next_due_km:
@@ -168,3 +182,110 @@ class MaintenanceAdmin(admin.ModelAdmin):
         return format_html('<span style="color: green;">Em dia</span>')
 
     status_display.short_description = "Status"
+
+
+@admin.register(FuelCycle)
+class FuelCycleAdmin(admin.ModelAdmin):
+    list_display = (
+        "vehicle",
+        "start_km",
+        "end_km",
+        "liters",
+        "cost",
+        "km_per_liter",
+        "cost_per_km",
+    )
+    list_filter = ("vehicle",)
+    list_select_related = ("vehicle",)
+    readonly_fields = [f.name for f in FuelCycle._meta.fields]
+
+
+@admin.register(MaintenanceForecast)
+class MaintenanceForecastAdmin(admin.ModelAdmin):
+    list_display = (
+        "vehicle",
+        "as_of",
+        "km_per_day",
+        "next_due_km",
+        "remaining_km",
+        "due_date",
+    )
+    list_select_related = ("vehicle",)
+    readonly_fields = [f.name for f in MaintenanceForecast._meta.fields]
+
+
+@admin.register(SyncMutation)
+class SyncMutationAdmin(admin.ModelAdmin):
+    list_display = ("key", "user", "action", "client_id", "object_id", "created_at")
+    list_filter = ("action",)
+    search_fields = ("key", "client_id", "user__username")
+    readonly_fields = [f.name for f in SyncMutation._meta.fields]
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    """Somente leitura: o livro-razão nunca é editado."""
+
+    list_display = (
+        "id",
+        "event",
+        "transaction_id",
+        "record_id",
+        "type",
+        "amount",
+        "balance_income",
+        "balance_cost",
+        "created_at",
+    )
+    list_filter = ("event", "type")
+    search_fields = ("=transaction_id", "=record_id", "=user_id")
+    readonly_fields = [f.name for f in LedgerEntry._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerCheckpoint)
+class LedgerCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("name", "last_entry_id", "updated_at")
+
+
+@admin.register(UserDailyStats)
+class UserDailyStatsAdmin(admin.ModelAdmin):
+    """Somente leitura: refeito pelas escritas e por rebuild_rollups."""
+
+    list_display = ("user", "date", "income", "cost", "km", "shifts", "updated_at")
+    list_filter = ("date",)
+    search_fields = ("user__username", "user__email")
+    readonly_fields = [f.name for f in UserDailyStats._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UserMonthlyStats)
+class UserMonthlyStatsAdmin(admin.ModelAdmin):
+    """Somente leitura: refeito pelas escritas e por rebuild_rollups."""
+
+    list_display = ("user", "month", "income", "cost", "km", "shifts", "updated_at")
+    list_filter = ("month",)
+    search_fields = ("user__username", "user__email")
+    readonly_fields = [f.name for f in UserMonthlyStats._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UserLifetimeStats)
+class UserLifetimeStatsAdmin(admin.ModelAdmin):
+    """Somente leitura: refeito pelas escritas e por rebuild_rollups."""
+
+    list_display = ("user", "income", "cost", "km", "shifts", "updated_at")
+    search_fields = ("user__username", "user__email")
+    readonly_fields = [f.name for f in UserLifetimeStats._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -9,6 +9,7 @@ from .api_views import (
     GetLastKmView,
     MonthlyReportView,
     CategoryReportDetailView,
+    SyncView,
 )
 
 router = DefaultRouter()
@@ -22,5 +23,6 @@ urlpatterns = [
     path("categories/<int:pk>/report_detail/", CategoryReportDetailView.as_view(), name="category_report_detail"), # <--- ADICIONE ESTA
     path("", include(router.urls)),
     path("onboard/", OnboardUserView.as_view(), name="api_onboard"),
+    path("sync/", SyncView.as_view(), name="api_sync"),
     path("get-km/<int:vehicle_id>/", GetLastKmView.as_view(), name="api_get_km"),
 ]
@@ -6,10 +6,20 @@ from django.shortcuts import get_object_or_404
 from datetime import timedelta
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import ValidationError
-from django.db.models import Sum, Q
+from django.db.models import F, Prefetch, Sum, Q
+from django.db.models.functions import Greatest
 from django.db import models
 from rest_framework.views import APIView
-from .models import Transaction, Category, DailyRecord, Maintenance
+from . import categories
+from .models import Transaction, Category, DailyRecord, Maintenance, UserMonthlyStats
+from .ingest import (
+    MAX_BULK_ITEMS,
+    create_transactions,
+    maintenance_mirror,
+    sync_maintenance_mirror,
+    validate_items,
+)
+from .sync import MAX_SYNC_MUTATIONS, MutationError, SyncSession
 from datetime import datetime
 
 from vehicles.models import Vehicle
@@ -39,21 +49,26 @@ class MonthlyReportView(APIView):
             trans_filters &= Q(record__date__month=month)
             record_filters &= Q(date__month=month)
 
-        # 1. Cálculos de Totais
+        # 1. Cálculos de Totais, pelos consolidados mensais (ver
+        # operations.rollups). Categorias e o histórico por plantão não
+        # existem nos consolidados e seguem agrupando as transações.
         transactions = Transaction.objects.filter(trans_filters)
+        months = UserMonthlyStats.objects.filter(user=user, month__year=year)
+        if view_type == "monthly":
+            months = months.filter(month__month=month)
+        months = list(months.order_by("month"))
 
-        total_income = (
-            transactions.filter(type="INCOME").aggregate(Sum("amount"))["amount__sum"]
-            or 0
-        )
-        total_cost = (
-            transactions.filter(type="COST").aggregate(Sum("amount"))["amount__sum"]
+        total_income = sum(stats.income for stats in months)
+        total_cost = sum(stats.cost for stats in months)
+
+        # Apenas registros finalizados entram no cálculo de KM. O KM dos
+        # consolidados inclui o plantão aberto, então a soma é feita aqui.
+        total_km = (
+            DailyRecord.objects.filter(
+                record_filters, is_active=False, end_km__isnull=False
+            ).aggregate(km=Sum(Greatest(F("end_km") - F("start_km"), 0)))["km"]
             or 0
         )
-
-        # Apenas registros finalizados entram no cálculo de KM
-        records = DailyRecord.objects.filter(record_filters, is_active=False)
-        total_km = sum(r.km_driven for r in records)
         km_float = float(total_km) if total_km > 0 else 0
 
         # 2. Agrupamento por Categorias
@@ -93,14 +108,6 @@ class MonthlyReportView(APIView):
                         }
                     )
             else:
-                history_qs = (
-                    transactions.values("record__date__month")
-                    .annotate(
-                        income=Sum("amount", filter=Q(type="INCOME")),
-                        cost=Sum("amount", filter=Q(type="COST")),
-                    )
-                    .order_by("record__date__month")
-                )
                 labels = [
                     "Jan",
                     "Fev",
@@ -115,12 +122,14 @@ class MonthlyReportView(APIView):
                     "Nov",
                     "Dez",
                 ]
-                for entry in history_qs:
+                for stats in months:
+                    if not (stats.income or stats.cost):
+                        continue
                     history_data.append(
                         {
-                            "date": labels[entry["record__date__month"] - 1],
-                            "income": float(entry["income"] or 0),
-                            "cost": float(entry["cost"] or 0),
+                            "date": labels[stats.month.month - 1],
+                            "income": float(stats.income),
+                            "cost": float(stats.cost),
                         }
                     )
 
@@ -190,63 +199,31 @@ class OnboardUserView(views.APIView):
     Cria categorias DE RECEITA.
     Modo 1: Recebe 'types' e cria tudo daquele tipo.
     Modo 2: Recebe 'app_list' e cria apenas os apps específicos solicitados.
+    Sem 'types', usa os grupos do work_type do usuário. O catálogo fica em
+    operations.categories.
     """
 
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        types = request.data.get("types", [])
+        types = request.data.get("types")
         app_list = request.data.get("app_list", None)
         user = request.user
 
-        CATALOG = {
-            # Passageiros
-            "Uber": {"color": "#000000", "type": "passenger"},
-            "99": {"color": "#eab308", "type": "passenger"},
-            "Indrive": {"color": "#16a34a", "type": "passenger"},
-            "Particular": {"color": "#059669", "type": "passenger"},
-            "Black": {"color": "#111827", "type": "passenger"},
-            # Entregas
-            "iFood": {"color": "#ea1d2c", "type": "delivery"},
-            "Mercado Livre": {"color": "#ffe600", "type": "delivery"},
-            "Loggi": {"color": "#3b82f6", "type": "delivery"},
-            "Borzo": {"color": "#8b5cf6", "type": "delivery"},
-            "Zé Delivery": {"color": "#f59e0b", "type": "delivery"},
-            "CornerShop": {"color": "#ef4444", "type": "delivery"},
-        }
-
-        wanted_cats = []
+        if types is None:
+            types = categories.groups_for(user.work_type)
 
         if app_list is not None:
-            for app_name in app_list:
-                if app_name in CATALOG:
-                    wanted_cats.append(
-                        {"name": app_name, "color": CATALOG[app_name]["color"]}
-                    )
+            templates = categories.income_templates(names=app_list)
         else:
-            for name, data in CATALOG.items():
-                if data["type"] in types:
-                    wanted_cats.append({"name": name, "color": data["color"]})
-
-        if not wanted_cats:
-            wanted_cats.append({"name": "Ganhos Diversos", "color": "#059669"})
-
-        existing_names = set(
-            Category.objects.filter(user=user, type="INCOME").values_list(
-                "name", flat=True
-            )
-        )
+            templates = categories.income_templates(groups=types)
 
-        cats_to_create = [
-            Category(user=user, name=c["name"], type="INCOME", color=c["color"])
-            for c in wanted_cats
-            if c["name"] not in existing_names
-        ]
+        if not templates:
+            templates = [categories.FALLBACK_INCOME]
 
-        if cats_to_create:
-            Category.objects.bulk_create(cats_to_create)
+        created = categories.provision(user, templates)
 
-        return Response({"status": "ok", "created": len(cats_to_create)})
+        return Response({"status": "ok", "created": len(created)})
 
 
 class GetLastKmView(views.APIView):
@@ -308,6 +285,16 @@ class DailyRecordViewSet(viewsets.ModelViewSet):
             limit_date = timezone.now().date() - timedelta(days=30)
             qs = qs.filter(date__gte=limit_date)
 
+        if self.action == "retrieve":
+            qs = qs.prefetch_related(
+                Prefetch(
+                    "transactions",
+                    queryset=Transaction.objects.select_related(
+                        "category", "maintenance_mirror"
+                    ),
+                )
+            )
+
         return qs
 
     def get_serializer_class(self):
@@ -327,66 +314,101 @@ class DailyRecordViewSet(viewsets.ModelViewSet):
         return Response(None)
 
     def perform_create(self, serializer):
-        if DailyRecord.objects.filter(user=self.request.user, is_active=True).exists():
-            raise ValidationError({"detail": "Você já tem um plantão em aberto."})
-
         hoje = timezone.now().date()
-        if DailyRecord.objects.filter(user=self.request.user, date=hoje).exists():
-            raise ValidationError({"detail": "Você já abriu um plantão hoje."})
-
         serializer.save(user=self.request.user, date=hoje, is_active=True)
 
 
 class TransactionViewSet(viewsets.ModelViewSet):
+    metrics_tag = "transactions"
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["record", "type", "category"]
 
     def get_queryset(self):
-        return Transaction.objects.filter(record__user=self.request.user).order_by(
-            "-created_at"
+        return (
+            Transaction.objects.filter(record__user=self.request.user)
+            .select_related("category", "maintenance_mirror")
+            .order_by("-created_at")
         )
 
     def perform_create(self, serializer):
         instance = serializer.save()
 
         if instance.type == "COST" and instance.category.is_maintenance:
-            final_odometer = instance.actual_km
-            if not final_odometer:
-                final_odometer = instance.record.end_km or instance.record.start_km
-
-            Maintenance.objects.create(
-                user=self.request.user,
-                vehicle=instance.record.vehicle,
-                date=instance.record.date,
-                cost=instance.amount,
-                odometer=final_odometer,
-                type="OTHER",
-                description=f"Via Dashboard: {instance.description or instance.category.name}",
-                transaction=instance,
-                next_due_km=instance.next_due_km,
-            )
+            maintenance_mirror(self.request.user, instance).save()
 
     def perform_update(self, serializer):
-        instance = serializer.save()
+        sync_maintenance_mirror(serializer.save())
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Cria várias transações de uma vez (lista no corpo da requisição).
+        Os itens válidos são gravados juntos; os inválidos voltam em
+        `errors` com o índice original.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"detail": "Envie uma lista de transações."})
+        if len(items) > MAX_BULK_ITEMS:
+            raise ValidationError(
+                {"detail": f"Envie no máximo {MAX_BULK_ITEMS} transações por vez."}
+            )
 
-        if hasattr(instance, "maintenance_mirror"):
-            maint = instance.maintenance_mirror.first()
+        valid, errors = validate_items(request.user, items)
+        if not valid:
+            return Response({"created": [], "errors": errors}, status=400)
+
+        created = create_transactions(request.user, [data for _, data in valid])
+        created = (
+            Transaction.objects.filter(pk__in=[t.pk for t in created])
+            .select_related("category", "maintenance_mirror")
+            .order_by("pk")
+        )
+
+        return Response(
+            {
+                "created": TransactionSerializer(created, many=True).data,
+                "errors": errors,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
-            if maint:
-                maint.cost = instance.amount
-                maint.description = (
-                    f"Via Dashboard: {instance.description or instance.category.name}"
-                )
 
-                if instance.actual_km:
-                    maint.odometer = instance.actual_km
+class SyncView(APIView):
+    """
+    Recebe a fila de mutações feitas offline ({"mutations": [...]}) e aplica
+    tudo em ordem numa única transação (ver operations.sync).
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        mutations = None
+        if isinstance(request.data, dict):
+            mutations = request.data.get("mutations")
+        if not isinstance(mutations, list):
+            raise ValidationError({"detail": "Envie a fila em 'mutations'."})
+        if len(mutations) > MAX_SYNC_MUTATIONS:
+            raise ValidationError(
+                {"detail": f"Envie no máximo {MAX_SYNC_MUTATIONS} mutações por vez."}
+            )
 
-                if instance.next_due_km:
-                    maint.next_due_km = instance.next_due_km
+        session = SyncSession(request)
+        try:
+            results = session.apply(mutations)
+        except MutationError as exc:
+            return Response(
+                {
+                    "detail": "Nenhuma alteração foi gravada.",
+                    "failed": exc.detail,
+                    "state": session.state(),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-                maint.save()
+        return Response({"results": results, "state": session.state()})
 
 
 class MaintenanceViewSet(viewsets.ModelViewSet):
@@ -395,7 +417,9 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
     ordering = ["-date"]
 
     def get_queryset(self):
-        return Maintenance.objects.filter(user=self.request.user)
+        return Maintenance.objects.filter(user=self.request.user).select_related(
+            "vehicle"
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
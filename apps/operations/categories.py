@@ -0,0 +1,94 @@
+"""
+Modelos de categorias padrão.
+
+Catálogo único das categorias que o sistema cria sozinho: as despesas
+básicas provisionadas no cadastro do usuário (sinal post_save) e os apps de
+receita oferecidos no onboarding (OnboardUserView). Cada modelo pertence a
+um grupo de trabalho ("passenger", "delivery") ou a todos (group None), e o
+`work_type` do usuário escolhe os grupos no onboarding.
+"""
+
+from core import cache as dashboard_cache
+from .models import Category
+
+# Grupos de apps de receita de cada CustomUser.work_type.
+WORK_TYPE_GROUPS = {
+    "RIDESHARE": ("passenger",),
+    "DELIVERY": ("delivery",),
+    "BOTH": ("passenger", "delivery"),
+}
+
+# signup=True: criada junto com o usuário.
+TEMPLATES = (
+    # Despesas básicas
+    {"name": "Abastecimento", "type": "COST", "color": "#ef4444", "is_fuel": True, "signup": True},
+    {"name": "Manutenção", "type": "COST", "color": "#f97316", "is_maintenance": True, "signup": True},
+    {"name": "Alimentação", "type": "COST", "color": "#eab308", "signup": True},
+    {"name": "Outros", "type": "COST", "color": "#64748b", "signup": True},
+    # Passageiros
+    {"name": "Uber", "type": "INCOME", "color": "#000000", "group": "passenger"},
+    {"name": "99", "type": "INCOME", "color": "#eab308", "group": "passenger"},
+    {"name": "Indrive", "type": "INCOME", "color": "#16a34a", "group": "passenger"},
+    {"name": "Particular", "type": "INCOME", "color": "#059669", "group": "passenger"},
+    {"name": "Black", "type": "INCOME", "color": "#111827", "group": "passenger"},
+    # Entregas
+    {"name": "iFood", "type": "INCOME", "color": "#ea1d2c", "group": "delivery"},
+    {"name": "Mercado Livre", "type": "INCOME", "color": "#ffe600", "group": "delivery"},
+    {"name": "Loggi", "type": "INCOME", "color": "#3b82f6", "group": "delivery"},
+    {"name": "Borzo", "type": "INCOME", "color": "#8b5cf6", "group": "delivery"},
+    {"name": "Zé Delivery", "type": "INCOME", "color": "#f59e0b", "group": "delivery"},
+    {"name": "CornerShop", "type": "INCOME", "color": "#ef4444", "group": "delivery"},
+)
+
+# Receita genérica quando o onboarding não escolhe nenhum app.
+FALLBACK_INCOME = {"name": "Ganhos Diversos", "type": "INCOME", "color": "#059669"}
+
+MODEL_FIELDS = ("name", "type", "color", "is_fuel", "is_maintenance")
+
+
+def groups_for(work_type):
+    return WORK_TYPE_GROUPS.get(work_type, ())
+
+
+def signup_templates():
+    """
+    Categorias do cadastro, iguais para todo usuário. As de receita do
+    work_type vêm depois, no onboarding (ver income_templates).
+    """
+    return [t for t in TEMPLATES if t.get("signup")]
+
+
+def income_templates(groups=(), names=None):
+    """
+    Apps de receita dos `groups` ou, se `names` for informado, só os apps
+    do catálogo com esses nomes (na ordem pedida).
+    """
+    income = {t["name"]: t for t in TEMPLATES if t["type"] == "INCOME"}
+    if names is not None:
+        return [income[name] for name in dict.fromkeys(names) if name in income]
+    return [t for t in income.values() if t.get("group") in groups]
+
+
+def provision(user, templates, check_existing=True):
+    """
+    Cria para `user` as categorias dos modelos que ele ainda não tem (mesmo
+    nome e tipo): uma consulta para os nomes existentes e um bulk_create.
+    Usuário recém-criado dispensa a consulta (check_existing=False).
+    """
+    existing = set()
+    if check_existing and templates:
+        existing = set(
+            Category.objects.filter(
+                user=user, name__in={t["name"] for t in templates}
+            ).values_list("name", "type")
+        )
+
+    categories = [
+        Category(user=user, **{f: t[f] for f in MODEL_FIELDS if f in t})
+        for t in templates
+        if (t["name"], t["type"]) not in existing
+    ]
+    if categories:
+        Category.objects.bulk_create(categories)
+        dashboard_cache.bump_version(user.pk)
+    return categories
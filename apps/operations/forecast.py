@@ -0,0 +1,68 @@
+"""
+Previsão de manutenções.
+
+Estima quantos km por dia cada veículo roda a partir dos plantões
+encerrados recentes e projeta a data em que cada `next_due_km` pendente
+(de Transaction e Maintenance) será alcançado. As funções daqui são puras:
+as consultas em lote ficam em MaintenanceForecastManager.refresh().
+"""
+
+import math
+from datetime import timedelta
+
+# Janela (em dias corridos) usada para estimar a rodagem diária.
+FORECAST_WINDOW_DAYS = 60
+
+
+def km_per_day(km_driven, first_date, as_of):
+    """
+    Rodagem média por dia corrido entre o primeiro plantão da janela e
+    `as_of`, contando como zero os dias sem plantão. None sem histórico.
+    """
+    if not km_driven or first_date is None:
+        return None
+
+    days = (as_of - first_date).days + 1
+    if days <= 0:
+        return None
+    return km_driven / days
+
+
+def project(due_km, odometer, rate, as_of):
+    """
+    Quantos km faltam para `due_km` e em que data eles serão alcançados.
+    Itens já vencidos ficam com a data de hoje; sem rodagem conhecida a
+    data fica em aberto.
+    """
+    remaining = due_km - odometer
+    if remaining <= 0:
+        return remaining, as_of
+    if not rate:
+        return remaining, None
+    return remaining, as_of + timedelta(days=math.ceil(remaining / rate))
+
+
+def latest_by(rows, key):
+    """Primeira linha de cada grupo `key` (as linhas já vêm ordenadas)."""
+    seen = {}
+    for row in rows:
+        seen.setdefault(key(row), row)
+    return list(seen.values())
+
+
+def build_items(pending, odometer, rate, as_of):
+    """
+    Monta os itens pendentes do veículo, do mais próximo ao mais distante.
+    `pending` são dicts com source, id, label e due_km.
+    """
+    items = []
+    for item in pending:
+        remaining, due_date = project(item["due_km"], odometer, rate, as_of)
+        items.append(
+            {
+                **item,
+                "remaining_km": remaining,
+                "due_date": due_date.isoformat() if due_date else None,
+            }
+        )
+    return sorted(items, key=lambda i: (i["due_km"], i["source"], i["id"]))
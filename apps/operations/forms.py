@@ -181,6 +181,7 @@ class DailyRecordForm(ValidationMixin, forms.ModelForm):
 
     def __init__(self, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         self.fields["vehicle"].queryset = Vehicle.objects.filter(
             user=user, is_active=True
         )
@@ -212,6 +213,16 @@ class DailyRecordForm(ValidationMixin, forms.ModelForm):
                     "A distância percorrida parece muito alta (>1500km). Verifique os valores.",
                 )
 
+        # Sem KM final o registro volta a ficar em aberto, e só pode haver um
+        # plantão aberto por usuário (restrição no banco).
+        if end is None and "end_km" not in self.errors:
+            others = DailyRecord.objects.filter(user=self.user, is_active=True)
+            if others.exclude(pk=self.instance.pk).exists():
+                self.add_error(
+                    "end_km",
+                    "Você já tem um plantão em aberto. Informe o KM final deste registro.",
+                )
+
     def save(self, commit=True):
         instance = super().save(commit=False)
         instance.is_active = instance.end_km is None
@@ -0,0 +1,203 @@
+"""
+Motor de eficiência de combustível.
+
+Carrega os abastecimentos de um veículo como colunas NumPy (km, litros,
+valor, tanque cheio) e calcula, de forma vetorizada, os ciclos de tanque
+cheio, o consumo entre abastecimentos, medianas móveis e outliers.
+É a única implementação do cálculo de consumo do projeto: FuelCycle,
+VehicleSerializer e Vehicle.fuel_average dependem dela.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+# Faixa de médias (km/l) consideradas plausíveis para carro ou moto.
+MIN_PLAUSIBLE_AVG = 4
+MAX_PLAUSIBLE_AVG = 70
+
+# Janela da mediana móvel e desvio máximo tolerado em relação a ela.
+ROLLING_WINDOW = 5
+OUTLIER_TOLERANCE = 0.5
+
+FILL_FIELDS = ("id", "actual_km", "liters", "amount", "is_full_tank")
+FILL_DTYPE = [
+    ("id", "i8"),
+    ("km", "f8"),
+    ("liters", "f8"),
+    ("amount", "f8"),
+    ("is_full", "?"),
+]
+
+
+def rolling_median(values, window=ROLLING_WINDOW):
+    """Mediana móvel (janela que termina no próprio ponto), ignorando NaN."""
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return values
+
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    # np.sort joga os NaN para o fim de cada janela; a mediana fica entre as
+    # posições centrais dos `valid` primeiros valores.
+    windows = np.sort(np.lib.stride_tricks.sliding_window_view(padded, window))
+    valid = np.count_nonzero(~np.isnan(windows), axis=1)
+
+    low = np.maximum(valid - 1, 0) // 2
+    high = valid // 2
+    rows = np.arange(values.size)
+    median = (windows[rows, low] + windows[rows, high]) / 2
+    return np.where(valid > 0, median, np.nan)
+
+
+def implausible_flags(averages):
+    """Marca médias inválidas ou fora da faixa plausível."""
+    averages = np.asarray(averages, dtype=float)
+    return ~((averages > MIN_PLAUSIBLE_AVG) & (averages < MAX_PLAUSIBLE_AVG))
+
+
+def outlier_flags(averages, window=ROLLING_WINDOW, tolerance=OUTLIER_TOLERANCE):
+    """
+    Marca médias implausíveis (ver implausible_flags) ou que se afastam mais
+    que `tolerance` da mediana móvel.
+    """
+    averages = np.asarray(averages, dtype=float)
+    median = rolling_median(averages, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = np.abs(averages - median) / median
+
+    return implausible_flags(averages) | (deviation > tolerance), median
+
+
+class FuelSeries:
+    """
+    Série de abastecimentos já ordenada por KM. Cada atributo é um array
+    com uma posição por abastecimento.
+    """
+
+    def __init__(self, ids, km, liters, amount, is_full):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.km = np.asarray(km, dtype=float)
+        self.liters = np.asarray(liters, dtype=float)
+        self.amount = np.asarray(amount, dtype=float)
+        self.is_full = np.asarray(is_full, dtype=bool)
+
+    def __len__(self):
+        return self.ids.size
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Recebe tuplas na ordem de FILL_FIELDS (ex.: values_list)."""
+        table = np.array(rows, dtype=FILL_DTYPE).reshape(-1)
+        return cls(
+            table["id"],
+            table["km"],
+            table["liters"],
+            table["amount"],
+            table["is_full"],
+        )
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        """
+        Carrega as colunas direto do banco, já convertendo os decimais para
+        float no SQL (evita criar um Decimal por linha).
+        """
+        rows = (
+            queryset.order_by("actual_km", "id")
+            .annotate(
+                liters_float=Cast("liters", FloatField()),
+                amount_float=Cast("amount", FloatField()),
+            )
+            .values_list(
+                "id", "actual_km", "liters_float", "amount_float", "is_full_tank"
+            )
+        )
+        return cls.from_rows(list(rows))
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        return cls.from_rows(
+            [tuple(getattr(t, f) for f in FILL_FIELDS) for t in transactions]
+        )
+
+    def intervals(self):
+        """
+        Consumo entre abastecimentos consecutivos: distância percorrida e
+        km/l do abastecimento que fecha o intervalo. `index` aponta para
+        esse abastecimento na série. `is_implausible` é a regra de sempre
+        (faixa plausível); `is_outlier` soma a ela o desvio da mediana móvel,
+        para quem quiser o filtro mais rígido.
+        """
+        km_driven = np.diff(self.km)
+        liters = self.liters[1:]
+        valid = (km_driven > 0) & (liters > 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = np.where(valid, km_driven / liters, np.nan)
+
+        outlier, median = outlier_flags(average)
+        return {
+            "index": np.arange(1, len(self)),
+            "km_driven": km_driven,
+            "average": average,
+            "rolling_median": median,
+            "is_implausible": implausible_flags(average),
+            "is_outlier": outlier,
+        }
+
+    def cycles(self):
+        """
+        Ciclos de tanque cheio: cada tanque cheio fecha o ciclo aberto pelo
+        anterior, somando os litros e valores dos abastecimentos parciais
+        do meio. `index` aponta para o tanque cheio que fecha o ciclo.
+        """
+        full = np.flatnonzero(self.is_full)
+        start, end = full[:-1], full[1:]
+
+        cum_liters = np.cumsum(self.liters)
+        cum_amount = np.cumsum(self.amount)
+
+        # Arredonda para centavos/centilitros para não acumular erro de float.
+        km_driven = self.km[end] - self.km[start]
+        liters = np.round(cum_liters[end] - cum_liters[start], 2)
+        cost = np.round(cum_amount[end] - cum_amount[start], 2)
+        valid = (km_driven > 0) & (liters > 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = np.where(valid, km_driven / liters, np.nan)
+            cost_per_km = np.where(valid, cost / km_driven, np.nan)
+
+        outlier, median = outlier_flags(average)
+        return {
+            "index": end,
+            "start_km": self.km[start],
+            "end_km": self.km[end],
+            "km_driven": km_driven,
+            "liters": liters,
+            "cost": cost,
+            "average": average,
+            "cost_per_km": cost_per_km,
+            "rolling_median": median,
+            "is_outlier": outlier,
+        }
+
+    def latest_average(self):
+        """
+        Média do último abastecimento em relação ao anterior: None sem
+        histórico suficiente, 0 quando o intervalo é inválido.
+        """
+        if len(self) < 2:
+            return None
+
+        average = self.intervals()["average"][-1]
+        return 0 if np.isnan(average) else float(average)
+
+
+def to_decimal(value, places=2):
+    """Converte um float do motor para Decimal, ou None quando for NaN."""
+    if np.isnan(value):
+        return None
+    return Decimal(f"{value:.{places}f}")
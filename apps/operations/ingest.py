@@ -0,0 +1,154 @@
+"""
+Importação de transações em lote.
+
+Grava a lista inteira com bulk_create dentro de uma única transação de
+banco. Como bulk_create não dispara os sinais de operations.signals, os
+efeitos colaterais deles são aplicados aqui uma vez por lote: totais dos
+plantões, espelhos de manutenção, consolidados por usuário, hodômetro,
+ciclos de combustível e cache de estatísticas dos veículos.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from core import cache as dashboard_cache
+from vehicles import cache as vehicle_cache
+from vehicles.models import Vehicle
+from . import jobs, ledger, rollups, totals
+from .models import Category, DailyRecord, Maintenance, Transaction
+from .serializers import BulkTransactionSerializer
+
+MAX_BULK_ITEMS = 500
+
+
+def _ids(items, key):
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item.get(key)))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return ids
+
+
+def validate_items(user, items):
+    """
+    Valida cada item com BulkTransactionSerializer. Retorna os dados
+    válidos (com o índice original) e os erros por índice.
+    """
+    context = {
+        "records": DailyRecord.objects.filter(
+            user=user, pk__in=_ids(items, "record")
+        ).in_bulk(),
+        "categories": Category.objects.filter(
+            user=user, pk__in=_ids(items, "category")
+        ).in_bulk(),
+    }
+
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        serializer = BulkTransactionSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+    return valid, errors
+
+
+def maintenance_mirror(user, instance):
+    """Registro de Manutenção (não salvo) que espelha uma despesa de manutenção."""
+    record = instance.record
+    return Maintenance(
+        user=user,
+        vehicle_id=record.vehicle_id,
+        date=record.date,
+        cost=instance.amount,
+        odometer=instance.actual_km or record.end_km or record.start_km,
+        type="OTHER",
+        description=f"Via Dashboard: {instance.description or instance.category.name}",
+        transaction=instance,
+        next_due_km=instance.next_due_km,
+    )
+
+
+MIRRORED_FIELDS = ("amount", "description", "actual_km", "next_due_km")
+
+
+def sync_maintenance_mirror(instance):
+    """
+    Leva valor, descrição, KM e próxima troca da transação ao espelho num
+    único UPDATE, e só quando algum desses campos mudou (comparando com o
+    estado capturado no pre_save).
+    """
+    previous = getattr(instance, "_previous", None)
+    if previous and all(
+        previous[field] == getattr(instance, field) for field in MIRRORED_FIELDS
+    ):
+        return
+
+    changes = {
+        "cost": instance.amount,
+        "description": (
+            f"Via Dashboard: {instance.description or instance.category.name}"
+        ),
+    }
+    if instance.actual_km:
+        changes["odometer"] = instance.actual_km
+    if instance.next_due_km:
+        changes["next_due_km"] = instance.next_due_km
+
+    mirrors = Maintenance.objects.filter(transaction=instance)
+    if not mirrors.update(**changes):
+        return
+
+    if previous is None or previous["amount"] != instance.amount:
+        # O custo do espelho entra nos consolidados pela data da manutenção.
+        user_id, date = mirrors.values_list("user_id", "date").get()
+        rollups.refresh([user_id], [date])
+
+    # Mantém coerente o espelho já carregado via select_related.
+    if Transaction.maintenance_mirror.is_cached(instance):
+        for field, value in changes.items():
+            setattr(instance.maintenance_mirror, field, value)
+
+
+@transaction.atomic
+def create_transactions(user, validated):
+    """
+    Grava as transações já validadas e aplica, uma vez por lote, o que os
+    sinais fariam item a item.
+    """
+    ledger.lock_records({data["record"].pk for data in validated})
+    created = Transaction.objects.bulk_create(
+        [Transaction(**data) for data in validated]
+    )
+
+    Maintenance.objects.bulk_create(
+        [
+            maintenance_mirror(user, t)
+            for t in created
+            if t.type == "COST" and t.category.is_maintenance
+        ]
+    )
+
+    totals.recompute({t.record_id for t in created})
+    ledger.append_created(created)
+    rollups.refresh([user.pk], {t.record.date for t in created})
+
+    odometers = defaultdict(int)
+    fuel_pivots = defaultdict(list)
+    for t in created:
+        vehicle_id = t.record.vehicle_id
+        odometers[vehicle_id] = max(odometers[vehicle_id], t.actual_km or 0)
+        if t.category.is_fuel and t.liters and t.liters > 0 and t.actual_km is not None:
+            fuel_pivots[vehicle_id].append((t.actual_km, t.pk))
+
+    for vehicle_id, km in odometers.items():
+        Vehicle.objects.filter(pk=vehicle_id).bump_odometer(km)
+    for vehicle_id, pivots in fuel_pivots.items():
+        jobs.fuel_cycles_changed(vehicle_id, pivots)
+
+    vehicle_cache.bump_version(*odometers)
+    dashboard_cache.bump_version(user.pk)
+    return created
@@ -0,0 +1,59 @@
+"""
+Dados derivados recalculados fora da requisição (ver common.jobs).
+
+Os sinais e a importação em lote chamam `fuel_cycles_changed` e
+`odometer_changed`. No modo "sync" o recálculo roda na hora, como antes; no
+modo "queue" vira um job por veículo, e rajadas de escrita no mesmo veículo
+se agrupam num único recálculo.
+"""
+
+from common import jobs
+from core import cache as dashboard_cache
+from vehicles import cache as vehicle_cache
+from vehicles.models import Vehicle
+from .models import FuelCycle
+
+
+@jobs.register("operations.rebuild_fuel_cycles")
+def rebuild_fuel_cycles(vehicle_id, pivots=None, touched_id=None):
+    pivots = [tuple(pivot) for pivot in pivots] if pivots else None
+    FuelCycle.objects.rebuild(vehicle_id, pivots, touched_id)
+    vehicle_cache.bump_version(vehicle_id)
+
+
+@jobs.register("operations.refresh_odometer")
+def refresh_odometer(vehicle_id):
+    vehicles = Vehicle.objects.filter(pk=vehicle_id)
+    vehicles.refresh_odometer()
+    vehicle_cache.bump_version(vehicle_id)
+    if jobs.deferred():
+        # Na hora, o sinal da própria escrita já invalidou a dashboard.
+        dashboard_cache.bump_version(*vehicles.values_list("user_id", flat=True))
+
+
+def fuel_cycles_changed(vehicle_id, pivots, touched_id=None):
+    """
+    Recalcula os ciclos de tanque cheio. Na hora, só a janela dos `pivots`;
+    na fila, o histórico inteiro do veículo, pois o job agrupado pode cobrir
+    várias escritas.
+    """
+    if jobs.deferred():
+        jobs.enqueue(
+            "operations.rebuild_fuel_cycles",
+            {"vehicle_id": vehicle_id},
+            key=f"vehicle:{vehicle_id}",
+        )
+    else:
+        jobs.enqueue(
+            "operations.rebuild_fuel_cycles",
+            {"vehicle_id": vehicle_id, "pivots": pivots, "touched_id": touched_id},
+        )
+
+
+def odometer_changed(vehicle_id):
+    """Recalcula o KM registrado do veículo a partir do histórico."""
+    jobs.enqueue(
+        "operations.refresh_odometer",
+        {"vehicle_id": vehicle_id},
+        key=f"vehicle:{vehicle_id}",
+    )
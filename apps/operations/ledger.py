@@ -0,0 +1,232 @@
+"""
+Livro-razão das transações.
+
+Cada inclusão, exclusão e edição que mexe em dinheiro (valor, tipo ou
+plantão) vira um LedgerEntry, sempre inserido e nunca alterado. O lançamento
+guarda o efeito nos totais do plantão e o saldo acumulado do plantão, de
+modo que o saldo do último lançamento é o total que o plantão deveria ter,
+independente de edições diretas em DailyRecord (DailyRecordForm, admin).
+
+operations.totals chama `append` a cada escrita; a importação em lote usa
+`append_created`. `replay` e `check` servem aos comandos
+rebuild_ledger_totals e check_ledger. As transações anteriores ao
+livro-razão foram lançadas como inclusão pela migração que o criou.
+"""
+
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+
+from core import cache as dashboard_cache
+from . import rollups
+from .models import DailyRecord, LedgerCheckpoint, LedgerEntry
+
+ZERO = Decimal("0.00")
+
+
+def lock_records(record_ids):
+    """
+    Trava as linhas dos plantões (SELECT ... FOR UPDATE, em ordem de pk)
+    até o fim da transação de banco: os saldos lidos depois disso não mudam
+    por uma escrita concorrente. No SQLite, que não trava linhas, a primeira
+    escrita já trava o banco inteiro e a consulta é dispensada.
+    """
+    record_ids = sorted({pk for pk in record_ids if pk})
+    if record_ids and connection.features.has_select_for_update:
+        list(
+            DailyRecord.objects.select_for_update()
+            .filter(pk__in=record_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+
+def last_balances(record_ids):
+    """{record_id: (receita, custo)} do último lançamento de cada plantão."""
+    record_ids = set(record_ids)
+    if not record_ids:
+        return {}
+
+    latest = (
+        LedgerEntry.objects.filter(record_id__in=record_ids)
+        .order_by()
+        .values("record_id")
+        .annotate(last=Max("id"))
+        .values("last")
+    )
+    return {
+        record_id: (income, cost)
+        for record_id, income, cost in LedgerEntry.objects.filter(id__in=latest)
+        .order_by()
+        .values_list("record_id", "balance_income", "balance_cost")
+    }
+
+
+def last_state(transaction_id):
+    """Plantão, tipo e valor da transação no último lançamento, ou None."""
+    return (
+        LedgerEntry.objects.filter(transaction_id=transaction_id)
+        .exclude(event=LedgerEntry.DELETE)
+        .order_by("-id")
+        .values("record_id", "type", "amount")
+        .first()
+    )
+
+
+def _entries(event, transaction, user_id, deltas, balances):
+    entries = []
+    for record_id, (income, cost) in deltas.items():
+        old_income, old_cost = balances.get(record_id, (ZERO, ZERO))
+        balances[record_id] = (old_income + income, old_cost + cost)
+        entries.append(
+            LedgerEntry(
+                event=event,
+                transaction_id=transaction.pk,
+                record_id=record_id,
+                user_id=user_id,
+                type=transaction.type,
+                amount=transaction.amount,
+                income_delta=income,
+                cost_delta=cost,
+                balance_income=balances[record_id][0],
+                balance_cost=balances[record_id][1],
+            )
+        )
+    return entries
+
+
+def append(event, transaction, deltas):
+    """
+    Lança o evento da transação com os efeitos `deltas`
+    ({record_id: (receita, custo)}): uma consulta para os saldos anteriores
+    e um INSERT. Deve rodar na mesma transação de banco da escrita, com os
+    plantões travados por lock_records, que serializa os lançamentos
+    concorrentes no mesmo plantão.
+    """
+    if event == LedgerEntry.UPDATE:
+        deltas = {k: v for k, v in deltas.items() if any(v)}
+        if not deltas:
+            return []
+
+    balances = last_balances(deltas)
+    return LedgerEntry.objects.bulk_create(
+        _entries(event, transaction, transaction.record.user_id, deltas, balances)
+    )
+
+
+def append_created(transactions):
+    """
+    Lança a inclusão de várias transações (importação em lote), com os
+    plantões já travados por lock_records.
+    """
+    balances = last_balances({t.record_id for t in transactions})
+    entries = []
+    for t in transactions:
+        signed = Decimal(str(t.amount))
+        delta = (signed, ZERO) if t.type == "INCOME" else (ZERO, signed)
+        entries.extend(
+            _entries(
+                LedgerEntry.CREATE,
+                t,
+                t.record.user_id,
+                {t.record_id: delta},
+                balances,
+            )
+        )
+    return LedgerEntry.objects.bulk_create(entries)
+
+
+def replay(record_ids):
+    """
+    {record_id: (receita, custo)} somando os efeitos de todos os lançamentos
+    dos plantões (uma consulta). Plantões sem lançamentos ficam zerados.
+    """
+    totals = {pk: (ZERO, ZERO) for pk in record_ids}
+    rows = (
+        LedgerEntry.objects.filter(record_id__in=totals)
+        .order_by()
+        .values("record_id")
+        .annotate(income=Sum("income_delta"), cost=Sum("cost_delta"))
+    )
+    for row in rows:
+        totals[row["record_id"]] = (row["income"] or ZERO, row["cost"] or ZERO)
+    return totals
+
+
+def _differs(a, b):
+    return abs(Decimal(str(a)) - Decimal(str(b))) > Decimal("0.005")
+
+
+def check(after_id=0, limit=5000):
+    """
+    Confere os plantões que receberam lançamentos depois de `after_id` (no
+    máximo `limit` lançamentos). Devolve (problemas, último id conferido);
+    cada problema é (record_id, tipo, saldo do livro-razão, valor esperado).
+
+    "chain": o saldo do último lançamento não é a soma dos efeitos.
+    "totals": os totais gravados em DailyRecord divergem do saldo.
+    """
+    window = list(
+        LedgerEntry.objects.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list("id", "record_id")[:limit]
+    )
+    if not window:
+        return [], after_id
+
+    record_ids = {record_id for _, record_id in window}
+    balances = last_balances(record_ids)
+    sums = replay(record_ids)
+    stored = {
+        pk: (income, cost)
+        for pk, income, cost in DailyRecord.objects.filter(
+            pk__in=record_ids
+        ).values_list("pk", "total_income", "total_cost")
+    }
+
+    problems = []
+    for record_id in sorted(record_ids):
+        balance = balances[record_id]
+        if any(map(_differs, balance, sums[record_id])):
+            problems.append((record_id, "chain", balance, sums[record_id]))
+        if record_id in stored and any(map(_differs, balance, stored[record_id])):
+            problems.append((record_id, "totals", balance, stored[record_id]))
+    return problems, window[-1][0]
+
+
+def checkpoint(name):
+    return LedgerCheckpoint.objects.get_or_create(name=name)[0]
+
+
+def rebuild_totals(record_ids):
+    """
+    Regrava os totais dos plantões com o saldo do livro-razão: uma consulta
+    agregada e um bulk_update por chamada, mais o refresh dos consolidados
+    dos dias alterados, tudo numa transação de banco com os plantões
+    travados. Devolve quantos plantões mudaram.
+    """
+    with transaction.atomic():
+        lock_records(record_ids)
+        return _rebuild_totals(record_ids)
+
+
+def _rebuild_totals(record_ids):
+    replayed = replay(record_ids)
+    rows = DailyRecord.objects.filter(pk__in=replayed).values_list(
+        "pk", "user_id", "date", "total_income", "total_cost"
+    )
+    stale = [
+        DailyRecord(
+            pk=pk, user_id=user_id, date=date, total_income=income, total_cost=cost
+        )
+        for pk, user_id, date, stored_income, stored_cost in rows
+        for income, cost in [replayed[pk]]
+        if _differs(income, stored_income) or _differs(cost, stored_cost)
+    ]
+    DailyRecord.objects.bulk_update(stale, ["total_income", "total_cost"])
+
+    users = {record.user_id for record in stale}
+    rollups.refresh(users, {record.date for record in stale})
+    dashboard_cache.bump_version(*users)
+    return len(stale)
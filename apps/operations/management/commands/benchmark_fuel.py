@@ -0,0 +1,74 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from operations.fuel import FuelSeries
+
+
+def legacy_cycles(rows):
+    """Laço linha a linha que existia nas views, mantido só como referência."""
+    cycles = []
+    last_full = None
+    pending_liters = 0
+    pending_cost = 0
+
+    for _id, km, liters, amount, is_full in rows:
+        if is_full:
+            if last_full is not None:
+                km_driven = km - last_full
+                total_liters = pending_liters + liters
+                if km_driven > 0 and total_liters > 0:
+                    cycles.append(km_driven / total_liters)
+            last_full = km
+            pending_liters = 0
+            pending_cost = 0
+        else:
+            pending_liters += liters
+            pending_cost += amount
+
+    return cycles
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o motor de consumo (operations.fuel) com abastecimentos "
+        "sintéticos de um único veículo, sem tocar no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fills", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        km = 10000
+        rows = []
+        for i in range(options["fills"]):
+            km += rnd.randint(80, 600)
+            liters = round(rnd.uniform(5, 45), 2)
+            rows.append((i, km, liters, round(liters * 5.9, 2), rnd.random() < 0.7))
+
+        def measure(fn):
+            best = float("inf")
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            return best * 1000
+
+        series = FuelSeries.from_rows(rows)
+
+        def engine():
+            series.cycles()
+            series.intervals()
+
+        load_ms = measure(lambda: FuelSeries.from_rows(rows))
+        engine_ms = measure(engine)
+        legacy_ms = measure(lambda: legacy_cycles(rows))
+
+        self.stdout.write(f"Abastecimentos: {len(rows)}")
+        self.stdout.write(f"Carga em colunas: {load_ms:.2f} ms")
+        self.stdout.write(
+            f"Motor (ciclos + intervalos + medianas + outliers): {engine_ms:.2f} ms"
+        )
+        self.stdout.write(f"Laço legado (apenas ciclos): {legacy_ms:.2f} ms")
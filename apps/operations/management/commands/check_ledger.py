@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from operations import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere o livro-razão das transações a partir do último ponto de "
+        "verificação: integridade dos saldos acumulados e totais dos "
+        "plantões. Com --fix, regrava os totais divergentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--name",
+            default="default",
+            help="Nome do ponto de verificação (um por rotina agendada).",
+        )
+        parser.add_argument(
+            "--from-start",
+            action="store_true",
+            help="Ignora o ponto de verificação e confere todo o livro-razão.",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Regrava com o saldo do livro-razão os totais divergentes.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Quantidade de lançamentos conferidos por vez.",
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = ledger.checkpoint(options["name"])
+        last_id = 0 if options["from_start"] else checkpoint.last_entry_id
+
+        problems = []
+        while True:
+            found, next_id = ledger.check(last_id, options["batch_size"])
+            if next_id == last_id:
+                break
+            problems += found
+            last_id = next_id
+
+        for record_id, kind, balance, expected in problems:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Plantão {record_id} ({kind}): livro-razão {balance}, "
+                    f"esperado {expected}"
+                )
+            )
+
+        broken = [p for p in problems if p[1] == "chain"]
+        if options["fix"]:
+            stale = {p[0] for p in problems if p[1] == "totals"}
+            ledger.rebuild_totals(stale)
+
+        # Só avança o ponto de verificação se nada ficou pendente.
+        if not broken and (options["fix"] or not problems):
+            checkpoint.last_entry_id = max(last_id, checkpoint.last_entry_id)
+            checkpoint.save(update_fields=["last_entry_id", "updated_at"])
+
+        if problems:
+            self.stdout.write(
+                self.style.WARNING(f"{len(problems)} divergências encontradas.")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Livro-razão em dia até o lançamento #{last_id}.")
+            )
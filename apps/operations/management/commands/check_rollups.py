@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core import cache as dashboard_cache
+from operations import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere os consolidados mensais e gerais (UserMonthlyStats e "
+        "UserLifetimeStats) contra os plantões, transações e manutenções. "
+        "Com --fix, refaz os consolidados dos usuários divergentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Refaz os consolidados dos usuários com divergência.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Quantidade de usuários conferidos por vez.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Confere só este usuário (pode repetir).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        users = get_user_model().objects.order_by("pk")
+        if options["users"]:
+            users = users.filter(pk__in=options["users"])
+        ids = list(users.values_list("pk", flat=True))
+
+        problems = []
+        for i in range(0, len(ids), chunk_size):
+            problems += rollups.check(ids[i : i + chunk_size])
+
+        for user_id, month, field, stored, expected in problems:
+            period = f"{month:%m/%Y}" if month else "total geral"
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Usuário {user_id} ({period}, {field}): gravado {stored}, "
+                    f"esperado {expected}"
+                )
+            )
+
+        stale = sorted({p[0] for p in problems})
+        if options["fix"] and stale:
+            for i in range(0, len(stale), chunk_size):
+                chunk = stale[i : i + chunk_size]
+                rollups.refresh(chunk)
+                dashboard_cache.bump_version(*chunk)
+
+        if problems:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(problems)} divergências em {len(stale)} usuários."
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Consolidados em dia para {len(ids)} usuários.")
+            )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core import cache as dashboard_cache
+from operations.models import MaintenanceForecast
+from vehicles.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula a previsão de manutenção (data estimada para cada "
+        "next_due_km pendente) de todos os veículos. Pensado para rodar "
+        "uma vez por noite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Quantidade de veículos calculados por lote.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        as_of = timezone.localdate()
+        rows = list(Vehicle.objects.order_by("pk").values_list("pk", "user_id"))
+        ids = [pk for pk, _ in rows]
+
+        for start in range(0, len(ids), batch_size):
+            MaintenanceForecast.objects.refresh(
+                ids[start : start + batch_size], as_of
+            )
+
+        # A previsão aparece na dashboard de cada usuário.
+        dashboard_cache.bump_version(*{user_id for _, user_id in rows})
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Previsão calculada para {len(ids)} veículos.")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from operations.models import FuelCycle
+from vehicles.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero os ciclos de tanque cheio (FuelCycle) dos veículos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vehicle",
+            type=int,
+            action="append",
+            help="ID do veículo (pode repetir). Sem ele, processa todos.",
+        )
+
+    def handle(self, *args, **options):
+        vehicle_ids = options["vehicle"] or Vehicle.objects.order_by(
+            "pk"
+        ).values_list("pk", flat=True)
+
+        total = 0
+        for vehicle_id in vehicle_ids:
+            total += len(FuelCycle.objects.rebuild(vehicle_id))
+
+        self.stdout.write(self.style.SUCCESS(f"{total} ciclos recalculados."))
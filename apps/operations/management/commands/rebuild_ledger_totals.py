@@ -0,0 +1,53 @@
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from operations import ledger
+from operations.models import DailyRecord
+
+
+def rebuild_chunk(record_ids):
+    django.setup()
+    return ledger.rebuild_totals(record_ids)
+
+
+class Command(BaseCommand):
+    help = (
+        "Regrava os totais dos plantões a partir do livro-razão das "
+        "transações, em lotes distribuídos entre vários processos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Quantidade de processos que refazem os lotes em paralelo.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Quantidade de plantões por lote.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        ids = list(DailyRecord.objects.order_by("pk").values_list("pk", flat=True))
+        chunks = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+        if options["processes"] > 1 and len(chunks) > 1:
+            # Cada processo abre as próprias conexões.
+            connections.close_all()
+            with multiprocessing.Pool(options["processes"]) as pool:
+                changed = sum(pool.imap_unordered(rebuild_chunk, chunks))
+        else:
+            changed = sum(ledger.rebuild_totals(chunk) for chunk in chunks)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(ids)} plantões conferidos, {changed} com totais regravados."
+            )
+        )
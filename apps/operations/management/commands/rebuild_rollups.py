@@ -0,0 +1,67 @@
+import multiprocessing
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import cache as dashboard_cache
+from operations import rollups
+
+
+def rebuild_chunk(user_ids):
+    django.setup()
+    days = rollups.refresh(user_ids)
+    dashboard_cache.bump_version(*user_ids)
+    return days
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz os consolidados diários, mensais e gerais (UserDailyStats, "
+        "UserMonthlyStats e UserLifetimeStats) a partir dos plantões, "
+        "transações e manutenções, em lotes de usuários."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Quantidade de processos que refazem os lotes em paralelo.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Quantidade de usuários por lote.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Refaz só este usuário (pode repetir).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        users = get_user_model().objects.order_by("pk")
+        if options["users"]:
+            users = users.filter(pk__in=options["users"])
+        ids = list(users.values_list("pk", flat=True))
+        chunks = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+        if options["processes"] > 1 and len(chunks) > 1:
+            # Cada processo abre as próprias conexões.
+            connections.close_all()
+            with multiprocessing.Pool(options["processes"]) as pool:
+                days = sum(pool.imap_unordered(rebuild_chunk, chunks))
+        else:
+            days = sum(rebuild_chunk(chunk) for chunk in chunks)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Consolidados refeitos para {len(ids)} usuários ({days} dias)."
+            )
+        )
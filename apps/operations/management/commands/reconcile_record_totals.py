@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from operations import totals
+from operations.models import DailyRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os totais gravados nos plantões com a soma das transações "
+        "e, com --fix, recalcula os que divergirem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Recalcula os plantões divergentes em vez de só listá-los.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Quantidade de plantões verificados por consulta.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(DailyRecord.objects.order_by("pk").values_list("pk", flat=True))
+
+        mismatched = []
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start : start + batch_size]
+            records = DailyRecord.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1])
+            mismatched += list(records.out_of_sync().values_list("pk", flat=True))
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("Todos os plantões estão em dia."))
+            return
+
+        if not options["fix"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(mismatched)} plantões com totais divergentes: "
+                    + ", ".join(map(str, mismatched))
+                )
+            )
+            return
+
+        for start in range(0, len(mismatched), batch_size):
+            totals.recompute(mismatched[start : start + batch_size])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Totais recalculados para {len(mismatched)} plantões.")
+        )
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.10 on 2026-10-17 23:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_fuel_cycles(apps, schema_editor):
+    FuelCycle = apps.get_model("operations", "FuelCycle")
+    Transaction = apps.get_model("operations", "Transaction")
+
+    fills = (
+        Transaction.objects.filter(
+            category__is_fuel=True, liters__gt=0, actual_km__isnull=False
+        )
+        .select_related("record")
+        .order_by("record__vehicle_id", "actual_km", "id")
+    )
+
+    cycles = []
+    vehicle_id = None
+    last_full = None
+    pending_liters = 0
+    pending_cost = 0
+
+    for trans in fills.iterator():
+        if trans.record.vehicle_id != vehicle_id:
+            vehicle_id = trans.record.vehicle_id
+            last_full = None
+            pending_liters = 0
+            pending_cost = 0
+
+        if not trans.is_full_tank:
+            pending_liters += trans.liters
+            pending_cost += trans.amount
+            continue
+
+        if last_full:
+            liters = pending_liters + trans.liters
+            cost = pending_cost + trans.amount
+            km_driven = trans.actual_km - last_full.actual_km
+            has_avg = km_driven > 0 and liters > 0
+            cycles.append(
+                FuelCycle(
+                    vehicle_id=vehicle_id,
+                    transaction=trans,
+                    start_km=last_full.actual_km,
+                    end_km=trans.actual_km,
+                    liters=liters,
+                    cost=cost,
+                    km_per_liter=round(km_driven / float(liters), 2) if has_avg else None,
+                    cost_per_km=round(float(cost) / km_driven, 2) if has_avg else None,
+                )
+            )
+
+        last_full = trans
+        pending_liters = 0
+        pending_cost = 0
+
+    FuelCycle.objects.bulk_create(cycles, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0010_alter_category_created_at_and_more'),
+        ('vehicles', '0005_vehicle_recorded_km'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FuelCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_km', models.PositiveIntegerField(verbose_name='KM Inicial')),
+                ('end_km', models.PositiveIntegerField(verbose_name='KM Final')),
+                ('liters', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Litros')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo (R$)')),
+                ('km_per_liter', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='Média (km/l)')),
+                ('cost_per_km', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='Custo por KM')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fuel_cycle', to='operations.transaction', verbose_name='Abastecimento que fecha o ciclo')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fuel_cycles', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Ciclo de Abastecimento',
+                'verbose_name_plural': 'Ciclos de Abastecimento',
+                'ordering': ['-end_km'],
+                'indexes': [models.Index(fields=['vehicle', 'end_km'], name='operations__vehicle_929172_idx')],
+            },
+        ),
+        migrations.RunPython(populate_fuel_cycles, migrations.RunPython.noop),
+    ]
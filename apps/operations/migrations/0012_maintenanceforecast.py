@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-17 23:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0011_fuelcycle'),
+        ('vehicles', '0005_vehicle_recorded_km'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(verbose_name='Calculado para')),
+                ('km_per_day', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='Média de KM/dia')),
+                ('next_due_km', models.PositiveIntegerField(null=True, verbose_name='Próximo Vencimento (Km)')),
+                ('remaining_km', models.IntegerField(null=True, verbose_name='KM Restantes')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='Data Prevista')),
+                ('items', models.JSONField(default=list, verbose_name='Vencimentos Pendentes')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='maintenance_forecast', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Previsão de Manutenção',
+                'verbose_name_plural': 'Previsões de Manutenção',
+            },
+        ),
+    ]
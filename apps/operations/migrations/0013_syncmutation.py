@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0012_maintenanceforecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncMutation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, verbose_name='Chave de Idempotência')),
+                ('action', models.CharField(max_length=30, verbose_name='Ação')),
+                ('client_id', models.CharField(blank=True, max_length=100, verbose_name='ID Temporário do Cliente')),
+                ('object_id', models.PositiveBigIntegerField(null=True, verbose_name='ID no Servidor')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Aplicada em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Mutação Sincronizada',
+                'verbose_name_plural': 'Mutações Sincronizadas',
+                'indexes': [models.Index(fields=['user', 'client_id'], name='operations__user_id_e454a9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_sync_key')],
+            },
+        ),
+    ]
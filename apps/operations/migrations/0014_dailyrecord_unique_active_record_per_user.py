@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def close_duplicate_active_records(apps, schema_editor):
+    """
+    Antes da restrição, deixa só o plantão aberto mais recente de cada
+    usuário; os demais (criados por requisições concorrentes) são fechados.
+    """
+    DailyRecord = apps.get_model("operations", "DailyRecord")
+
+    keep = {}
+    stale = []
+    for pk, user_id in (
+        DailyRecord.objects.filter(is_active=True)
+        .order_by("user_id", "-date", "-id")
+        .values_list("id", "user_id")
+    ):
+        if user_id in keep:
+            stale.append(pk)
+        else:
+            keep[user_id] = pk
+
+    if stale:
+        DailyRecord.objects.filter(pk__in=stale).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0013_syncmutation'),
+        ('vehicles', '0005_vehicle_recorded_km'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_active_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user',), name='unique_active_record_per_user'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def collapse_duplicate_mirrors(apps, schema_editor):
+    """
+    Cada transação passa a ter no máximo um espelho de Manutenção. Fica o
+    que a relação antiga devolvia em `.first()` (data mais recente); os
+    demais, duplicados, são removidos para não somar o gasto duas vezes.
+    """
+    Maintenance = apps.get_model("operations", "Maintenance")
+
+    keep = set()
+    stale = []
+    for pk, transaction_id in (
+        Maintenance.objects.filter(transaction__isnull=False)
+        .order_by("transaction_id", "-date", "-id")
+        .values_list("id", "transaction_id")
+    ):
+        if transaction_id in keep:
+            stale.append(pk)
+        else:
+            keep.add(transaction_id)
+
+    if stale:
+        Maintenance.objects.filter(pk__in=stale).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0014_dailyrecord_unique_active_record_per_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_duplicate_mirrors, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='maintenance',
+            name='transaction',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='maintenance_mirror', to='operations.transaction', verbose_name='Transação de Origem'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:17
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Lança as transações existentes como inclusões, plantão a plantão e na
+    ordem de criação, para o saldo acumulado já partir dos totais corretos.
+    """
+    Transaction = apps.get_model("operations", "Transaction")
+    LedgerEntry = apps.get_model("operations", "LedgerEntry")
+
+    zero = Decimal("0.00")
+    record_id = None
+    income = cost = zero
+    batch = []
+    rows = (
+        Transaction.objects.order_by("record_id", "id")
+        .values_list("id", "record_id", "record__user_id", "type", "amount")
+        .iterator(chunk_size=2000)
+    )
+    for pk, rec, user_id, kind, amount in rows:
+        if rec != record_id:
+            record_id, income, cost = rec, zero, zero
+        delta = (amount, zero) if kind == "INCOME" else (zero, amount)
+        income, cost = income + delta[0], cost + delta[1]
+        batch.append(
+            LedgerEntry(
+                event="CREATE",
+                transaction_id=pk,
+                record_id=rec,
+                user_id=user_id,
+                type=kind,
+                amount=amount,
+                income_delta=delta[0],
+                cost_delta=delta[1],
+                balance_income=income,
+                balance_cost=cost,
+            )
+        )
+        if len(batch) >= 2000:
+            LedgerEntry.objects.bulk_create(batch)
+            batch = []
+    LedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0015_maintenance_transaction_one_to_one'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Verificação')),
+                ('last_entry_id', models.BigIntegerField(default=0, verbose_name='Último Lançamento')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Ponto de Verificação do Livro-Razão',
+                'verbose_name_plural': 'Pontos de Verificação do Livro-Razão',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event', models.CharField(choices=[('CREATE', 'Inclusão'), ('UPDATE', 'Edição'), ('DELETE', 'Exclusão')], max_length=10, verbose_name='Evento')),
+                ('transaction_id', models.BigIntegerField(verbose_name='Transação')),
+                ('record_id', models.BigIntegerField(verbose_name='Plantão')),
+                ('user_id', models.BigIntegerField(verbose_name='Usuário')),
+                ('type', models.CharField(choices=[('INCOME', 'Receita'), ('COST', 'Despesa')], max_length=10, verbose_name='Tipo')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor')),
+                ('income_delta', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Efeito na Receita')),
+                ('cost_delta', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Efeito no Custo')),
+                ('balance_income', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Receita Acumulada')),
+                ('balance_cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Custo Acumulado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Lançado em')),
+            ],
+            options={
+                'verbose_name': 'Lançamento do Livro-Razão',
+                'verbose_name_plural': 'Livro-Razão das Transações',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['record_id', 'id'], name='operations__record__9bfc78_idx'), models.Index(fields=['transaction_id', 'id'], name='operations__transac_c4ff4b_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
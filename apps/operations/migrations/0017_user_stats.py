@@ -0,0 +1,148 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:26
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+FIELDS = (
+    "income",
+    "cost",
+    "fuel_cost",
+    "maintenance_cost",
+    "other_cost",
+    "maintenance_log_cost",
+    "km",
+    "shifts",
+)
+
+
+def backfill_stats(apps, schema_editor):
+    """Consolidados iniciais a partir dos plantões, transações e manutenções."""
+    DailyRecord = apps.get_model("operations", "DailyRecord")
+    Transaction = apps.get_model("operations", "Transaction")
+    Maintenance = apps.get_model("operations", "Maintenance")
+    UserDailyStats = apps.get_model("operations", "UserDailyStats")
+    UserMonthlyStats = apps.get_model("operations", "UserMonthlyStats")
+
+    daily = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+
+    for row in (
+        DailyRecord.objects.order_by()
+        .values("user_id", "date")
+        .annotate(
+            income=Sum("total_income"),
+            cost=Sum("total_cost"),
+            km=Sum(F("end_km") - F("start_km")),
+            shifts=Count("id"),
+        )
+    ):
+        key = (row.pop("user_id"), row.pop("date"))
+        daily[key].update({k: v or 0 for k, v in row.items()})
+
+    for row in (
+        Transaction.objects.filter(type="COST")
+        .order_by()
+        .values("record__user_id", "record__date")
+        .annotate(
+            fuel_cost=Sum(
+                "amount",
+                filter=Q(category__is_maintenance=False, category__is_fuel=True),
+            ),
+            maintenance_cost=Sum("amount", filter=Q(category__is_maintenance=True)),
+            other_cost=Sum(
+                "amount",
+                filter=Q(category__is_maintenance=False, category__is_fuel=False),
+            ),
+        )
+    ):
+        key = (row.pop("record__user_id"), row.pop("record__date"))
+        daily[key].update({k: v or 0 for k, v in row.items()})
+
+    for row in (
+        Maintenance.objects.order_by()
+        .values("user_id", "date")
+        .annotate(total=Sum("cost"))
+    ):
+        daily[(row["user_id"], row["date"])]["maintenance_log_cost"] = row["total"] or 0
+
+    monthly = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for (user_id, date), values in daily.items():
+        month = monthly[(user_id, date.replace(day=1))]
+        for field in FIELDS:
+            month[field] += values[field]
+
+    UserDailyStats.objects.bulk_create(
+        [
+            UserDailyStats(user_id=user_id, date=date, **values)
+            for (user_id, date), values in daily.items()
+        ],
+        batch_size=2000,
+    )
+    UserMonthlyStats.objects.bulk_create(
+        [
+            UserMonthlyStats(user_id=user_id, month=month, **values)
+            for (user_id, month), values in monthly.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0016_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo')),
+                ('fuel_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Combustível')),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Manutenção')),
+                ('other_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Outros Custos')),
+                ('maintenance_log_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Manutenções Registradas')),
+                ('km', models.IntegerField(default=0, verbose_name='KM Rodados')),
+                ('shifts', models.PositiveIntegerField(default=0, verbose_name='Plantões')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('date', models.DateField(verbose_name='Data')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Consolidado Diário',
+                'verbose_name_plural': 'Consolidados Diários',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_stats_per_user')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo')),
+                ('fuel_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Combustível')),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Manutenção')),
+                ('other_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Outros Custos')),
+                ('maintenance_log_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Manutenções Registradas')),
+                ('km', models.IntegerField(default=0, verbose_name='KM Rodados')),
+                ('shifts', models.PositiveIntegerField(default=0, verbose_name='Plantões')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('month', models.DateField(verbose_name='Mês')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Consolidado Mensal',
+                'verbose_name_plural': 'Consolidados Mensais',
+                'ordering': ['-month'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_monthly_stats_per_user')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+FIELDS = (
+    "income",
+    "cost",
+    "fuel_cost",
+    "maintenance_cost",
+    "other_cost",
+    "maintenance_log_cost",
+    "km",
+    "shifts",
+)
+
+
+def backfill_lifetime(apps, schema_editor):
+    """Totais gerais iniciais a partir dos consolidados mensais."""
+    UserMonthlyStats = apps.get_model("operations", "UserMonthlyStats")
+    UserLifetimeStats = apps.get_model("operations", "UserLifetimeStats")
+
+    rows = (
+        UserMonthlyStats.objects.order_by()
+        .values("user_id")
+        .annotate(**{field: Sum(field) for field in FIELDS})
+    )
+    UserLifetimeStats.objects.bulk_create(
+        [UserLifetimeStats(**row) for row in rows], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0017_user_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLifetimeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo')),
+                ('fuel_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Combustível')),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Custo com Manutenção')),
+                ('other_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Outros Custos')),
+                ('maintenance_log_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Manutenções Registradas')),
+                ('km', models.IntegerField(default=0, verbose_name='KM Rodados')),
+                ('shifts', models.PositiveIntegerField(default=0, verbose_name='Plantões')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lifetime_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Consolidado Geral',
+                'verbose_name_plural': 'Consolidados Gerais',
+            },
+        ),
+        migrations.RunPython(backfill_lifetime, migrations.RunPython.noop),
+    ]
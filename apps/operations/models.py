@@ -1,10 +1,82 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import (
+    Abs,
+    Coalesce,
+    Greatest,
+    TruncMonth,
+    TruncQuarter,
+    TruncYear,
+)
 from django.conf import settings
+from django.utils import timezone
 from common.models import TimeStampedModel
 from vehicles.models import Vehicle
+from . import forecast
+from .fuel import FuelSeries, to_decimal
 
 
-class DailyRecord(TimeStampedModel):
+class AtomicSaveModel(TimeStampedModel):
+    """
+    Grava a linha e roda os sinais de post_save (totais, livro-razão,
+    consolidados, ver operations.signals) numa só transação de banco: ou
+    tudo é gravado, ou nada. A exclusão já faz isso (Collector.delete).
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class DailyRecordQuerySet(models.QuerySet):
+    @staticmethod
+    def computed_total(kind):
+        """Soma das transações do tipo `kind` do plantão (subquery)."""
+        money = models.DecimalField(max_digits=10, decimal_places=2)
+        return Coalesce(
+            Subquery(
+                Transaction.objects.filter(record_id=OuterRef("pk"), type=kind)
+                .order_by()
+                .values("record_id")
+                .annotate(t=Sum("amount"))
+                .values("t")[:1],
+                output_field=money,
+            ),
+            Value(0, output_field=money),
+        )
+
+    def out_of_sync(self):
+        """Plantões cujos totais gravados divergem das transações."""
+        # Compara com tolerância de meio centavo: no SQLite as somas de
+        # decimais voltam como ponto flutuante.
+        cent = Decimal("0.005")
+        return self.annotate(
+            income_diff=Abs(F("total_income") - self.computed_total("INCOME")),
+            cost_diff=Abs(F("total_cost") - self.computed_total("COST")),
+        ).filter(Q(income_diff__gt=cent) | Q(cost_diff__gt=cent))
+
+    def shift_conflict(self, user, date, exclude=None):
+        """
+        Por que a gravação de um plantão violou as restrições do banco:
+        "active" (já há outro plantão em aberto), "date" (já há outro plantão
+        na data) ou None se nenhuma das duas explica o erro. Só é consultado
+        depois do IntegrityError, para o INSERT seguir sem verificações
+        prévias.
+        """
+        others = self.filter(user=user).exclude(pk=exclude)
+        if others.filter(is_active=True).exists():
+            return "active"
+        if others.filter(date=date).exists():
+            return "date"
+        return None
+
+
+class DailyRecord(AtomicSaveModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     vehicle = models.ForeignKey(Vehicle, on_delete=models.PROTECT)
     date = models.DateField("Data do Registro")
@@ -18,10 +90,19 @@ class DailyRecord(TimeStampedModel):
         "Custos Totais", max_digits=10, decimal_places=2, default=0
     )
 
+    objects = DailyRecordQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Registro Diário"
         verbose_name_plural = "Registros Diários"
         unique_together = ["user", "date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=Q(is_active=True),
+                name="unique_active_record_per_user",
+            ),
+        ]
         ordering = ["-date"]
 
     def __str__(self):
@@ -60,7 +141,68 @@ class DailyRecord(TimeStampedModel):
         return 0
 
 
-class Maintenance(TimeStampedModel):
+# Agrupamentos aceitos por MaintenanceQuerySet.by_period: função de
+# truncamento no banco e rótulo do período.
+MAINTENANCE_PERIODS = {
+    "month": (TruncMonth, lambda d: d.strftime("%Y-%m")),
+    "quarter": (TruncQuarter, lambda d: f"{d.year}-T{(d.month - 1) // 3 + 1}"),
+    "year": (TruncYear, lambda d: str(d.year)),
+}
+
+
+class MaintenanceQuerySet(models.QuerySet):
+    def in_period(self, start=None, end=None):
+        qs = self
+        if start:
+            qs = qs.filter(date__gte=start)
+        if end:
+            qs = qs.filter(date__lte=end)
+        return qs
+
+    def by_type(self):
+        """Total e quantidade por tipo, agrupados no banco (maior total antes)."""
+        labels = dict(Maintenance.TYPE_CHOICES)
+        rows = (
+            self.order_by()
+            .values("type")
+            .annotate(total=Sum("cost"), count=models.Count("id"))
+            .order_by("-total", "type")
+        )
+        return [
+            {
+                "type": row["type"],
+                "name": labels.get(row["type"], row["type"]),
+                "total": row["total"],
+                "count": row["count"],
+            }
+            for row in rows
+        ]
+
+    def by_period(self, period="month"):
+        """
+        Série de custos por mês, trimestre ou ano, agrupada no banco e em
+        ordem cronológica. Períodos sem manutenção não aparecem.
+        """
+        trunc, label = MAINTENANCE_PERIODS[period]
+        rows = (
+            self.order_by()
+            .annotate(bucket=trunc("date"))
+            .values("bucket")
+            .annotate(total=Sum("cost"), count=models.Count("id"))
+            .order_by("bucket")
+        )
+        return [
+            {
+                "period": label(row["bucket"]),
+                "start": row["bucket"],
+                "total": row["total"],
+                "count": row["count"],
+            }
+            for row in rows
+        ]
+
+
+class Maintenance(AtomicSaveModel):
     TYPE_CHOICES = (
         ("OIL", "Troca de Óleo"),
         ("TIRES", "Pneus"),
@@ -79,7 +221,7 @@ class Maintenance(TimeStampedModel):
     type = models.CharField("Tipo", max_length=20, choices=TYPE_CHOICES)
     description = models.CharField("Descrição/Oficina", max_length=200, blank=True)
     next_due_km = models.PositiveIntegerField("Próxima Troca (Km)", null=True, blank=True)
-    transaction = models.ForeignKey(
+    transaction = models.OneToOneField(
         'Transaction', 
         on_delete=models.SET_NULL, 
         null=True, 
@@ -88,6 +230,8 @@ class Maintenance(TimeStampedModel):
         verbose_name="Transação de Origem"
     )
 
+    objects = MaintenanceQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Manutenção"
         verbose_name_plural = "Manutenções"
@@ -97,7 +241,7 @@ class Maintenance(TimeStampedModel):
         return f"{self.get_type_display()} - {self.vehicle}"
 
 
-class Category(TimeStampedModel):
+class Category(AtomicSaveModel):
     TYPE_CHOICES = (
         ("INCOME", "Receita"),
         ("COST", "Despesa"),
@@ -121,7 +265,7 @@ class Category(TimeStampedModel):
         return self.name
 
 
-class Transaction(TimeStampedModel):
+class Transaction(AtomicSaveModel):
     TYPE_CHOICES = (
         ("INCOME", "Receita"),
         ("COST", "Despesa"),
@@ -150,3 +294,465 @@ class Transaction(TimeStampedModel):
 
     def __str__(self):
         return f"{self.category.name} - R$ {self.amount}"
+
+
+class FuelCycleManager(models.Manager):
+    def rebuild(self, vehicle_id, pivots=None, touched_id=None):
+        """
+        Recalcula os ciclos de tanque cheio de um veículo.
+
+        Sem `pivots` refaz todo o histórico. Com `pivots` (pares
+        (actual_km, transaction_id) das posições alteradas) refaz apenas a
+        janela entre o tanque cheio anterior ao primeiro pivô e o tanque cheio
+        seguinte ao último, ou seja, o ciclo afetado e o vizinho.
+        """
+        fills = Transaction.objects.filter(
+            record__vehicle_id=vehicle_id,
+            category__is_fuel=True,
+            liters__gt=0,
+            actual_km__isnull=False,
+        )
+        full_tanks = fills.filter(is_full_tank=True)
+        window = fills
+        start = None
+
+        if pivots:
+            lo_km, lo_id = min(pivots)
+            hi_km, hi_id = max(pivots)
+
+            start = (
+                full_tanks.filter(
+                    models.Q(actual_km__lt=lo_km)
+                    | models.Q(actual_km=lo_km, id__lt=lo_id)
+                )
+                .order_by("-actual_km", "-id")
+                .values("actual_km", "id")
+                .first()
+            )
+            end = (
+                full_tanks.filter(
+                    models.Q(actual_km__gt=hi_km)
+                    | models.Q(actual_km=hi_km, id__gt=hi_id)
+                )
+                .order_by("actual_km", "id")
+                .values("actual_km", "id")
+                .first()
+            )
+
+            if start:
+                window = window.filter(
+                    models.Q(actual_km__gt=start["actual_km"])
+                    | models.Q(actual_km=start["actual_km"], id__gte=start["id"])
+                )
+            if end:
+                window = window.filter(
+                    models.Q(actual_km__lt=end["actual_km"])
+                    | models.Q(actual_km=end["actual_km"], id__lte=end["id"])
+                )
+
+        series = FuelSeries.from_queryset(window)
+
+        # O ciclo de um abastecimento que mudou de veículo (a transação ou o
+        # plantão inteiro) ainda está gravado no veículo antigo: a limpeza
+        # vai pela transação, não só pelo veículo.
+        if pivots:
+            stale_ids = set(series.ids.tolist())
+            if start:
+                stale_ids.discard(start["id"])
+            stale = models.Q(transaction_id__in=stale_ids)
+            if touched_id:
+                stale |= models.Q(vehicle_id=vehicle_id, transaction_id=touched_id)
+        else:
+            stale = models.Q(vehicle_id=vehicle_id) | models.Q(transaction__in=fills)
+        self.filter(stale).delete()
+
+        result = series.cycles()
+        cycles = [
+            FuelCycle(
+                vehicle_id=vehicle_id,
+                transaction_id=int(series.ids[i]),
+                start_km=int(result["start_km"][n]),
+                end_km=int(result["end_km"][n]),
+                liters=to_decimal(result["liters"][n]),
+                cost=to_decimal(result["cost"][n]),
+                km_per_liter=to_decimal(result["average"][n]),
+                cost_per_km=to_decimal(result["cost_per_km"][n]),
+            )
+            for n, i in enumerate(result["index"])
+        ]
+
+        if cycles:
+            self.bulk_create(cycles)
+        return cycles
+
+
+class FuelCycle(models.Model):
+    """
+    Ciclo entre dois abastecimentos de tanque cheio, mantido a cada escrita
+    de transação de combustível (ver operations.signals).
+    """
+
+    vehicle = models.ForeignKey(
+        Vehicle, on_delete=models.CASCADE, related_name="fuel_cycles"
+    )
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="fuel_cycle",
+        verbose_name="Abastecimento que fecha o ciclo",
+    )
+    start_km = models.PositiveIntegerField("KM Inicial")
+    end_km = models.PositiveIntegerField("KM Final")
+    liters = models.DecimalField("Litros", max_digits=8, decimal_places=2)
+    cost = models.DecimalField("Custo (R$)", max_digits=10, decimal_places=2)
+    km_per_liter = models.DecimalField(
+        "Média (km/l)", max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    cost_per_km = models.DecimalField(
+        "Custo por KM", max_digits=8, decimal_places=2, null=True, blank=True
+    )
+
+    objects = FuelCycleManager()
+
+    class Meta:
+        verbose_name = "Ciclo de Abastecimento"
+        verbose_name_plural = "Ciclos de Abastecimento"
+        ordering = ["-end_km"]
+        indexes = [models.Index(fields=["vehicle", "end_km"])]
+
+    def __str__(self):
+        return f"{self.vehicle} ({self.start_km} → {self.end_km} km)"
+
+    @property
+    def km_driven(self):
+        return self.end_km - self.start_km
+
+
+class MaintenanceForecastManager(models.Manager):
+    def refresh(self, vehicle_ids, as_of=None):
+        """
+        Recalcula e grava a previsão dos veículos informados com um número
+        fixo de queries (rodagem, manutenções, transações, upsert),
+        qualquer que seja o tamanho do lote.
+        """
+        as_of = as_of or timezone.localdate()
+        vehicle_ids = list(vehicle_ids)
+
+        odometers = dict(
+            Vehicle.objects.filter(pk__in=vehicle_ids)
+            .annotate(odometer=Greatest("initial_km", "recorded_km"))
+            .values_list("pk", "odometer")
+        )
+
+        usage = (
+            DailyRecord.objects.filter(
+                vehicle_id__in=vehicle_ids,
+                is_active=False,
+                end_km__gte=F("start_km"),
+                date__gt=as_of - timedelta(days=forecast.FORECAST_WINDOW_DAYS),
+                date__lte=as_of,
+            )
+            .order_by()
+            .values("vehicle_id")
+            .annotate(km=Sum(F("end_km") - F("start_km")), first_date=Min("date"))
+        )
+        rates = {
+            row["vehicle_id"]: forecast.km_per_day(
+                row["km"], row["first_date"], as_of
+            )
+            for row in usage
+        }
+
+        pending = {pk: [] for pk in odometers}
+
+        # Vale a última manutenção de cada tipo, e a última transação de cada
+        # categoria que não tenha espelho em Maintenance com a mesma previsão.
+        maintenances = (
+            Maintenance.objects.filter(
+                vehicle_id__in=vehicle_ids, next_due_km__isnull=False
+            )
+            .order_by("vehicle_id", "type", "-date", "-id")
+            .values("id", "vehicle_id", "type", "description", "next_due_km")
+        )
+        labels = dict(Maintenance.TYPE_CHOICES)
+        for row in forecast.latest_by(
+            maintenances, lambda r: (r["vehicle_id"], r["type"])
+        ):
+            pending[row["vehicle_id"]].append(
+                {
+                    "source": "maintenance",
+                    "id": row["id"],
+                    "label": row["description"] or labels[row["type"]],
+                    "due_km": row["next_due_km"],
+                }
+            )
+
+        transactions = (
+            Transaction.objects.filter(
+                record__vehicle_id__in=vehicle_ids, next_due_km__isnull=False
+            )
+            .exclude(maintenance_mirror__next_due_km__isnull=False)
+            .order_by("record__vehicle_id", "category_id", "-created_at", "-id")
+            .values(
+                "id",
+                "record__vehicle_id",
+                "category_id",
+                "category__name",
+                "description",
+                "next_due_km",
+            )
+        )
+        for row in forecast.latest_by(
+            transactions, lambda r: (r["record__vehicle_id"], r["category_id"])
+        ):
+            pending[row["record__vehicle_id"]].append(
+                {
+                    "source": "transaction",
+                    "id": row["id"],
+                    "label": row["description"] or row["category__name"],
+                    "due_km": row["next_due_km"],
+                }
+            )
+
+        forecasts = []
+        for vehicle_id, odometer in odometers.items():
+            rate = rates.get(vehicle_id)
+            items = forecast.build_items(pending[vehicle_id], odometer, rate, as_of)
+            nearest = items[0] if items else {}
+            forecasts.append(
+                MaintenanceForecast(
+                    vehicle_id=vehicle_id,
+                    as_of=as_of,
+                    km_per_day=to_decimal(rate) if rate is not None else None,
+                    next_due_km=nearest.get("due_km"),
+                    remaining_km=nearest.get("remaining_km"),
+                    due_date=nearest.get("due_date"),
+                    items=items,
+                )
+            )
+
+        return self.bulk_create(
+            forecasts,
+            update_conflicts=True,
+            unique_fields=["vehicle"],
+            update_fields=[
+                "as_of",
+                "km_per_day",
+                "next_due_km",
+                "remaining_km",
+                "due_date",
+                "items",
+                "updated_at",
+            ],
+        )
+
+
+class MaintenanceForecast(models.Model):
+    """
+    Previsão de manutenção pré-calculada por veículo (ver o comando
+    forecast_maintenance). `items` guarda todos os vencimentos pendentes;
+    os demais campos repetem o mais próximo, para leitura direta.
+    """
+
+    vehicle = models.OneToOneField(
+        Vehicle, on_delete=models.CASCADE, related_name="maintenance_forecast"
+    )
+    as_of = models.DateField("Calculado para")
+    km_per_day = models.DecimalField(
+        "Média de KM/dia", max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    next_due_km = models.PositiveIntegerField("Próximo Vencimento (Km)", null=True)
+    remaining_km = models.IntegerField("KM Restantes", null=True)
+    due_date = models.DateField("Data Prevista", null=True, blank=True)
+    items = models.JSONField("Vencimentos Pendentes", default=list)
+    updated_at = models.DateTimeField("Atualizado em", auto_now=True)
+
+    objects = MaintenanceForecastManager()
+
+    class Meta:
+        verbose_name = "Previsão de Manutenção"
+        verbose_name_plural = "Previsões de Manutenção"
+
+    def __str__(self):
+        return f"{self.vehicle} ({self.due_date or 'sem previsão'})"
+
+
+class SyncMutation(models.Model):
+    """
+    Mutação offline já aplicada, pela chave de idempotência gerada no
+    cliente. Reenvios da mesma chave são ignorados (ver operations.sync).
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField("Chave de Idempotência", max_length=100)
+    action = models.CharField("Ação", max_length=30)
+    client_id = models.CharField("ID Temporário do Cliente", max_length=100, blank=True)
+    object_id = models.PositiveBigIntegerField("ID no Servidor", null=True)
+    created_at = models.DateTimeField("Aplicada em", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Mutação Sincronizada"
+        verbose_name_plural = "Mutações Sincronizadas"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_sync_key")
+        ]
+        indexes = [models.Index(fields=["user", "client_id"])]
+
+    def __str__(self):
+        return f"{self.action} ({self.key})"
+
+
+class LedgerEntry(models.Model):
+    """
+    Lançamento do livro-razão das transações: só é inserido, nunca editado
+    ou apagado (ver operations.ledger). Guarda o estado da transação depois
+    do evento, o efeito nos totais do plantão e o saldo acumulado do plantão
+    até este lançamento. IDs simples (sem FK) para sobreviver à exclusão do
+    plantão e da transação.
+    """
+
+    CREATE = "CREATE"
+    UPDATE = "UPDATE"
+    DELETE = "DELETE"
+    EVENT_CHOICES = (
+        (CREATE, "Inclusão"),
+        (UPDATE, "Edição"),
+        (DELETE, "Exclusão"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    event = models.CharField("Evento", max_length=10, choices=EVENT_CHOICES)
+    transaction_id = models.BigIntegerField("Transação")
+    record_id = models.BigIntegerField("Plantão")
+    user_id = models.BigIntegerField("Usuário")
+    type = models.CharField("Tipo", max_length=10, choices=Transaction.TYPE_CHOICES)
+    amount = models.DecimalField("Valor", max_digits=10, decimal_places=2)
+    income_delta = models.DecimalField(
+        "Efeito na Receita", max_digits=12, decimal_places=2, default=0
+    )
+    cost_delta = models.DecimalField(
+        "Efeito no Custo", max_digits=12, decimal_places=2, default=0
+    )
+    balance_income = models.DecimalField("Receita Acumulada", max_digits=12, decimal_places=2)
+    balance_cost = models.DecimalField("Custo Acumulado", max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField("Lançado em", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lançamento do Livro-Razão"
+        verbose_name_plural = "Livro-Razão das Transações"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["record_id", "id"]),
+            models.Index(fields=["transaction_id", "id"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.event} transação {self.transaction_id}"
+
+
+class LedgerCheckpoint(models.Model):
+    """Último lançamento já conferido por uma verificação incremental."""
+
+    name = models.CharField("Verificação", max_length=50, unique=True)
+    last_entry_id = models.BigIntegerField("Último Lançamento", default=0)
+    updated_at = models.DateTimeField("Atualizado em", auto_now=True)
+
+    class Meta:
+        verbose_name = "Ponto de Verificação do Livro-Razão"
+        verbose_name_plural = "Pontos de Verificação do Livro-Razão"
+
+    def __str__(self):
+        return f"{self.name} (até #{self.last_entry_id})"
+
+
+class UserStats(models.Model):
+    """
+    Campos comuns dos consolidados por usuário (ver operations.rollups).
+    Despesas separadas por categoria: combustível, manutenção (a marcação de
+    manutenção prevalece) e demais; `maintenance_log_cost` soma o cadastro
+    de Manutenções pela data da manutenção.
+    """
+
+    income = models.DecimalField("Receita", max_digits=12, decimal_places=2, default=0)
+    cost = models.DecimalField("Custo", max_digits=12, decimal_places=2, default=0)
+    fuel_cost = models.DecimalField(
+        "Custo com Combustível", max_digits=12, decimal_places=2, default=0
+    )
+    maintenance_cost = models.DecimalField(
+        "Custo com Manutenção", max_digits=12, decimal_places=2, default=0
+    )
+    other_cost = models.DecimalField(
+        "Outros Custos", max_digits=12, decimal_places=2, default=0
+    )
+    maintenance_log_cost = models.DecimalField(
+        "Manutenções Registradas", max_digits=12, decimal_places=2, default=0
+    )
+    km = models.IntegerField("KM Rodados", default=0)
+    shifts = models.PositiveIntegerField("Plantões", default=0)
+    updated_at = models.DateTimeField("Atualizado em", auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def profit(self):
+        return self.income - self.cost
+
+
+class UserDailyStats(UserStats):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    date = models.DateField("Data")
+
+    class Meta:
+        verbose_name = "Consolidado Diário"
+        verbose_name_plural = "Consolidados Diários"
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date"], name="unique_daily_stats_per_user"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.date}"
+
+
+class UserMonthlyStats(UserStats):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="monthly_stats",
+    )
+    month = models.DateField("Mês")
+
+    class Meta:
+        verbose_name = "Consolidado Mensal"
+        verbose_name_plural = "Consolidados Mensais"
+        ordering = ["-month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "month"], name="unique_monthly_stats_per_user"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.month:%m/%Y}"
+
+
+class UserLifetimeStats(UserStats):
+    """Totais de toda a vida do usuário, lidos pela dashboard HTML."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="lifetime_stats",
+    )
+
+    class Meta:
+        verbose_name = "Consolidado Geral"
+        verbose_name_plural = "Consolidados Gerais"
+
+    def __str__(self):
+        return str(self.user)
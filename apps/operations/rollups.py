@@ -0,0 +1,423 @@
+"""
+Consolidados diários, mensais e gerais por usuário (UserDailyStats,
+UserMonthlyStats e UserLifetimeStats).
+
+A dashboard e os relatórios leem estes consolidados em vez de reagrupar
+plantões, transações e manutenções. As escritas os mantêm em dia na mesma
+transação de banco:
+
+- transações (o caminho mais frequente) somam a diferença da escrita ao dia,
+  ao mês e ao total geral com F(), como operations.totals faz com os
+  plantões;
+- plantões, manutenções, categorias, importações em lote e a regravação de
+  totais chamam `refresh`, que recalcula os dias afetados a partir da
+  origem com um número fixo de consultas e soma ao total geral a diferença
+  dos meses regravados.
+
+A linha de UserLifetimeStats do usuário é a trava dos consolidados: `apply`
+e `refresh` começam por ela, então escritas concorrentes do mesmo usuário
+se enfileiram em vez de perder diferenças ou colidir nas linhas novas.
+
+O comando rebuild_rollups refaz tudo em lotes de usuários com `refresh`;
+check_rollups confere os consolidados contra a origem com `check`.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    DailyRecord,
+    Maintenance,
+    Transaction,
+    UserDailyStats,
+    UserLifetimeStats,
+    UserMonthlyStats,
+)
+
+FIELDS = (
+    "income",
+    "cost",
+    "fuel_cost",
+    "maintenance_cost",
+    "other_cost",
+    "maintenance_log_cost",
+    "km",
+    "shifts",
+)
+
+
+def month_of(date):
+    return date.replace(day=1)
+
+
+def _scope(prefix, user_ids, dates):
+    scope = Q(**{f"{prefix}user_id__in": user_ids})
+    if dates is not None:
+        scope &= Q(**{f"{prefix}date__in": dates})
+    return scope
+
+
+def compute(user_ids, dates=None):
+    """
+    {(user_id, data): {campo: valor}} dos usuários (e, se informadas, só das
+    datas) a partir de plantões, transações e manutenções: três consultas
+    agrupadas, qualquer que seja o volume.
+    """
+    stats = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+
+    records = (
+        DailyRecord.objects.filter(_scope("", user_ids, dates))
+        .order_by()
+        .values("user_id", "date")
+        .annotate(
+            income=Sum("total_income"),
+            cost=Sum("total_cost"),
+            km=Sum(F("end_km") - F("start_km")),
+            shifts=Count("id"),
+        )
+    )
+    for row in records:
+        key = (row.pop("user_id"), row.pop("date"))
+        stats[key].update({k: v or 0 for k, v in row.items()})
+
+    maintenance = Q(category__is_maintenance=True)
+    fuel = Q(category__is_maintenance=False, category__is_fuel=True)
+    other = Q(category__is_maintenance=False, category__is_fuel=False)
+    costs = (
+        Transaction.objects.filter(_scope("record__", user_ids, dates), type="COST")
+        .order_by()
+        .values("record__user_id", "record__date")
+        .annotate(
+            fuel_cost=Sum("amount", filter=fuel),
+            maintenance_cost=Sum("amount", filter=maintenance),
+            other_cost=Sum("amount", filter=other),
+        )
+    )
+    for row in costs:
+        key = (row.pop("record__user_id"), row.pop("record__date"))
+        stats[key].update({k: v or 0 for k, v in row.items()})
+
+    logged = (
+        Maintenance.objects.filter(_scope("", user_ids, dates))
+        .order_by()
+        .values("user_id", "date")
+        .annotate(maintenance_log_cost=Sum("cost"))
+    )
+    for row in logged:
+        stats[(row["user_id"], row["date"])]["maintenance_log_cost"] = (
+            row["maintenance_log_cost"] or 0
+        )
+
+    return dict(stats)
+
+
+def _totals(rows, key="user_id"):
+    totals = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for row in rows:
+        for field in FIELDS:
+            totals[row[key]][field] += row[field] or 0
+    return totals
+
+
+def _monthly_totals(queryset):
+    return _totals(
+        queryset.order_by()
+        .values("user_id")
+        .annotate(**{field: Sum(field) for field in FIELDS})
+    )
+
+
+def _lock_lifetime(user_ids):
+    """
+    Trava as linhas do total geral dos usuários até o fim da transação de
+    banco, criando zerada a de quem ainda não tem. Devolve {user_id: pk}
+    das linhas e os usuários que estavam sem linha (o total deles sai da
+    soma dos meses).
+
+    O UPDATE vem antes de qualquer leitura: no SQLite ele já pega a trava de
+    escrita do banco, e vários processos do rebuild_rollups não ficam presos
+    tentando promover uma leitura a escrita.
+    """
+    lifetime = UserLifetimeStats.objects.filter(user_id__in=user_ids)
+    lifetime.update(updated_at=timezone.now())
+    pks = dict(
+        lifetime.select_for_update().order_by("user_id").values_list("user_id", "pk")
+    )
+    missing = set(user_ids) - pks.keys()
+    if missing:
+        # Outro processo pode criar a mesma linha ao mesmo tempo: a dele vale,
+        # e o total é regravado pela soma dos meses de qualquer forma.
+        UserLifetimeStats.objects.bulk_create(
+            [UserLifetimeStats(user_id=user_id) for user_id in sorted(missing)],
+            ignore_conflicts=True,
+        )
+        pks.update(
+            UserLifetimeStats.objects.filter(user_id__in=missing)
+            .select_for_update()
+            .values_list("user_id", "pk")
+        )
+    return pks, missing
+
+
+def _update_lifetime(pks, missing, before, after, rebuild):
+    """
+    Leva ao total geral a diferença entre os meses regravados (`before` e
+    `after`, {user_id: {campo: soma}}) nas linhas travadas `pks`. Com
+    `rebuild` os meses são todos os do usuário, então o total é regravado
+    direto. Usuários em `missing` (linha recém-criada por _lock_lifetime)
+    recebem a soma de todos os seus meses.
+    """
+    now = timezone.now()
+    if rebuild:
+        missing = set(pks)
+
+    for user_id in pks.keys() - missing:
+        updates = {
+            field: F(field) + (after[user_id][field] - before[user_id][field])
+            for field in FIELDS
+            if after[user_id][field] != before[user_id][field]
+        }
+        if updates:
+            UserLifetimeStats.objects.filter(pk=pks[user_id]).update(
+                **updates, updated_at=now
+            )
+
+    if missing:
+        totals = (
+            after
+            if rebuild
+            else _monthly_totals(UserMonthlyStats.objects.filter(user_id__in=missing))
+        )
+        UserLifetimeStats.objects.bulk_update(
+            [
+                UserLifetimeStats(
+                    pk=pks[user_id], user_id=user_id, updated_at=now, **totals[user_id]
+                )
+                for user_id in sorted(missing)
+            ],
+            [*FIELDS, "updated_at"],
+        )
+
+
+def refresh(user_ids, dates=None):
+    """
+    Regrava os consolidados dos usuários a partir da origem: só os dias em
+    `dates` e os meses que os contêm, ou tudo quando `dates` é None. Tudo
+    roda numa transação de banco, com o total geral dos usuários travado
+    antes das leituras da origem. Onze consultas por chamada, mais uma por
+    usuário com total geral a atualizar e três quando falta a linha de algum
+    usuário ou `dates` é None. Devolve quantos dias foram gravados.
+    """
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if dates is not None:
+        dates = {date for date in dates if date is not None}
+    if not user_ids or dates == set():
+        return 0
+
+    daily = UserDailyStats.objects.filter(user_id__in=user_ids).annotate(
+        period=TruncMonth("date")
+    )
+    monthly = UserMonthlyStats.objects.filter(user_id__in=user_ids)
+    if dates is not None:
+        months = {month_of(date) for date in dates}
+        daily = daily.filter(period__in=months)
+        monthly = monthly.filter(month__in=months)
+
+    with transaction.atomic():
+        pks, missing = _lock_lifetime(user_ids)
+        stats = compute(user_ids, dates)
+
+        UserDailyStats.objects.filter(_scope("", user_ids, dates)).delete()
+        UserDailyStats.objects.bulk_create(
+            [
+                UserDailyStats(user_id=user_id, date=date, **values)
+                for (user_id, date), values in stats.items()
+            ]
+        )
+
+        rows = list(
+            daily.order_by()
+            .values("user_id", "period")
+            .annotate(**{field: Sum(field) for field in FIELDS})
+        )
+        before = _monthly_totals(monthly)
+        monthly.delete()
+        UserMonthlyStats.objects.bulk_create(
+            [
+                UserMonthlyStats(
+                    user_id=row["user_id"],
+                    month=row["period"],
+                    **{field: row[field] for field in FIELDS},
+                )
+                for row in rows
+            ]
+        )
+        _update_lifetime(pks, missing, before, _totals(rows), rebuild=dates is None)
+    return len(stats)
+
+
+def apply(user_id, changes):
+    """
+    Soma {data: {campo: diferença}} aos consolidados do usuário, um UPDATE
+    com F() no total geral, outro no dia e outro no mês. O total geral vem
+    primeiro e trava os consolidados do usuário (ver refresh). Total, dia ou
+    mês ainda sem linha cai no `refresh` daquela data.
+    """
+    now = timezone.now()
+    # Sem savepoint: dentro da escrita (Transaction.save) nada a desfazer à
+    # parte; fora dela, o bloco é a própria transação.
+    with transaction.atomic(savepoint=False):
+        for date, deltas in changes.items():
+            deltas = {field: value for field, value in deltas.items() if value}
+            if not deltas:
+                continue
+
+            updates = {field: F(field) + value for field, value in deltas.items()}
+            lifetime = UserLifetimeStats.objects.filter(user_id=user_id)
+            if not lifetime.update(**updates, updated_at=now):
+                refresh([user_id], [date])
+                continue
+
+            day = UserDailyStats.objects.filter(user_id=user_id, date=date)
+            month = UserMonthlyStats.objects.filter(
+                user_id=user_id, month=month_of(date)
+            )
+            # Na ordem dia, mês: o que falta nunca recebeu a diferença, e o
+            # refresh a leva adiante; o total geral a devolve antes.
+            if not (
+                day.update(**updates, updated_at=now)
+                and month.update(**updates, updated_at=now)
+            ):
+                lifetime.update(
+                    **{field: F(field) - value for field, value in deltas.items()},
+                    updated_at=now,
+                )
+                refresh([user_id], [date])
+
+
+def _contribution(kind, amount, is_fuel, is_maintenance, sign=1):
+    amount = Decimal(str(amount or 0)) * sign
+    if kind == "INCOME":
+        return {"income": amount}
+    if is_maintenance:
+        bucket = "maintenance_cost"
+    elif is_fuel:
+        bucket = "fuel_cost"
+    else:
+        bucket = "other_cost"
+    return {"cost": amount, bucket: amount}
+
+
+def _add(changes, date, contribution):
+    for field, value in contribution.items():
+        changes[date][field] = changes[date].get(field, 0) + value
+
+
+def transaction_saved(instance, created, previous=None):
+    """
+    Aplica a criação/edição de uma transação pela diferença entre o estado
+    capturado no pre_save e o novo. Sem esse estado, recalcula o dia.
+    """
+    record = instance.record
+    if not created and previous is None:
+        refresh([record.user_id], [record.date])
+        return
+
+    category = instance.category
+    changes = defaultdict(dict)
+    _add(
+        changes,
+        record.date,
+        _contribution(
+            instance.type,
+            instance.amount,
+            category.is_fuel,
+            category.is_maintenance,
+        ),
+    )
+    if previous:
+        _add(
+            changes,
+            previous["record__date"],
+            _contribution(
+                previous["type"],
+                previous["amount"],
+                previous["category__is_fuel"],
+                previous["category__is_maintenance"],
+                -1,
+            ),
+        )
+    apply(record.user_id, changes)
+
+
+def transaction_deleted(instance):
+    record = instance.record
+    category = instance.category
+    apply(
+        record.user_id,
+        {
+            record.date: _contribution(
+                instance.type,
+                instance.amount,
+                category.is_fuel,
+                category.is_maintenance,
+                -1,
+            )
+        },
+    )
+
+
+def check(user_ids):
+    """
+    Divergências entre os consolidados mensais e gerais dos usuários e a
+    origem: [(user_id, mês ou None para o total geral, campo, gravado,
+    esperado)]. Cinco consultas por chamada.
+    """
+    user_ids = set(user_ids)
+    expected_months = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for (user_id, date), values in compute(user_ids).items():
+        for field in FIELDS:
+            expected_months[(user_id, month_of(date))][field] += values[field]
+    expected_lifetime = _totals(
+        {"user_id": user_id, **values}
+        for (user_id, _), values in expected_months.items()
+    )
+
+    stored_months = {
+        (row["user_id"], row["month"]): row
+        for row in UserMonthlyStats.objects.filter(user_id__in=user_ids).values(
+            "user_id", "month", *FIELDS
+        )
+    }
+    stored_lifetime = {
+        row["user_id"]: row
+        for row in UserLifetimeStats.objects.filter(user_id__in=user_ids).values(
+            "user_id", *FIELDS
+        )
+    }
+
+    zeros = dict.fromkeys(FIELDS, 0)
+    pairs = [
+        (key, stored_months.get(key, zeros), expected_months.get(key, zeros))
+        for key in sorted(stored_months.keys() | expected_months.keys())
+    ]
+    pairs += [
+        (
+            (user_id, None),
+            stored_lifetime.get(user_id, zeros),
+            expected_lifetime[user_id],
+        )
+        for user_id in sorted(user_ids)
+    ]
+
+    problems = []
+    for (user_id, month), stored, expected in pairs:
+        for field in FIELDS:
+            if stored[field] != expected[field]:
+                problems.append((user_id, month, field, stored[field], expected[field]))
+    return problems
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from .models import Category, DailyRecord, Transaction, Maintenance
 from vehicles.models import Vehicle
@@ -59,19 +60,42 @@ class TransactionSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """
         Se o next_due_km estiver vazio na Transação, tenta buscar
-        no registro de Manutenção vinculado (Espelho).
+        no registro de Manutenção vinculado (Espelho). Em listas, carregue
+        o espelho com select_related("maintenance_mirror").
         """
         data = super().to_representation(instance)
         
         if not data.get('next_due_km'):
-            if hasattr(instance, 'maintenance_mirror'):
-                mirror = instance.maintenance_mirror.first()
-                if mirror and mirror.next_due_km:
-                    data['next_due_km'] = mirror.next_due_km
+            mirror = getattr(instance, 'maintenance_mirror', None)
+            if mirror and mirror.next_due_km:
+                data['next_due_km'] = mirror.next_due_km
         
         return data
 
 
+class BulkTransactionSerializer(TransactionSerializer):
+    """
+    Item da importação em lote. Plantão e categoria são resolvidos a partir
+    dos dicionários pré-carregados em context["records"] e
+    context["categories"] (só os do usuário), sem uma query por item.
+    """
+
+    record = serializers.IntegerField()
+    category = serializers.IntegerField()
+
+    def validate_record(self, value):
+        record = self.context["records"].get(value)
+        if record is None:
+            raise serializers.ValidationError("Plantão não encontrado.")
+        return record
+
+    def validate_category(self, value):
+        category = self.context["categories"].get(value)
+        if category is None:
+            raise serializers.ValidationError("Categoria não encontrada.")
+        return category
+
+
 class DailyRecordSerializer(serializers.ModelSerializer):
     vehicle_model = serializers.ReadOnlyField(source="vehicle.model_name")
     vehicle_plate = serializers.ReadOnlyField(source="vehicle.plate")
@@ -85,6 +109,11 @@ class DailyRecordSerializer(serializers.ModelSerializer):
     cost_per_km = serializers.ReadOnlyField()
     profit_per_km = serializers.ReadOnlyField()
 
+    SHIFT_CONFLICTS = {
+        "active": "Você já tem um plantão em aberto.",
+        "date": "Você já abriu um plantão hoje.",
+    }
+
     class Meta:
         model = DailyRecord
         fields = [
@@ -173,6 +202,28 @@ class DailyRecordSerializer(serializers.ModelSerializer):
 
         return value
 
+    def save(self, **kwargs):
+        """
+        Grava sem consultar antes: um plantão aberto por usuário e um plantão
+        por dia são garantidos pelo banco, e a violação vira a mensagem de
+        sempre.
+        """
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            data = {**self.validated_data, **kwargs}
+            user = data.get("user") or self.instance.user
+            date = data.get("date") or self.instance.date
+            conflict = DailyRecord.objects.shift_conflict(
+                user, date, exclude=self.instance and self.instance.pk
+            )
+            if conflict is None:
+                raise
+            raise serializers.ValidationError(
+                {"detail": self.SHIFT_CONFLICTS[conflict]}
+            )
+
 
 class MaintenanceSerializer(serializers.ModelSerializer):
     vehicle_model = serializers.ReadOnlyField(source="vehicle.model_name")
@@ -1,47 +1,334 @@
-from django.db.models import Sum
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Category, Transaction
+from common import metrics
+from core import cache as dashboard_cache
+from vehicles import cache as vehicle_cache
+from vehicles.models import Vehicle
+from . import categories, jobs, rollups, totals
+from .models import Category, DailyRecord, Maintenance, Transaction
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_default_categories(sender, instance, created, **kwargs):
+    """Categorias padrão do novo usuário num único INSERT (ver categories)."""
     if created:
-        Category.objects.create(
-            user=instance, name="Abastecimento", type="COST", color="#ef4444", is_fuel=True,
+        categories.provision(
+            instance,
+            categories.signup_templates(),
+            check_existing=False,
         )
-        Category.objects.create(
-            user=instance, name="Manutenção", type="COST", color="#f97316", is_maintenance=True,
+
+
+@receiver(post_save, sender=Transaction)
+def update_daily_record_totals(sender, instance, created, **kwargs):
+    """
+    Atualiza os totais de Receita e Custo do Registro Diário (DailyRecord)
+    vinculado, uma única vez por escrita (ver operations.totals).
+    """
+    with metrics.measure("signal.record_totals.save"):
+        totals.transaction_saved(
+            instance, created, getattr(instance, "_previous", None)
         )
-        Category.objects.create(
-            user=instance, name="Alimentação", type="COST", color="#eab308"
+
+
+@receiver(post_delete, sender=Transaction)
+def update_daily_record_totals_on_delete(sender, instance, **kwargs):
+    with metrics.measure("signal.record_totals.delete"):
+        totals.transaction_deleted(instance)
+
+
+@receiver(post_save, sender=DailyRecord)
+def sync_vehicle_odometer_on_record_save(sender, instance, created, **kwargs):
+    """
+    Plantão novo só pode avançar o hodômetro; edições (inclusive o
+    encerramento) recalculam, pois o KM pode ter sido corrigido para baixo.
+    """
+    if created:
+        Vehicle.objects.filter(pk=instance.vehicle_id).bump_odometer(
+            max(instance.start_km, instance.end_km or 0)
         )
-        Category.objects.create(
-            user=instance, name="Outros", type="COST", color="#64748b"
+        return
+
+    jobs.odometer_changed(instance.vehicle_id)
+    # Trocar o veículo do plantão tira o KM dele do veículo antigo.
+    previous_vehicle_id = getattr(instance, "_previous_vehicle_id", None)
+    if previous_vehicle_id not in (None, instance.vehicle_id):
+        jobs.odometer_changed(previous_vehicle_id)
+
+
+@receiver(post_delete, sender=DailyRecord)
+def sync_vehicle_odometer_on_record_delete(sender, instance, **kwargs):
+    jobs.odometer_changed(instance.vehicle_id)
+
+
+@receiver(post_save, sender=Transaction)
+def sync_vehicle_odometer_on_transaction_save(sender, instance, created, **kwargs):
+    if created:
+        Vehicle.objects.filter(pk=instance.record.vehicle_id).bump_odometer(
+            instance.actual_km
         )
+        return
+
+    jobs.odometer_changed(instance.record.vehicle_id)
+    previous = getattr(instance, "_previous", None) or {}
+    previous_vehicle_id = previous.get("record__vehicle_id")
+    if previous_vehicle_id not in (None, instance.record.vehicle_id):
+        jobs.odometer_changed(previous_vehicle_id)
+
+
+@receiver(post_delete, sender=Transaction)
+def sync_vehicle_odometer_on_transaction_delete(sender, instance, **kwargs):
+    if instance.actual_km:
+        jobs.odometer_changed(instance.record.vehicle_id)
+
+
+@receiver(pre_save, sender=Transaction)
+def capture_previous_transaction(sender, instance, **kwargs):
+    """
+    Guarda os valores gravados antes de uma edição, para que os
+    sincronismos incrementais saibam de onde a transação saiu.
+    """
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Transaction.objects.filter(pk=instance.pk)
+            .values(
+                "record_id",
+                "record__date",
+                "record__vehicle_id",
+                "category__is_fuel",
+                "category__is_maintenance",
+                "type",
+                "amount",
+                "description",
+                "actual_km",
+                "liters",
+                "is_full_tank",
+                "next_due_km",
+            )
+            .first()
+        )
+
+
+def _is_fuel_fill(liters, actual_km, is_fuel):
+    return bool(liters) and liters > 0 and actual_km is not None and is_fuel
 
 
 @receiver(post_save, sender=Transaction)
+def sync_fuel_cycles_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    vehicle_id = instance.record.vehicle_id
+
+    is_fill = _is_fuel_fill(
+        instance.liters,
+        instance.actual_km,
+        instance.liters and instance.category.is_fuel,
+    )
+    was_fill = previous is not None and _is_fuel_fill(
+        previous["liters"], previous["actual_km"], previous["category__is_fuel"]
+    )
+
+    if not (is_fill or was_fill):
+        return
+
+    pivots = []
+    if is_fill:
+        pivots.append((instance.actual_km, instance.pk))
+
+    if was_fill:
+        previous_pivot = (previous["actual_km"], instance.pk)
+        if previous["record__vehicle_id"] == vehicle_id:
+            pivots.append(previous_pivot)
+        else:
+            jobs.fuel_cycles_changed(
+                previous["record__vehicle_id"], [previous_pivot], instance.pk
+            )
+
+    if pivots:
+        jobs.fuel_cycles_changed(vehicle_id, pivots, instance.pk)
+
+
 @receiver(post_delete, sender=Transaction)
-def update_daily_record_totals(sender, instance, **kwargs):
+def sync_fuel_cycles_on_delete(sender, instance, **kwargs):
+    if _is_fuel_fill(
+        instance.liters,
+        instance.actual_km,
+        instance.liters and instance.category.is_fuel,
+    ):
+        jobs.fuel_cycles_changed(
+            instance.record.vehicle_id, [(instance.actual_km, instance.pk)]
+        )
+
+
+def _fills(transactions):
+    return transactions.filter(
+        category__is_fuel=True, liters__gt=0, actual_km__isnull=False
+    )
+
+
+@receiver(post_save, sender=DailyRecord)
+def sync_fuel_cycles_on_record_move(sender, instance, created, **kwargs):
     """
-    Sempre que uma transação é salva ou deletada, recalcula
-    os totais de Receita e Custo do Registro Diário (DailyRecord) vinculado.
+    Trocar o veículo do plantão leva junto os abastecimentos dele: os ciclos
+    do veículo antigo e do novo são recalculados na janela dessas posições.
     """
-    record = instance.record
+    previous_vehicle_id = getattr(instance, "_previous_vehicle_id", None)
+    if created or previous_vehicle_id in (None, instance.vehicle_id):
+        return
+
+    pivots = list(
+        _fills(Transaction.objects.filter(record=instance)).values_list(
+            "actual_km", "id"
+        )
+    )
+    if pivots:
+        jobs.fuel_cycles_changed(previous_vehicle_id, pivots)
+        jobs.fuel_cycles_changed(instance.vehicle_id, pivots)
+
+
+@receiver(pre_save, sender=DailyRecord)
+@receiver(pre_save, sender=Maintenance)
+def capture_previous_vehicle(sender, instance, **kwargs):
+    """
+    Veículo e data gravados antes da edição, para invalidar também o
+    veículo antigo e recalcular o dia antigo nos consolidados.
+    """
+    instance._previous_vehicle_id = instance._previous_date = None
+    if instance.pk:
+        instance._previous_vehicle_id, instance._previous_date = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("vehicle_id", "date")
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=DailyRecord)
+@receiver(post_delete, sender=DailyRecord)
+@receiver(post_save, sender=Maintenance)
+@receiver(post_delete, sender=Maintenance)
+def invalidate_vehicle_stats(sender, instance, **kwargs):
+    vehicle_cache.bump_version(
+        instance.vehicle_id, getattr(instance, "_previous_vehicle_id", None)
+    )
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_vehicle_stats_on_transaction(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None) or {}
+    vehicle_cache.bump_version(
+        instance.record.vehicle_id, previous.get("record__vehicle_id")
+    )
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_vehicle_stats_on_vehicle(sender, instance, **kwargs):
+    vehicle_cache.bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_vehicle_stats_on_category(sender, instance, created, **kwargs):
+    """
+    Mudar o tipo ou a marcação de combustível de uma categoria altera as
+    estatísticas de todos os veículos do usuário.
+    """
+    if not created:
+        vehicle_cache.bump_version(
+            *Vehicle.objects.filter(user_id=instance.user_id).values_list(
+                "pk", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=DailyRecord)
+@receiver(post_delete, sender=DailyRecord)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Maintenance)
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_dashboard(sender, instance, **kwargs):
+    dashboard_cache.bump_version(instance.user_id)
 
-    totals = record.transactions.values("type").annotate(total=Sum("amount"))
 
-    total_income = 0
-    total_cost = 0
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_dashboard_on_transaction(sender, instance, **kwargs):
+    dashboard_cache.bump_version(instance.record.user_id)
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups(sender, instance, created, **kwargs):
+    """Consolidados diário e mensal pela diferença da escrita (ver rollups)."""
+    rollups.transaction_saved(
+        instance, created, getattr(instance, "_previous", None)
+    )
 
-    for t in totals:
-        if t["type"] == "INCOME":
-            total_income = t["total"] or 0
-        elif t["type"] == "COST":
-            total_cost = t["total"] or 0
 
-    record.total_income = total_income
-    record.total_cost = total_cost
-    record.save(update_fields=["total_income", "total_cost"])
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.transaction_deleted(instance)
+
+
+@receiver(post_save, sender=DailyRecord)
+@receiver(post_delete, sender=DailyRecord)
+@receiver(post_save, sender=Maintenance)
+@receiver(post_delete, sender=Maintenance)
+def refresh_rollups(sender, instance, **kwargs):
+    rollups.refresh(
+        [instance.user_id], [instance.date, getattr(instance, "_previous_date", None)]
+    )
+
+
+@receiver(pre_save, sender=Category)
+def capture_previous_category_flags(sender, instance, **kwargs):
+    instance._previous_flags = None
+    if instance.pk:
+        instance._previous_flags = (
+            Category.objects.filter(pk=instance.pk)
+            .values_list("is_fuel", "is_maintenance")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Category)
+def refresh_rollups_on_category(sender, instance, created, **kwargs):
+    """
+    Trocar a marcação de combustível/manutenção muda a divisão de custos
+    de todos os dias com transações da categoria.
+    """
+    previous = getattr(instance, "_previous_flags", None)
+    if created or previous in (None, (instance.is_fuel, instance.is_maintenance)):
+        return
+    rollups.refresh(
+        [instance.user_id],
+        Transaction.objects.filter(category=instance)
+        .values_list("record__date", flat=True)
+        .distinct(),
+    )
+
+
+@receiver(post_save, sender=Category)
+def sync_fuel_cycles_on_category(sender, instance, created, **kwargs):
+    """
+    Ligar ou desligar a marcação de combustível muda quais transações são
+    abastecimentos em todo o histórico: os veículos com lançamentos da
+    categoria têm os ciclos refeitos por inteiro.
+    """
+    previous = getattr(instance, "_previous_flags", None)
+    if created or previous is None or previous[0] == instance.is_fuel:
+        return
+
+    vehicle_ids = (
+        Transaction.objects.filter(
+            category=instance, liters__gt=0, actual_km__isnull=False
+        )
+        .order_by()
+        .values_list("record__vehicle_id", flat=True)
+        .distinct()
+    )
+    for vehicle_id in vehicle_ids:
+        jobs.fuel_cycles_changed(vehicle_id, None)
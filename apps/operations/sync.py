@@ -0,0 +1,288 @@
+"""
+Sincronização de mutações feitas offline.
+
+O cliente acumula as operações (abrir plantão, lançar, editar e excluir
+transações, encerrar plantão) numa fila, cada uma com uma chave de
+idempotência, e envia a fila inteira de uma vez. As mutações são aplicadas
+em ordem dentro de uma única transação de banco: se uma falhar, nada é
+gravado. Chaves já aplicadas (SyncMutation) são puladas, então reenviar a
+mesma fila após uma queda de conexão é seguro.
+
+Objetos criados offline podem ser referenciados pelo `client_id` que o
+cliente deu a eles (em `id` ou em `data.record`), inclusive em lotes
+posteriores.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework import serializers
+
+from .ingest import maintenance_mirror, sync_maintenance_mirror
+from .models import DailyRecord, SyncMutation, Transaction
+from .serializers import (
+    DailyRecordDetailSerializer,
+    DailyRecordSerializer,
+    TransactionSerializer,
+)
+
+MAX_SYNC_MUTATIONS = 200
+
+# Ação que cria cada tipo de objeto referenciável por client_id.
+CREATE_ACTIONS = {"shift": "start_shift", "transaction": "create_transaction"}
+
+
+class ConcurrentSync(Exception):
+    """Outra sincronização gravou a mesma chave antes desta."""
+
+
+class MutationError(Exception):
+    def __init__(self, index, key, errors):
+        super().__init__(errors)
+        self.detail = {"index": index, "key": key, "errors": errors}
+
+
+class MutationSerializer(serializers.Serializer):
+    ACTIONS = (
+        "start_shift",
+        "update_shift",
+        "end_shift",
+        "delete_shift",
+        "create_transaction",
+        "update_transaction",
+        "delete_transaction",
+    )
+
+    key = serializers.CharField(max_length=100)
+    action = serializers.ChoiceField(choices=ACTIONS)
+    client_id = serializers.CharField(max_length=100, required=False, default="")
+    id = serializers.CharField(max_length=100, required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+
+class SyncSession:
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self.client_ids = {}
+
+    def resolve(self, kind, ref):
+        """ID real de um objeto, a partir do ID do servidor ou do client_id."""
+        ref = str(ref)
+        if ref.isdigit():
+            return int(ref)
+
+        action = CREATE_ACTIONS[kind]
+        if (action, ref) not in self.client_ids:
+            self.client_ids[action, ref] = (
+                SyncMutation.objects.filter(
+                    user=self.user, action=action, client_id=ref
+                )
+                .values_list("object_id", flat=True)
+                .first()
+            )
+        if self.client_ids[action, ref] is None:
+            raise serializers.ValidationError(
+                {"id": f"Referência '{ref}' desconhecida."}
+            )
+        return self.client_ids[action, ref]
+
+    def get_record(self, ref):
+        try:
+            return DailyRecord.objects.get(
+                user=self.user, pk=self.resolve("shift", ref)
+            )
+        except DailyRecord.DoesNotExist:
+            raise serializers.ValidationError({"id": "Plantão não encontrado."})
+
+    def get_transaction(self, ref):
+        try:
+            return Transaction.objects.select_related("category", "record").get(
+                record__user=self.user, pk=self.resolve("transaction", ref)
+            )
+        except Transaction.DoesNotExist:
+            raise serializers.ValidationError({"id": "Transação não encontrada."})
+
+    def save(self, serializer_class, instance=None, data=None, **extra):
+        serializer = serializer_class(
+            instance,
+            data=data,
+            partial=instance is not None,
+            context={"request": self.request},
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(**extra)
+
+    # Ações -------------------------------------------------------------
+
+    def start_shift(self, mutation):
+        data = mutation["data"]
+        date = data.get("date") or timezone.now().date().isoformat()
+        return self.save(
+            DailyRecordSerializer,
+            data={**data, "date": date},
+            user=self.user,
+            is_active=True,
+        )
+
+    def update_shift(self, mutation):
+        record = self.get_record(mutation["id"])
+        return self.save(DailyRecordSerializer, record, mutation["data"])
+
+    def end_shift(self, mutation):
+        return self.save(
+            DailyRecordSerializer,
+            self.get_record(mutation["id"]),
+            mutation["data"],
+            is_active=False,
+        )
+
+    def delete_shift(self, mutation):
+        record = self.get_record(mutation["id"])
+        pk = record.pk
+        record.delete()
+        return pk
+
+    def create_transaction(self, mutation):
+        data = dict(mutation["data"])
+        if "record" in data:
+            data["record"] = self.get_record(data["record"]).pk
+
+        instance = self.save(TransactionSerializer, data=data)
+        if instance.type == "COST" and instance.category.is_maintenance:
+            maintenance_mirror(self.user, instance).save()
+        return instance
+
+    def update_transaction(self, mutation):
+        data = dict(mutation["data"])
+        if "record" in data:
+            data["record"] = self.get_record(data["record"]).pk
+
+        instance = self.save(
+            TransactionSerializer, self.get_transaction(mutation["id"]), data
+        )
+        sync_maintenance_mirror(instance)
+        return instance
+
+    def delete_transaction(self, mutation):
+        instance = self.get_transaction(mutation["id"])
+        pk = instance.pk
+        instance.delete()
+        return pk
+
+    # Lote --------------------------------------------------------------
+
+    def apply(self, mutations):
+        """
+        Aplica a fila em ordem, numa única transação. Devolve o resultado
+        de cada mutação ("applied" ou "duplicate" e o ID no servidor).
+
+        Reenvios simultâneos da mesma fila são serializados pelo bloqueio da
+        linha do usuário. Onde não há bloqueio de linha (SQLite), o segundo
+        reenvio esbarra na chave única de SyncMutation: a transação dele é
+        desfeita e a fila é reaplicada, agora vendo as chaves do primeiro.
+        """
+        try:
+            return self._apply(mutations)
+        except ConcurrentSync:
+            return self._apply(mutations)
+
+    def _apply(self, mutations):
+        self.client_ids = {}
+        keys = [m.get("key") for m in mutations if isinstance(m, dict)]
+
+        results = []
+        with transaction.atomic():
+            list(
+                get_user_model()
+                .objects.select_for_update()
+                .filter(pk=self.user.pk)
+                .values_list("pk", flat=True)
+            )
+            done = {
+                row.key: row
+                for row in SyncMutation.objects.filter(user=self.user, key__in=keys)
+            }
+            self.client_ids.update(
+                {
+                    (row.action, row.client_id): row.object_id
+                    for row in done.values()
+                    if row.client_id
+                }
+            )
+
+            for index, raw in enumerate(mutations):
+                mutation = MutationSerializer(data=raw)
+                if not mutation.is_valid():
+                    raise MutationError(index, None, mutation.errors)
+                mutation = mutation.validated_data
+                key = mutation["key"]
+
+                if key in done:
+                    results.append(self.result(done[key], "duplicate"))
+                    continue
+
+                if mutation["action"] not in CREATE_ACTIONS.values():
+                    if "id" not in mutation:
+                        raise MutationError(
+                            index, key, {"id": "Informe o objeto da mutação."}
+                        )
+
+                try:
+                    obj = getattr(self, mutation["action"])(mutation)
+                except serializers.ValidationError as exc:
+                    raise MutationError(index, key, exc.detail)
+
+                object_id = obj if isinstance(obj, int) else obj.pk
+                if mutation["client_id"]:
+                    self.client_ids[mutation["action"], mutation["client_id"]] = (
+                        object_id
+                    )
+
+                try:
+                    with transaction.atomic():
+                        done[key] = SyncMutation.objects.create(
+                            user=self.user,
+                            key=key,
+                            action=mutation["action"],
+                            client_id=mutation["client_id"],
+                            object_id=object_id,
+                        )
+                except IntegrityError:
+                    raise ConcurrentSync(key)
+                results.append(self.result(done[key], "applied"))
+
+        return results
+
+    @staticmethod
+    def result(row, status):
+        return {
+            "key": row.key,
+            "action": row.action,
+            "status": status,
+            "client_id": row.client_id or None,
+            "id": row.object_id,
+        }
+
+    def state(self):
+        """Estado do servidor após a sincronização: o plantão aberto."""
+        active = (
+            DailyRecord.objects.filter(user=self.user, is_active=True)
+            .select_related("vehicle")
+            .prefetch_related(
+                Prefetch(
+                    "transactions",
+                    queryset=Transaction.objects.select_related(
+                        "category", "maintenance_mirror"
+                    ),
+                )
+            )
+            .first()
+        )
+        return {
+            "server_time": timezone.now(),
+            "active_shift": (
+                DailyRecordDetailSerializer(active).data if active else None
+            ),
+        }
@@ -1,3 +1,1617 @@
-from django.test import TestCase
+import datetime
+import random
+import statistics
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import cache as dashboard_cache
+from operations import categories, ledger, rollups
+from operations.fuel import FuelSeries, rolling_median, to_decimal
+from operations.models import (
+    Category,
+    DailyRecord,
+    FuelCycle,
+    LedgerCheckpoint,
+    LedgerEntry,
+    Maintenance,
+    MaintenanceForecast,
+    SyncMutation,
+    Transaction,
+    UserDailyStats,
+    UserLifetimeStats,
+    UserMonthlyStats,
+)
+from vehicles.models import Vehicle
+from vehicles.serializers import VehicleSerializer
+
+SIMPLE_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+# As contagens de consultas medem o app, não o DatabaseCache das versões.
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(STORAGES=SIMPLE_STORAGES, CACHES=LOCAL_CACHES)
+class RecordTotalsWritePathTests(TestCase):
+    """
+    Cada escrita de transação deve atualizar os totais do plantão uma única
+    vez (operations.totals), sem reagrupar as transações.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.food = Category.objects.get(user=cls.user, name="Alimentação")
+        cls.record = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+        )
+
+    def setUp(self):
+        self.transaction = Transaction.objects.create(
+            record=self.record, type="INCOME", category=self.income, amount=50
+        )
+
+    def totals_queries(self, queries):
+        sqls = [q["sql"] for q in queries]
+        updates = [
+            sql
+            for sql in sqls
+            if sql.startswith('UPDATE "operations_dailyrecord"') and "total_" in sql
+        ]
+        aggregates = [
+            sql for sql in sqls if "SUM(" in sql and "operations_transaction" in sql
+        ]
+        return len(updates), len(aggregates)
+
+    def assertTotals(self, income, cost):
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.total_income, Decimal(income))
+        self.assertEqual(self.record.total_cost, Decimal(cost))
+
+    def test_model_create(self):
+        # INSERT da transação, UPDATE dos totais, o lançamento no
+        # livro-razão (saldo anterior + INSERT) e os UPDATEs dos
+        # consolidados diário, mensal e geral, num SAVEPOINT (o atomic de
+        # Transaction.save; fora dos testes é o BEGIN/COMMIT).
+        with self.assertNumQueries(9):
+            Transaction.objects.create(
+                record=self.record, type="COST", category=self.food, amount=20
+            )
+        self.assertTotals("50", "20")
+
+    def test_model_update(self):
+        self.transaction.amount = 80
+        with CaptureQueriesContext(connection) as ctx:
+            self.transaction.save()
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("80", "0")
+
+    def test_model_delete(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.transaction.delete()
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("0", "0")
+
+    def test_api_write_paths(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = "/api/operations/transactions/"
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                url,
+                {
+                    "record": self.record.pk,
+                    "category": self.food.pk,
+                    "type": "COST",
+                    "amount": "30.00",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.patch(
+                f"{url}{self.transaction.pk}/", {"amount": "70.00"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.delete(f"{url}{self.transaction.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("0", "30")
+
+    def test_html_write_paths(self):
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f"/operacoes/transacao/{self.transaction.pk}/editar/",
+                {"category": self.income.pk, "amount": "65.00"},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("65", "0")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f"/operacoes/transacao/{self.transaction.pk}/excluir/"
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("0", "0")
+
+    def test_admin_write_path(self):
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f"/admin/operations/transaction/{self.transaction.pk}/change/",
+                {
+                    "record": self.record.pk,
+                    "type": "INCOME",
+                    "category": self.income.pk,
+                    "amount": "90.00",
+                    "description": "",
+                    "liters": "",
+                    "actual_km": "",
+                    "next_due_km": "",
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 0))
+        self.assertTotals("90", "0")
+
+    @override_settings(OPERATIONS_TOTALS_MODE="full")
+    def test_full_mode_uses_one_conditional_aggregate(self):
+        self.transaction.amount = 40
+        with CaptureQueriesContext(connection) as ctx:
+            self.transaction.save()
+        self.assertEqual(self.totals_queries(ctx.captured_queries), (1, 1))
+        self.assertTotals("40", "0")
+
+
+class UserStatsTests(TestCase):
+    """
+    Os consolidados mantidos pelas escritas devem ser iguais aos refeitos a
+    partir da origem (operations.rollups).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+        cls.repair = Category.objects.get(user=cls.user, name="Manutenção")
+        cls.food = Category.objects.get(user=cls.user, name="Alimentação")
+        cls.january = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 31),
+            start_km=1000,
+            end_km=1150,
+            is_active=False,
+        )
+        cls.february = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 2, 1),
+            start_km=1150,
+        )
+
+    def snapshot(self):
+        fields = ("user_id", *rollups.FIELDS)
+        return (
+            sorted(UserDailyStats.objects.values_list("date", *fields)),
+            sorted(UserMonthlyStats.objects.values_list("month", *fields)),
+            sorted(UserLifetimeStats.objects.values_list(*fields)),
+        )
+
+    def test_writes_match_rebuild(self):
+        ride = Transaction.objects.create(
+            record=self.january, type="INCOME", category=self.income, amount=120
+        )
+        fill = Transaction.objects.create(
+            record=self.january, type="COST", category=self.fuel, amount=80
+        )
+        lunch = Transaction.objects.create(
+            record=self.february, type="COST", category=self.food, amount=25
+        )
+        Transaction.objects.create(
+            record=self.february, type="COST", category=self.repair, amount=300
+        )
+
+        ride.amount = 150
+        ride.save()
+        fill.record = self.february
+        fill.category = self.food
+        fill.save()
+        lunch.delete()
+        self.food.is_maintenance = True
+        self.food.save()
+        Maintenance.objects.create(
+            user=self.user,
+            vehicle=self.vehicle,
+            date=datetime.date(2025, 1, 15),
+            odometer=1100,
+            cost=200,
+            type="OIL",
+        )
+        self.february.end_km = 1190
+        self.february.is_active = False
+        self.february.save()
+
+        maintained = self.snapshot()
+        rollups.refresh([self.user.pk])
+        self.assertEqual(maintained, self.snapshot())
+
+        february = UserMonthlyStats.objects.get(month=datetime.date(2025, 2, 1))
+        self.assertEqual(february.cost, Decimal("380.00"))
+        self.assertEqual(february.maintenance_cost, Decimal("380.00"))
+        self.assertEqual(february.km, 40)
+        january = UserMonthlyStats.objects.get(month=datetime.date(2025, 1, 1))
+        self.assertEqual(january.income, Decimal("150.00"))
+        self.assertEqual(january.maintenance_log_cost, Decimal("200.00"))
+        self.assertEqual(january.shifts, 1)
+        lifetime = UserLifetimeStats.objects.get(user=self.user)
+        self.assertEqual(lifetime.income, Decimal("150.00"))
+        self.assertEqual(lifetime.cost, Decimal("380.00"))
+        self.assertEqual(lifetime.km, 190)
+        self.assertEqual(lifetime.shifts, 2)
+
+    def test_record_delete_and_move(self):
+        Transaction.objects.create(
+            record=self.february, type="INCOME", category=self.income, amount=60
+        )
+        self.january.date = datetime.date(2025, 3, 3)
+        self.january.save()
+        self.february.delete()
+
+        self.assertEqual(
+            list(UserMonthlyStats.objects.values_list("month", "shifts")),
+            [(datetime.date(2025, 3, 1), 1)],
+        )
+        self.assertEqual(UserDailyStats.objects.count(), 1)
+        self.assertEqual(
+            UserLifetimeStats.objects.values_list("shifts", "km").get(),
+            (1, 150),
+        )
+
+    def test_check_rollups_fixes_drift(self):
+        Transaction.objects.create(
+            record=self.january, type="INCOME", category=self.income, amount=90
+        )
+        self.assertEqual(rollups.check([self.user.pk]), [])
+
+        # Escrita direta, sem sinais: os consolidados ficam para trás.
+        DailyRecord.objects.filter(pk=self.january.pk).update(end_km=1200)
+        self.assertEqual(
+            [(month, field) for _, month, field, *_ in rollups.check([self.user.pk])],
+            [(datetime.date(2025, 1, 1), "km"), (None, "km")],
+        )
+
+        call_command("check_rollups", "--fix", stdout=StringIO())
+        self.assertEqual(rollups.check([self.user.pk]), [])
+        self.assertEqual(UserLifetimeStats.objects.get(user=self.user).km, 200)
+
+    def test_apply_creates_missing_rows_without_double_counting(self):
+        UserLifetimeStats.objects.all().delete()
+        Transaction.objects.create(
+            record=self.january, type="INCOME", category=self.income, amount=90
+        )
+        self.assertEqual(rollups.check([self.user.pk]), [])
+
+        # Total geral em dia, mas o dia ainda sem linha.
+        UserDailyStats.objects.filter(date=self.february.date).delete()
+        Transaction.objects.create(
+            record=self.february, type="COST", category=self.food, amount=30
+        )
+        self.assertEqual(rollups.check([self.user.pk]), [])
+        lifetime = UserLifetimeStats.objects.get(user=self.user)
+        self.assertEqual((lifetime.income, lifetime.cost), (90, 30))
+
+    def test_refresh_locks_lifetime_before_reading(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rollups.refresh([self.user.pk], [self.january.date])
+
+        sqls = [
+            q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]
+        ]
+        self.assertTrue(sqls[0].startswith('UPDATE "operations_userlifetimestats"'))
+        reads = [i for i, sql in enumerate(sqls) if "operations_dailyrecord" in sql]
+        self.assertGreater(reads[0], 1)
+
+    def test_refresh_keeps_a_row_created_concurrently(self):
+        UserLifetimeStats.objects.all().delete()
+        real_lock = rollups._lock_lifetime
+
+        def racing(user_ids):
+            pks, missing = real_lock(user_ids)
+            # A linha "criada por outro processo" vale e é regravada.
+            UserLifetimeStats.objects.filter(user_id__in=missing).update(income=999)
+            return pks, missing
+
+        with mock.patch.object(rollups, "_lock_lifetime", racing):
+            rollups.refresh([self.user.pk], [self.january.date])
+
+        self.assertEqual(UserLifetimeStats.objects.count(), 1)
+        self.assertEqual(rollups.check([self.user.pk]), [])
+
+    def test_record_write_rolls_back_with_rollups(self):
+        self.january.end_km = 1300
+        with mock.patch.object(rollups, "refresh", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.january.save()
+
+        self.january.refresh_from_db()
+        self.assertEqual(self.january.end_km, 1150)
+
+
+def legacy_consumption(fills):
+    """Laço anterior ao operations.fuel (VehicleSerializer)."""
+    history = []
+    for prev, curr in zip(fills, fills[1:]):
+        km_diff = curr[1] - prev[1]
+        if km_diff > 0 and curr[2] > 0:
+            avg = km_diff / float(curr[2])
+            if 4 < avg < 70:
+                history.append((km_diff, round(avg, 1)))
+    return history
+
+
+def legacy_cycles(fills):
+    """Laço anterior ao operations.fuel (FuelCycle.objects.rebuild)."""
+    cycles = []
+    last_full = None
+    pending_liters = pending_cost = Decimal(0)
+    for fill in fills:
+        _, km, liters, amount, is_full = fill
+        if is_full:
+            if last_full:
+                liters_total = pending_liters + liters
+                cost = pending_cost + amount
+                km_driven = km - last_full[1]
+                average = cost_per_km = None
+                if km_driven > 0 and liters_total > 0:
+                    average = round(km_driven / float(liters_total), 2)
+                    cost_per_km = round(float(cost) / km_driven, 2)
+                cycles.append(
+                    (last_full[1], km, liters_total, cost, average, cost_per_km)
+                )
+            last_full = fill
+            pending_liters = pending_cost = Decimal(0)
+        else:
+            pending_liters += liters
+            pending_cost += amount
+    return cycles
+
+
+class FuelSeriesTests(SimpleTestCase):
+    """O motor vetorizado deve reproduzir os laços que substituiu."""
+
+    def fills(self, seed, size=60):
+        rng = random.Random(seed)
+        km, fills = 10000, []
+        for pk in range(1, size + 1):
+            # Repete KM às vezes e gera médias absurdas para cair nos filtros.
+            km += rng.choice([0, rng.randint(50, 600), rng.randint(2000, 5000)])
+            liters = Decimal(rng.randint(0, 5000)) / 100
+            amount = (liters * Decimal("5.89")).quantize(Decimal("0.01"))
+            fills.append((pk, km, liters, amount, rng.random() < 0.6))
+        return fills
+
+    def test_intervals_match_legacy_consumption(self):
+        for seed in range(20):
+            fills = self.fills(seed)
+            intervals = FuelSeries.from_rows(fills).intervals()
+            engine = [
+                (int(km), round(float(avg), 1))
+                for km, avg, implausible in zip(
+                    intervals["km_driven"],
+                    intervals["average"],
+                    intervals["is_implausible"],
+                )
+                if not implausible
+            ]
+            self.assertEqual(engine, legacy_consumption(fills))
+
+    def test_cycles_match_legacy_loop(self):
+        for seed in range(20):
+            fills = self.fills(seed)
+            result = FuelSeries.from_rows(fills).cycles()
+            engine = [
+                (
+                    int(result["start_km"][n]),
+                    int(result["end_km"][n]),
+                    to_decimal(result["liters"][n]),
+                    to_decimal(result["cost"][n]),
+                    to_decimal(result["average"][n]),
+                    to_decimal(result["cost_per_km"][n]),
+                )
+                for n in range(len(result["index"]))
+            ]
+            expected = [
+                (
+                    start,
+                    end,
+                    liters,
+                    cost,
+                    None if average is None else Decimal(str(average)),
+                    None if cost_per_km is None else Decimal(str(cost_per_km)),
+                )
+                for start, end, liters, cost, average, cost_per_km in legacy_cycles(
+                    fills
+                )
+            ]
+            self.assertEqual(engine, expected)
+
+    def test_rolling_median_matches_statistics(self):
+        rng = random.Random(7)
+        values = [rng.choice([float("nan"), rng.uniform(5, 20)]) for _ in range(50)]
+        for window in (1, 3, 5):
+            expected = []
+            for i in range(len(values)):
+                valid = [v for v in values[max(0, i - window + 1) : i + 1] if v == v]
+                expected.append(statistics.median(valid) if valid else np.nan)
+            np.testing.assert_allclose(
+                rolling_median(values, window), expected, equal_nan=True
+            )
+
+    def test_latest_average_matches_legacy_fuel_average(self):
+        cases = [
+            ([], None),
+            ([(1, 1000, Decimal("30"), 0, True)], None),
+            (
+                [(1, 1000, 0, 0, True), (2, 1400, Decimal("32.5"), 0, True)],
+                400 / 32.5,
+            ),
+            ([(1, 1000, 0, 0, True), (2, 1000, Decimal("10"), 0, True)], 0),
+            ([(1, 1000, 0, 0, True), (2, 1200, Decimal("0"), 0, True)], 0),
+        ]
+        for fills, expected in cases:
+            self.assertEqual(FuelSeries.from_rows(fills).latest_average(), expected)
+
+
+class ConsumptionHistoryTests(TestCase):
+    def test_keeps_plausible_averages_off_the_rolling_median(self):
+        user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        vehicle = Vehicle.objects.create(user=user, model_name="Onix", initial_km=1000)
+        fuel = Category.objects.get(user=user, name="Abastecimento")
+        record = DailyRecord.objects.create(
+            user=user, vehicle=vehicle, date=datetime.date(2025, 1, 1), start_km=1000
+        )
+        # 10 km/l estável, um trecho a 25 km/l (plausível, mas fora da mediana)
+        # e um a 100 km/l (implausível).
+        for km, liters in [(1000, 30), (1300, 30), (1600, 30), (2100, 20), (2300, 2)]:
+            Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=fuel,
+                amount=100,
+                actual_km=km,
+                liters=liters,
+            )
+
+        history = VehicleSerializer().get_consumption_history(vehicle)
+
+        self.assertEqual(
+            [(item["distancia"], item["media"]) for item in history],
+            [(300, 10.0), (300, 10.0), (500, 25.0)],
+        )
+
+
+
+class FuelCycleRebuildTests(TestCase):
+    """
+    A janela recalculada a cada escrita deve deixar os ciclos iguais aos de
+    um recálculo completo do histórico.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.onix = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.hb20 = Vehicle.objects.create(
+            user=cls.user, model_name="HB20", initial_km=5000
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+
+    def setUp(self):
+        self.january, self.february, self.march = (
+            DailyRecord.objects.create(
+                user=self.user,
+                vehicle=vehicle,
+                date=datetime.date(2025, month, 1),
+                start_km=start_km,
+                end_km=start_km + 100,
+                is_active=False,
+            )
+            for month, vehicle, start_km in (
+                (1, self.onix, 1000),
+                (2, self.onix, 2000),
+                (3, self.hb20, 5000),
+            )
+        )
+        self.fills = {
+            km: Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=self.fuel,
+                amount=liters * 6,
+                actual_km=km,
+                liters=liters,
+                is_full_tank=full,
+            )
+            for record, km, liters, full in (
+                (self.january, 1000, 40, True),
+                (self.january, 1300, 15, False),
+                (self.january, 1600, 20, True),
+                (self.february, 2000, 30, True),
+                (self.february, 2400, 25, False),
+                (self.february, 2800, 35, True),
+                (self.march, 5000, 40, True),
+                (self.march, 5400, 30, True),
+            )
+        }
+
+    def cycles(self):
+        return sorted(
+            FuelCycle.objects.values_list(
+                "vehicle_id",
+                "transaction_id",
+                "start_km",
+                "end_km",
+                "liters",
+                "cost",
+                "km_per_liter",
+                "cost_per_km",
+            )
+        )
+
+    def assertMatchesFullRebuild(self, write, windowed=True):
+        rebuild = FuelCycle.objects.rebuild
+        with mock.patch.object(FuelCycle.objects, "rebuild", wraps=rebuild) as spy:
+            write()
+        self.assertTrue(spy.called)
+        if windowed:
+            self.assertTrue(all(call.args[1] for call in spy.call_args_list))
+
+        incremental = self.cycles()
+        for vehicle in (self.onix, self.hb20):
+            rebuild(vehicle.pk)
+        self.assertEqual(incremental, self.cycles())
+
+    def test_insert(self):
+        self.assertMatchesFullRebuild(
+            lambda: Transaction.objects.create(
+                record=self.january,
+                type="COST",
+                category=self.fuel,
+                amount=60,
+                actual_km=1450,
+                liters=10,
+                is_full_tank=True,
+            )
+        )
+
+    def test_edit_km(self):
+        def write():
+            fill = self.fills[1600]
+            fill.actual_km = 2200
+            fill.save()
+
+        self.assertMatchesFullRebuild(write)
+
+    def test_partial_to_full_and_back(self):
+        def to_full():
+            self.fills[1300].is_full_tank = True
+            self.fills[1300].save()
+
+        def to_partial():
+            self.fills[2000].is_full_tank = False
+            self.fills[2000].save()
+
+        self.assertMatchesFullRebuild(to_full)
+        self.assertMatchesFullRebuild(to_partial)
+
+    def test_delete(self):
+        self.assertMatchesFullRebuild(self.fills[1600].delete)
+
+    def test_transaction_moved_to_another_vehicle(self):
+        def write():
+            fill = self.fills[2000]
+            fill.record = self.march
+            fill.actual_km = 5200
+            fill.save()
+
+        self.assertMatchesFullRebuild(write)
+        self.assertEqual(
+            FuelCycle.objects.get(transaction=self.fills[5400]).start_km, 5200
+        )
+
+    def test_record_moved_to_another_vehicle(self):
+        def write():
+            self.february.vehicle = self.hb20
+            self.february.save()
+
+        self.assertMatchesFullRebuild(write)
+        self.assertEqual(
+            FuelCycle.objects.get(transaction=self.fills[2800]).vehicle, self.hb20
+        )
+
+    def test_category_fuel_flag_flip(self):
+        def flip():
+            self.fuel.is_fuel = not self.fuel.is_fuel
+            self.fuel.save()
+
+        self.assertMatchesFullRebuild(flip, windowed=False)
+        self.assertFalse(FuelCycle.objects.exists())
+        self.assertMatchesFullRebuild(flip, windowed=False)
+        self.assertEqual(FuelCycle.objects.count(), 4)
+
+
+class BulkTransactionTests(TestCase):
+    """Importação em lote (operations.ingest) pelo endpoint bulk."""
+
+    URL = "/api/operations/transactions/bulk/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+        cls.repair = Category.objects.get(user=cls.user, name="Manutenção")
+        cls.record = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+        )
+
+        other = get_user_model().objects.create_user(
+            "outro", "outro@example.com", "senha-forte-123"
+        )
+        other_vehicle = Vehicle.objects.create(
+            user=other, model_name="HB20", initial_km=5000
+        )
+        cls.other_record = DailyRecord.objects.create(
+            user=other,
+            vehicle=other_vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=5000,
+        )
+        cls.other_category = Category.objects.get(user=other, name="Abastecimento")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, **overrides):
+        return {
+            "record": self.record.pk,
+            "category": self.income.pk,
+            "type": "INCOME",
+            "amount": "100.00",
+            **overrides,
+        }
+
+    def test_partial_batch_saves_valid_items(self):
+        response = self.client.post(
+            self.URL,
+            [
+                self.item(),
+                self.item(amount="abc"),
+                self.item(record=self.other_record.pk),
+                self.item(amount="30.00"),
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [item["amount"] for item in response.data["created"]],
+            ["100.00", "30.00"],
+        )
+        self.assertEqual([e["index"] for e in response.data["errors"]], [1, 2])
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.total_income, Decimal("130.00"))
+
+    def test_rejects_other_users_records_and_categories(self):
+        response = self.client.post(
+            self.URL,
+            [
+                self.item(record=self.other_record.pk),
+                self.item(category=self.other_category.pk, type="COST"),
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], [])
+        self.assertIn("record", response.data["errors"][0]["errors"])
+        self.assertIn("category", response.data["errors"][1]["errors"])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_side_effects_match_single_writes(self):
+        response = self.client.post(
+            self.URL,
+            [
+                self.item(),
+                self.item(
+                    type="COST",
+                    category=self.fuel.pk,
+                    amount="150.00",
+                    liters="25.00",
+                    actual_km=1180,
+                ),
+                self.item(
+                    type="COST",
+                    category=self.repair.pk,
+                    amount="80.00",
+                    description="Pastilhas",
+                ),
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.total_income, Decimal("100.00"))
+        self.assertEqual(self.record.total_cost, Decimal("230.00"))
+        self.assertEqual(
+            LedgerEntry.objects.filter(record_id=self.record.pk).count(), 3
+        )
+
+        mirror = Maintenance.objects.get(transaction__category=self.repair)
+        self.assertEqual(mirror.cost, Decimal("80.00"))
+        self.assertEqual(mirror.vehicle, self.vehicle)
+
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.recorded_km, 1180)
+
+        self.assertEqual(rollups.check([self.user.pk]), [])
+        stats = UserLifetimeStats.objects.get(user=self.user)
+        self.assertEqual(stats.fuel_cost, Decimal("150.00"))
+        self.assertEqual(stats.maintenance_cost, Decimal("80.00"))
+        self.assertEqual(stats.maintenance_log_cost, Decimal("80.00"))
+
+
+class SyncTests(TestCase):
+    """Fila de mutações offline (operations.sync) pelo endpoint de sync."""
+
+    URL = "/api/operations/sync/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queue(self):
+        return [
+            {
+                "key": "k1",
+                "action": "start_shift",
+                "client_id": "shift-a",
+                "data": {
+                    "vehicle": self.vehicle.pk,
+                    "date": "2025-01-01",
+                    "start_km": 1000,
+                },
+            },
+            {
+                "key": "k2",
+                "action": "create_transaction",
+                "client_id": "tx-a",
+                "data": {
+                    "record": "shift-a",
+                    "category": self.income.pk,
+                    "type": "INCOME",
+                    "amount": "50.00",
+                },
+            },
+            {
+                "key": "k3",
+                "action": "update_transaction",
+                "id": "tx-a",
+                "data": {"amount": "70.00"},
+            },
+            {
+                "key": "k4",
+                "action": "end_shift",
+                "id": "shift-a",
+                "data": {"end_km": 1100},
+            },
+        ]
+
+    def sync(self, mutations):
+        return self.client.post(self.URL, {"mutations": mutations}, format="json")
+
+    def test_applies_queue_resolving_client_ids(self):
+        response = self.sync(self.queue())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r["status"] for r in response.data["results"]], ["applied"] * 4
+        )
+        record = DailyRecord.objects.get(user=self.user)
+        self.assertFalse(record.is_active)
+        self.assertEqual(record.end_km, 1100)
+        self.assertEqual(record.total_income, Decimal("70.00"))
+        self.assertEqual(response.data["results"][0]["id"], record.pk)
+
+    def test_replay_answers_duplicate(self):
+        first = self.sync(self.queue()).data["results"]
+        second = self.sync(self.queue()).data["results"]
+
+        self.assertEqual([r["status"] for r in second], ["duplicate"] * 4)
+        self.assertEqual([r["id"] for r in second], [r["id"] for r in first])
+        self.assertEqual(DailyRecord.objects.count(), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_later_batch_resolves_earlier_client_id(self):
+        self.sync(self.queue()[:1])
+        response = self.sync(self.queue()[1:2])
+
+        self.assertEqual(response.status_code, 200)
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.record, DailyRecord.objects.get())
+        self.assertEqual(response.data["results"][0]["id"], transaction.pk)
+
+    def test_failing_mutation_rolls_back_the_queue(self):
+        queue = self.queue()
+        queue[2]["id"] = "tx-desconhecida"
+
+        response = self.sync(queue)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["failed"]["index"], 2)
+        self.assertFalse(DailyRecord.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(SyncMutation.objects.exists())
+
+    def test_concurrent_replay_answers_duplicate(self):
+        record = DailyRecord.objects.create(
+            user=self.user,
+            vehicle=self.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+        )
+        queue = [
+            {
+                "key": "k1",
+                "action": "create_transaction",
+                "data": {
+                    "record": record.pk,
+                    "category": self.income.pk,
+                    "type": "INCOME",
+                    "amount": "50.00",
+                },
+            }
+        ]
+        applied = self.sync(queue).data["results"]
+
+        # Simula o reenvio que leu as chaves antes do primeiro gravar.
+        real_filter = SyncMutation.objects.filter
+        reads = []
+
+        def stale_first_read(*args, **kwargs):
+            reads.append(kwargs)
+            if len(reads) == 1:
+                return SyncMutation.objects.none()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(SyncMutation.objects, "filter", stale_first_read):
+            response = self.sync(queue)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["status"], "duplicate")
+        self.assertEqual(response.data["results"][0]["id"], applied[0]["id"])
+        self.assertEqual(Transaction.objects.count(), 1)
+        record.refresh_from_db()
+        self.assertEqual(record.total_income, Decimal("50.00"))
+
+
+class LedgerTests(TestCase):
+    """Livro-razão das transações (operations.ledger) e seus comandos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.food = Category.objects.get(user=cls.user, name="Alimentação")
+        cls.monday, cls.tuesday = (
+            DailyRecord.objects.create(
+                user=cls.user,
+                vehicle=cls.vehicle,
+                date=datetime.date(2025, 1, day),
+                start_km=1000,
+                end_km=1100,
+                is_active=False,
+            )
+            for day in (6, 7)
+        )
+
+    def entries(self):
+        return list(
+            LedgerEntry.objects.order_by("id").values_list(
+                "event",
+                "record_id",
+                "income_delta",
+                "cost_delta",
+                "balance_income",
+                "balance_cost",
+            )
+        )
+
+    def test_append_chains_balances_per_record(self):
+        first = Transaction.objects.create(
+            record=self.monday, type="INCOME", category=self.income, amount=100
+        )
+        Transaction.objects.create(
+            record=self.monday, type="COST", category=self.food, amount=30
+        )
+        first.amount = 120
+        first.save()
+        first.record = self.tuesday
+        first.save()
+        first.delete()
+
+        monday, tuesday = self.monday.pk, self.tuesday.pk
+        self.assertEqual(
+            self.entries(),
+            [
+                ("CREATE", monday, 100, 0, 100, 0),
+                ("CREATE", monday, 0, 30, 100, 30),
+                ("UPDATE", monday, 20, 0, 120, 30),
+                ("UPDATE", tuesday, 120, 0, 120, 0),
+                ("UPDATE", monday, -120, 0, 0, 30),
+                ("DELETE", tuesday, -120, 0, 0, 0),
+            ],
+        )
+        self.assertEqual(
+            ledger.replay([monday, tuesday, 0]),
+            {monday: (0, 30), tuesday: (0, 0), 0: (0, 0)},
+        )
+        self.assertEqual(ledger.check(), ([], LedgerEntry.objects.last().pk))
+
+    def test_update_without_money_changes_is_not_entered(self):
+        transaction = Transaction.objects.create(
+            record=self.monday, type="INCOME", category=self.income, amount=100
+        )
+        transaction.description = "Aeroporto"
+        transaction.save()
+
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+    def test_failed_append_rolls_back_the_write(self):
+        with mock.patch.object(ledger, "append", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Transaction.objects.create(
+                    record=self.monday, type="INCOME", category=self.income, amount=100
+                )
+
+        self.assertFalse(Transaction.objects.exists())
+        self.monday.refresh_from_db()
+        self.assertEqual(self.monday.total_income, 0)
+        self.assertEqual(UserLifetimeStats.objects.get(user=self.user).income, 0)
+
+    def test_check_reports_drift(self):
+        Transaction.objects.create(
+            record=self.monday, type="INCOME", category=self.income, amount=100
+        )
+        entry = Transaction.objects.create(
+            record=self.tuesday, type="COST", category=self.food, amount=40
+        )
+        DailyRecord.objects.filter(pk=self.monday.pk).update(total_income=90)
+        LedgerEntry.objects.filter(transaction_id=entry.pk).update(balance_cost=50)
+
+        problems, last_id = ledger.check()
+
+        self.assertEqual(
+            problems,
+            [
+                (self.monday.pk, "totals", (100, 0), (90, 0)),
+                (self.tuesday.pk, "chain", (0, 50), (0, 40)),
+                (self.tuesday.pk, "totals", (0, 50), (0, 40)),
+            ],
+        )
+        self.assertEqual(last_id, LedgerEntry.objects.last().pk)
+        # A janela começa depois de `after_id`.
+        self.assertEqual(ledger.check(after_id=last_id), ([], last_id))
+
+    def test_check_ledger_command(self):
+        Transaction.objects.create(
+            record=self.monday, type="INCOME", category=self.income, amount=100
+        )
+        DailyRecord.objects.filter(pk=self.monday.pk).update(total_income=90)
+
+        out = StringIO()
+        call_command("check_ledger", stdout=out)
+        self.assertIn(f"Plantão {self.monday.pk} (totals)", out.getvalue())
+        # Com divergências pendentes o ponto de verificação não avança.
+        self.assertEqual(LedgerCheckpoint.objects.get(name="default").last_entry_id, 0)
+
+        call_command("check_ledger", "--fix", stdout=StringIO())
+        self.monday.refresh_from_db()
+        self.assertEqual(self.monday.total_income, 100)
+        last_id = LedgerEntry.objects.last().pk
+        self.assertEqual(
+            LedgerCheckpoint.objects.get(name="default").last_entry_id, last_id
+        )
+
+        out = StringIO()
+        call_command("check_ledger", stdout=out)
+        self.assertIn(f"em dia até o lançamento #{last_id}", out.getvalue())
+
+    def test_rebuild_ledger_totals_command(self):
+        Transaction.objects.create(
+            record=self.monday, type="INCOME", category=self.income, amount=100
+        )
+        Transaction.objects.create(
+            record=self.tuesday, type="COST", category=self.food, amount=40
+        )
+        DailyRecord.objects.filter(pk=self.monday.pk).update(total_income=0)
+        DailyRecord.objects.filter(pk=self.tuesday.pk).update(total_cost=99)
+        rollups.refresh([self.user.pk])
+
+        out = StringIO()
+        call_command("rebuild_ledger_totals", "--chunk-size", "1", stdout=out)
+
+        self.assertIn("2 plantões conferidos, 2 com totais regravados", out.getvalue())
+        self.monday.refresh_from_db()
+        self.tuesday.refresh_from_db()
+        self.assertEqual(self.monday.total_income, 100)
+        self.assertEqual(self.tuesday.total_cost, 40)
+        self.assertEqual(rollups.check([self.user.pk]), [])
+        lifetime = UserLifetimeStats.objects.get(user=self.user)
+        self.assertEqual((lifetime.income, lifetime.cost), (100, 40))
+
+    def test_lock_records_is_skipped_without_row_locks(self):
+        with mock.patch.object(connection.features, "has_select_for_update", False):
+            with self.assertNumQueries(0):
+                ledger.lock_records([self.monday.pk])
+
+
+class MaintenanceForecastTests(TestCase):
+    """Previsão de manutenção em lote (MaintenanceForecast.objects.refresh)."""
+
+    AS_OF = datetime.date(2025, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.onix = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=10000
+        )
+        cls.hb20 = Vehicle.objects.create(
+            user=cls.user, model_name="HB20", initial_km=20000
+        )
+        cls.repair = Category.objects.get(user=cls.user, name="Manutenção")
+
+        # Só os plantões encerrados dos últimos 60 dias contam na rodagem:
+        # 500 km entre 20/02 e 01/03 (10 dias corridos) dão 50 km/dia.
+        records = {}
+        for day, start_km, end_km in (
+            (datetime.date(2024, 12, 1), 9800, 10000),
+            (datetime.date(2025, 2, 20), 10000, 10300),
+            (datetime.date(2025, 2, 28), 10300, 10500),
+            (datetime.date(2025, 3, 1), 10500, None),
+        ):
+            records[day] = DailyRecord.objects.create(
+                user=cls.user,
+                vehicle=cls.onix,
+                date=day,
+                start_km=start_km,
+                end_km=end_km,
+                is_active=end_km is None,
+            )
+
+        def maintenance(date, type, next_due_km, **kwargs):
+            return Maintenance.objects.create(
+                user=cls.user,
+                vehicle=cls.onix,
+                date=date,
+                odometer=10000,
+                cost=100,
+                type=type,
+                next_due_km=next_due_km,
+                **kwargs,
+            )
+
+        # Vale só a troca de óleo mais recente.
+        maintenance(datetime.date(2025, 1, 10), "OIL", 10200)
+        cls.oil = maintenance(datetime.date(2025, 2, 20), "OIL", 15000)
+        cls.tires = maintenance(
+            datetime.date(2025, 2, 1), "TIRES", 11000, description="Rodízio"
+        )
+
+        cls.overdue = Transaction.objects.create(
+            record=records[datetime.date(2025, 2, 20)],
+            type="COST",
+            category=cls.repair,
+            amount=100,
+            next_due_km=10400,
+        )
+        # Transação com espelho em Maintenance aparece uma vez só, pelo espelho.
+        mirrored = Transaction.objects.create(
+            record=records[datetime.date(2025, 2, 28)],
+            type="COST",
+            category=cls.repair,
+            amount=300,
+            next_due_km=12000,
+        )
+        cls.brakes = maintenance(
+            datetime.date(2025, 2, 28),
+            "MECHANICAL",
+            12000,
+            description="Freios",
+            transaction=mirrored,
+        )
+
+    def items(self, forecast):
+        return [
+            (
+                item["source"],
+                item["id"],
+                item["label"],
+                item["due_km"],
+                item["remaining_km"],
+                item["due_date"],
+            )
+            for item in forecast.items
+        ]
+
+    def test_refresh_upserts_every_vehicle_in_fixed_queries(self):
+        vehicle_ids = [self.onix.pk, self.hb20.pk]
+        # Rodagem, manutenções, transações, veículos e o upsert.
+        with self.assertNumQueries(5):
+            MaintenanceForecast.objects.refresh(vehicle_ids, self.AS_OF)
+
+        forecast = MaintenanceForecast.objects.get(vehicle=self.onix)
+        overdue, tires, brakes, oil = (
+            obj.pk for obj in (self.overdue, self.tires, self.brakes, self.oil)
+        )
+        self.assertEqual(forecast.as_of, self.AS_OF)
+        self.assertEqual(forecast.km_per_day, Decimal("50.00"))
+        self.assertEqual(
+            self.items(forecast),
+            [
+                ("transaction", overdue, "Manutenção", 10400, -100, "2025-03-01"),
+                ("maintenance", tires, "Rodízio", 11000, 500, "2025-03-11"),
+                ("maintenance", brakes, "Freios", 12000, 1500, "2025-03-31"),
+                ("maintenance", oil, "Troca de Óleo", 15000, 4500, "2025-05-30"),
+            ],
+        )
+        # Os campos diretos repetem o vencimento mais próximo.
+        self.assertEqual(
+            (forecast.next_due_km, forecast.remaining_km, forecast.due_date),
+            (10400, -100, self.AS_OF),
+        )
+
+        empty = MaintenanceForecast.objects.get(vehicle=self.hb20)
+        self.assertEqual(
+            (empty.km_per_day, empty.next_due_km, empty.due_date, empty.items),
+            (None, None, None, []),
+        )
+
+    def test_refresh_updates_existing_rows(self):
+        MaintenanceForecast.objects.refresh([self.onix.pk], self.AS_OF)
+        self.overdue.next_due_km = None
+        self.overdue.save()
+
+        later = self.AS_OF + datetime.timedelta(days=10)
+        MaintenanceForecast.objects.refresh([self.onix.pk], later)
+
+        forecast = MaintenanceForecast.objects.get(vehicle=self.onix)
+        self.assertEqual(MaintenanceForecast.objects.count(), 1)
+        self.assertEqual(forecast.as_of, later)
+        # 500 km em 20 dias corridos.
+        self.assertEqual(forecast.km_per_day, Decimal("25.00"))
+        self.assertEqual(
+            (forecast.next_due_km, forecast.remaining_km, forecast.due_date),
+            (11000, 500, later + datetime.timedelta(days=20)),
+        )
+
+    def test_forecast_maintenance_command(self):
+        version = dashboard_cache.get_version(self.user.pk)
+
+        out = StringIO()
+        call_command("forecast_maintenance", "--batch-size", "1", stdout=out)
+
+        self.assertIn("Previsão calculada para 2 veículos.", out.getvalue())
+        forecasts = MaintenanceForecast.objects.order_by("vehicle_id")
+        today = timezone.localdate()
+        self.assertEqual(
+            [(f.vehicle_id, f.as_of) for f in forecasts],
+            [(self.onix.pk, today), (self.hb20.pk, today)],
+        )
+        self.assertEqual(
+            [item["due_km"] for item in forecasts[0].items],
+            [10400, 11000, 12000, 15000],
+        )
+        self.assertNotEqual(dashboard_cache.get_version(self.user.pk), version)
+
+
+class MaintenanceQuerySetTests(TestCase):
+    """Custos de manutenção agrupados no banco (by_type, by_period)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle, other = (
+            Vehicle.objects.create(user=user, model_name=name, initial_km=1000)
+            for name in ("Onix", "HB20")
+        )
+        for vehicle, date, type, cost in (
+            (cls.vehicle, datetime.date(2024, 11, 15), "OIL", 100),
+            (cls.vehicle, datetime.date(2025, 1, 10), "OIL", 150),
+            (cls.vehicle, datetime.date(2025, 1, 20), "TIRES", 400),
+            (cls.vehicle, datetime.date(2025, 2, 5), "MECHANICAL", 300),
+            (cls.vehicle, datetime.date(2025, 4, 1), "OIL", 120),
+            (other, datetime.date(2025, 1, 10), "OIL", 999),
+        ):
+            Maintenance.objects.create(
+                user=user,
+                vehicle=vehicle,
+                date=date,
+                odometer=1000,
+                cost=cost,
+                type=type,
+            )
+
+    def setUp(self):
+        self.maintenances = Maintenance.objects.filter(vehicle=self.vehicle)
+
+    def test_by_type(self):
+        self.assertEqual(
+            self.maintenances.by_type(),
+            [
+                {"type": "TIRES", "name": "Pneus", "total": 400, "count": 1},
+                {"type": "OIL", "name": "Troca de Óleo", "total": 370, "count": 3},
+                {
+                    "type": "MECHANICAL",
+                    "name": "Mecânica Geral",
+                    "total": 300,
+                    "count": 1,
+                },
+            ],
+        )
+
+    def test_by_period(self):
+        cases = {
+            "month": [
+                ("2024-11", datetime.date(2024, 11, 1), 100, 1),
+                ("2025-01", datetime.date(2025, 1, 1), 550, 2),
+                ("2025-02", datetime.date(2025, 2, 1), 300, 1),
+                ("2025-04", datetime.date(2025, 4, 1), 120, 1),
+            ],
+            "quarter": [
+                ("2024-T4", datetime.date(2024, 10, 1), 100, 1),
+                ("2025-T1", datetime.date(2025, 1, 1), 850, 3),
+                ("2025-T2", datetime.date(2025, 4, 1), 120, 1),
+            ],
+            "year": [
+                ("2024", datetime.date(2024, 1, 1), 100, 1),
+                ("2025", datetime.date(2025, 1, 1), 970, 4),
+            ],
+        }
+        for period, expected in cases.items():
+            with self.subTest(period=period):
+                rows = self.maintenances.by_period(period)
+                self.assertEqual(
+                    [(r["period"], r["start"], r["total"], r["count"]) for r in rows],
+                    expected,
+                )
+
+    def test_in_period_bounds_are_inclusive(self):
+        maintenances = self.maintenances.in_period(
+            start=datetime.date(2025, 1, 10), end=datetime.date(2025, 2, 5)
+        )
+
+        self.assertEqual(
+            [(row["type"], row["total"]) for row in maintenances.by_type()],
+            [("TIRES", 400), ("MECHANICAL", 300), ("OIL", 150)],
+        )
+        self.assertEqual(self.maintenances.in_period().count(), 5)
+
+
+class CategoryProvisionTests(TestCase):
+    """Categorias padrão do cadastro e do onboarding (operations.categories)."""
+
+    def setUp(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.user = get_user_model().objects.create_user(
+                "motorista", "motorista@example.com", "senha-forte-123"
+            )
+        self.signup_queries = [
+            q["sql"] for q in ctx.captured_queries if "operations_category" in q["sql"]
+        ]
+
+    def names(self):
+        return list(
+            Category.objects.filter(user=self.user)
+            .order_by("id")
+            .values_list("name", "type")
+        )
+
+    def test_signup_creates_templates_in_one_insert(self):
+        self.assertEqual(len(self.signup_queries), 1)
+        self.assertTrue(self.signup_queries[0].startswith("INSERT"))
+        self.assertEqual(
+            self.names(),
+            [(t["name"], t["type"]) for t in categories.signup_templates()],
+        )
+        fuel = Category.objects.get(user=self.user, name="Abastecimento")
+        self.assertTrue(fuel.is_fuel)
+        self.assertFalse(fuel.is_maintenance)
+
+    def test_check_existing_skips_categories_the_user_has(self):
+        # Mesmo nome com outro tipo não conta como existente.
+        Category.objects.create(user=self.user, name="Uber", type="COST")
+        templates = categories.signup_templates() + categories.income_templates(
+            groups=("passenger",)
+        )
+
+        created = categories.provision(self.user, templates)
+
+        self.assertEqual(
+            [(c.name, c.type) for c in created],
+            [
+                (name, "INCOME")
+                for name in ("Uber", "99", "Indrive", "Particular", "Black")
+            ],
+        )
+        # Só a consulta dos nomes existentes: nada a criar.
+        with self.assertNumQueries(1):
+            self.assertEqual(categories.provision(self.user, templates), [])
+
+    def test_onboard_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = "/api/operations/onboard/"
+
+        apps = ["iFood", "Nope", "Uber"]
+        response = client.post(url, {"app_list": apps}, format="json")
+        self.assertEqual(response.data, {"status": "ok", "created": 2})
+        response = client.post(url, {"app_list": ["Uber"]}, format="json")
+        self.assertEqual(response.data, {"status": "ok", "created": 0})
+
+        # Sem nenhum app conhecido entra a receita genérica.
+        response = client.post(url, {"app_list": []}, format="json")
+        self.assertEqual(response.data, {"status": "ok", "created": 1})
+        self.assertIn(("Ganhos Diversos", "INCOME"), self.names())
+
+
+class MaintenanceMirrorTests(TestCase):
+    """Espelho em Manutenção das despesas de categorias de manutenção."""
+
+    URL = "/api/operations/transactions/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.repair = Category.objects.get(user=cls.user, name="Manutenção")
+        cls.record = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+            end_km=1100,
+            is_active=False,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            self.URL,
+            {
+                "record": self.record.pk,
+                "category": self.repair.pk,
+                "type": "COST",
+                "amount": "200.00",
+                "description": "Freios",
+            },
+            format="json",
+        )
+        self.transaction = Transaction.objects.get(pk=response.data["id"])
+
+    def mirror(self):
+        return Maintenance.objects.get(transaction=self.transaction)
+
+    def patch(self, data):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(
+                f"{self.URL}{self.transaction.pk}/", data, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        updates = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith('UPDATE "operations_maintenance"')
+        ]
+        return response, updates
+
+    def test_create_writes_the_mirror(self):
+        mirror = self.mirror()
+        self.assertEqual(
+            (mirror.cost, mirror.odometer, mirror.description, mirror.type),
+            (200, 1100, "Via Dashboard: Freios", "OTHER"),
+        )
+
+    def test_edit_syncs_the_mirror_in_one_update(self):
+        response, updates = self.patch(
+            {"amount": "250.00", "actual_km": 1090, "next_due_km": 11000}
+        )
+
+        self.assertEqual(len(updates), 1)
+        mirror = self.mirror()
+        self.assertEqual(
+            (mirror.cost, mirror.odometer, mirror.next_due_km), (250, 1090, 11000)
+        )
+        self.assertEqual(response.data["next_due_km"], 11000)
+        # O custo do espelho chega aos consolidados.
+        self.assertEqual(
+            UserDailyStats.objects.get(user=self.user).maintenance_log_cost, 250
+        )
+
+    def test_edit_without_mirrored_changes_skips_the_update(self):
+        _, updates = self.patch({"is_full_tank": True})
+
+        self.assertEqual(updates, [])
+
+    def test_delete_keeps_the_maintenance_detached(self):
+        mirror = self.mirror()
+
+        response = self.client.delete(f"{self.URL}{self.transaction.pk}/")
+
+        self.assertEqual(response.status_code, 204)
+        mirror.refresh_from_db()
+        self.assertIsNone(mirror.transaction_id)
+        self.assertEqual(mirror.cost, 200)
+
+
+class CollapseDuplicateMirrorsMigrationTests(TransactionTestCase):
+    """Migração 0015: um espelho por transação antes do OneToOneField."""
+
+    before = [("operations", "0014_dailyrecord_unique_active_record_per_user")]
+    after = [("operations", "0015_maintenance_transaction_one_to_one")]
+
+    def setUp(self):
+        MigrationExecutor(connection).migrate(self.before)
+        # Estado de tudo o que ficou aplicado, não só das dependências.
+        loader = MigrationExecutor(connection).loader
+        self.apps = loader.project_state(list(loader.applied_migrations)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_keeps_the_latest_mirror_of_each_transaction(self):
+        model = self.apps.get_model
+        user = model("accounts", "CustomUser").objects.create(
+            username="motorista", email="motorista@example.com"
+        )
+        vehicle = model("vehicles", "Vehicle").objects.create(
+            user=user, model_name="Onix", initial_km=1000
+        )
+        category = model("operations", "Category").objects.create(
+            user=user, name="Manutenção", type="COST", is_maintenance=True
+        )
+        record = model("operations", "DailyRecord").objects.create(
+            user=user, vehicle=vehicle, date=datetime.date(2025, 1, 1), start_km=1000
+        )
+        Transaction = model("operations", "Transaction")
+        first, second = (
+            Transaction.objects.create(
+                record=record, category=category, type="COST", amount=100
+            )
+            for _ in range(2)
+        )
+        Maintenance = model("operations", "Maintenance")
+
+        def mirror(transaction, day):
+            return Maintenance.objects.create(
+                user=user,
+                vehicle=vehicle,
+                date=datetime.date(2025, 1, day),
+                odometer=1000,
+                cost=100,
+                type="OTHER",
+                transaction=transaction,
+            )
+
+        # Fica a data mais recente e, no empate, o maior id.
+        mirror(first, 1)
+        latest = mirror(first, 3)
+        mirror(first, 2)
+        mirror(second, 5)
+        tie_winner = mirror(second, 5)
+        detached = mirror(None, 1)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+
+        self.assertEqual(
+            sorted(Maintenance.objects.values_list("pk", flat=True)),
+            sorted([latest.pk, tie_winner.pk, detached.pk]),
+        )
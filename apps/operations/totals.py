@@ -0,0 +1,158 @@
+"""
+Totais de receita e custo dos plantões (DailyRecord).
+
+Único ponto que escreve total_income/total_cost a partir das transações.
+O sinal de Transaction chama transaction_saved/transaction_deleted uma vez
+por escrita (views HTML, API, admin, shell), que também lançam o evento no
+livro-razão (operations.ledger); importações em lote e a reconciliação usam
+recompute(). Nenhum outro código deve recalcular.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Q, Sum
+
+from . import ledger
+from .models import DailyRecord, LedgerEntry, Transaction
+
+
+def _mode():
+    """
+    "incremental" aplica só a diferença de cada escrita; "full" reagrupa as
+    transações do plantão a cada escrita (modo de contingência).
+    """
+    return getattr(settings, "OPERATIONS_TOTALS_MODE", "incremental")
+
+
+def compute(record_ids):
+    """
+    {record_id: (receita, custo)} somando as transações dos plantões em um
+    único agregado condicional. Plantões sem transações ficam zerados.
+    """
+    totals = {pk: (Decimal(0), Decimal(0)) for pk in record_ids}
+    rows = (
+        Transaction.objects.filter(record_id__in=totals)
+        .order_by()
+        .values("record_id")
+        .annotate(
+            income=Sum("amount", filter=Q(type="INCOME")),
+            cost=Sum("amount", filter=Q(type="COST")),
+        )
+    )
+    for row in rows:
+        totals[row["record_id"]] = (row["income"] or 0, row["cost"] or 0)
+    return totals
+
+
+def recompute(record_ids):
+    """
+    Recálculo completo: um agregado condicional para ler e um bulk_update
+    para gravar, qualquer que seja a quantidade de plantões.
+    """
+    record_ids = {pk for pk in record_ids if pk}
+    if not record_ids:
+        return {}
+
+    totals = compute(record_ids)
+    DailyRecord.objects.bulk_update(
+        [
+            DailyRecord(pk=pk, total_income=income, total_cost=cost)
+            for pk, (income, cost) in totals.items()
+        ],
+        ["total_income", "total_cost"],
+    )
+    return totals
+
+
+def apply_deltas(deltas):
+    """Soma {record_id: (receita, custo)} aos totais, um UPDATE com F() cada."""
+    for record_id, (income, cost) in deltas.items():
+        changes = {}
+        if income:
+            changes["total_income"] = F("total_income") + income
+        if cost:
+            changes["total_cost"] = F("total_cost") + cost
+        if changes:
+            DailyRecord.objects.filter(pk=record_id).update(**changes)
+
+
+def _signed(kind, amount, sign=1):
+    amount = Decimal(str(amount or 0)) * sign
+    return (amount, 0) if kind == "INCOME" else (0, amount)
+
+
+def _sync_loaded_record(instance, totals, absolute):
+    """
+    Espelha no plantão já carregado na transação os totais recalculados
+    (`absolute`) ou as diferenças aplicadas.
+    """
+    if not Transaction.record.is_cached(instance):
+        return
+    if instance.record_id not in totals:
+        return
+
+    record = instance.record
+    income, cost = totals[instance.record_id]
+    if absolute:
+        record.total_income, record.total_cost = income, cost
+    else:
+        record.total_income += income
+        record.total_cost += cost
+
+
+def _deltas(instance, previous):
+    """Efeito da escrita nos totais: {record_id: (receita, custo)}."""
+    deltas = defaultdict(lambda: (0, 0))
+    changes = [(instance.record_id, _signed(instance.type, instance.amount))]
+    if previous:
+        changes.append(
+            (previous["record_id"], _signed(previous["type"], previous["amount"], -1))
+        )
+    for record_id, (income, cost) in changes:
+        old_income, old_cost = deltas[record_id]
+        deltas[record_id] = (old_income + income, old_cost + cost)
+    return dict(deltas)
+
+
+def transaction_saved(instance, created, previous=None):
+    """
+    Aplica a criação/edição de uma transação aos totais pela diferença entre
+    o valor anterior (capturado no pre_save) e o novo, e a lança no
+    livro-razão. Sem o estado anterior de uma edição, ou no modo "full",
+    recalcula os plantões envolvidos. Roda dentro da transação de banco do
+    save (Transaction.save), com os plantões travados.
+    """
+    if not created and previous is None:
+        # Sem o pre_save: o livro-razão sabe o último estado da transação.
+        previous = ledger.last_state(instance.pk)
+        full = True
+    else:
+        full = _mode() == "full"
+
+    ledger.lock_records([instance.record_id, previous and previous["record_id"]])
+
+    deltas = _deltas(instance, previous)
+    if full:
+        totals = recompute([instance.record_id, previous and previous["record_id"]])
+        _sync_loaded_record(instance, totals, absolute=True)
+    else:
+        apply_deltas(deltas)
+        _sync_loaded_record(instance, deltas, absolute=False)
+
+    event = LedgerEntry.CREATE if created else LedgerEntry.UPDATE
+    ledger.append(event, instance, deltas)
+
+
+def transaction_deleted(instance):
+    ledger.lock_records([instance.record_id])
+    deltas = {instance.record_id: _signed(instance.type, instance.amount, -1)}
+    if _mode() == "full":
+        totals = recompute([instance.record_id])
+        _sync_loaded_record(instance, totals, absolute=True)
+    else:
+        apply_deltas(deltas)
+        _sync_loaded_record(instance, deltas, absolute=False)
+
+    ledger.append(LedgerEntry.DELETE, instance, deltas)
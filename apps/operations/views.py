@@ -1,6 +1,6 @@
 import json
+from django.db import IntegrityError, transaction
 from django.shortcuts import redirect, get_object_or_404
-from django.db.models import Sum
 from django.http import JsonResponse
 from django.urls import reverse_lazy
 from django.utils import timezone
@@ -34,29 +34,41 @@ class StartShiftView(LoginRequiredMixin, CreateView):
     template_name = "operations/shift_start.html"
     success_url = reverse_lazy("dashboard")
 
-    def dispatch(self, request, *args, **kwargs):
+    ACTIVE_MESSAGE = (
+        "Você já tem um plantão em aberto! Encerre-o antes de iniciar outro."
+    )
+
+    def get(self, request, *args, **kwargs):
         if DailyRecord.objects.filter(user=request.user, is_active=True).exists():
-            messages.warning(
-                request,
-                "Você já tem um plantão em aberto! Encerre-o antes de iniciar outro.",
-            )
+            messages.warning(request, self.ACTIVE_MESSAGE)
             return redirect("home")
-        return super().dispatch(request, *args, **kwargs)
+        return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
         hoje = timezone.now().date()
-
-        if DailyRecord.objects.filter(user=self.request.user, date=hoje).exists():
-            form.add_error(
-                None, "Você já abriu um plantão hoje! Verifique seu histórico."
-            )
-            return self.form_invalid(form)
-
         form.instance.user = self.request.user
         form.instance.date = hoje
 
+        # Um único INSERT: as restrições do banco (um plantão aberto por
+        # usuário, um plantão por dia) barram duplicatas, inclusive entre
+        # requisições simultâneas da web e do app.
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            conflict = DailyRecord.objects.shift_conflict(self.request.user, hoje)
+            if conflict == "active":
+                messages.warning(self.request, self.ACTIVE_MESSAGE)
+                return redirect("home")
+            if conflict == "date":
+                form.add_error(
+                    None, "Você já abriu um plantão hoje! Verifique seu histórico."
+                )
+                return self.form_invalid(form)
+            raise
+
         messages.success(self.request, "Jornada iniciada! Bom trabalho.")
-        return super().form_valid(form)
+        return response
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -65,6 +77,7 @@ class StartShiftView(LoginRequiredMixin, CreateView):
 
 
 class EndShiftView(LoginRequiredMixin, UpdateView):
+    metrics_tag = "end_shift"
     model = DailyRecord
     form_class = EndShiftForm
     template_name = "operations/shift_end.html"
@@ -319,30 +332,6 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
     def get_success_url(self):
         return reverse_lazy("dailyrecord_detail", kwargs={"pk": self.object.record.pk})
 
-    def form_valid(self, form):
-        response = super().form_valid(form)
-        self.recalculate_record_totals(self.object.record)
-        return response
-
-    def recalculate_record_totals(self, record):
-        """Re-soma todas as transações e atualiza o Registro Diário."""
-        incomes = (
-            record.transactions.filter(type="INCOME").aggregate(total=Sum("amount"))[
-                "total"
-            ]
-            or 0
-        )
-        costs = (
-            record.transactions.filter(type="COST").aggregate(total=Sum("amount"))[
-                "total"
-            ]
-            or 0
-        )
-
-        record.total_income = incomes
-        record.total_cost = costs
-        record.save()
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -385,32 +374,10 @@ class TransactionDeleteView(LoginRequiredMixin, SuccessMessageMixin, DeleteView)
         )
         return context
 
-    def form_valid(self, form):
-        record = self.object.record
-        response = super().form_valid(form)
-
-        # Recalcula APÓS deletar
-        incomes = (
-            record.transactions.filter(type="INCOME").aggregate(total=Sum("amount"))[
-                "total"
-            ]
-            or 0
-        )
-        costs = (
-            record.transactions.filter(type="COST").aggregate(total=Sum("amount"))[
-                "total"
-            ]
-            or 0
-        )
-
-        record.total_income = incomes
-        record.total_cost = costs
-        record.save()
-
-        return response
-
 
 class AddFinanceView(LoginRequiredMixin, View):
+    metrics_tag = "add_finance"
+
     def post(self, request, type, *args, **kwargs):
         active_shift = DailyRecord.objects.filter(
             user=request.user, is_active=True
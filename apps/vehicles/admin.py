@@ -14,12 +14,15 @@ class VehicleAdmin(admin.ModelAdmin):
     )
     list_filter = ("is_active", "fuel_type", "created_at")
     search_fields = ("model_name", "plate", "user__username")
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("recorded_km", "created_at", "updated_at")
     list_editable = ("is_active",)  # Permite ativar/desativar direto na lista
 
     fieldsets = (
         ("Identificação", {"fields": ("user", "model_name", "plate", "is_active")}),
-        ("Detalhes Técnicos", {"fields": ("fuel_type", "initial_km")}),
+        (
+            "Detalhes Técnicos",
+            {"fields": ("fuel_type", "initial_km", "recorded_km")},
+        ),
         (
             "Metadados",
             {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
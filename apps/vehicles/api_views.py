@@ -1,21 +1,68 @@
 from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from .models import Vehicle
-from .serializers import VehicleSerializer, VehicleMaintenanceSerializer
-from operations.models import Transaction, Maintenance
+from decimal import Decimal
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+from . import cache as vehicle_cache
+from .fleet import fleet_statistics
+from .models import Vehicle, METRIC_BLOCKS
+from .serializers import (
+    FuelHistorySerializer,
+    VehicleSerializer,
+    VehicleMaintenanceSerializer,
+)
+from operations.models import (
+    MAINTENANCE_PERIODS,
+    FuelCycle,
+    Maintenance,
+    Transaction,
+)
 from rest_framework import exceptions
 
 
+class HistoryCursorPagination(CursorPagination):
+    """Cursor dos históricos do veículo; `ordering` é definido por ação."""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
 class VehicleViewSet(viewsets.ModelViewSet):
     serializer_class = VehicleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Vehicle.objects.filter(user=self.request.user).order_by(
+        qs = Vehicle.objects.filter(user=self.request.user).order_by(
             "-is_active", "-id"
         )
 
+        if self.action in ("list", "retrieve"):
+            qs = qs.with_metrics(self.get_includes())
+
+        return qs
+
+    def get_includes(self):
+        """
+        Blocos pesados do VehicleSerializer: todos no detalhe e, nas demais
+        ações, apenas os pedidos em ?include=stats,consumption,maintenance.
+        """
+        if self.action == "retrieve":
+            return METRIC_BLOCKS
+
+        requested = self.request.query_params.get("include", "")
+        return tuple(
+            key for key in METRIC_BLOCKS if key in requested.split(",")
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["include"] = self.get_includes()
+        return context
+
     def get_object(self):
         """
         Sobrescreve a busca de um objeto específico (GET/PUT/DELETE /vehicles/ID/).
@@ -55,76 +102,157 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=user)
 
+    @action(detail=False, methods=["get"])
+    def fleet(self, request):
+        """
+        Comparativo de todos os veículos do usuário e totais da frota,
+        com número fixo de queries (ver vehicles.fleet). Exclusivo PRO.
+        """
+        if not getattr(request.user, "is_pro", False):
+            raise exceptions.PermissionDenied(
+                detail="🔒 A visão de frota é exclusiva do plano PRO. "
+                "Faça Upgrade para comparar seus veículos."
+            )
+
+        return Response(fleet_statistics(request.user))
+
     @action(detail=True, methods=["get"])
     def statistics(self, request, pk=None):
         """
-        Retorna dados detalhados para a dashboard do veículo.
-        Substitui a lógica complexa que existia na VehicleDetailView.
+        Retorna o resumo da dashboard do veículo. As listas completas ficam
+        nos sub-recursos paginados fuel-history e maintenance-history.
         """
         vehicle = self.get_object()
 
-        fuel_transactions = Transaction.objects.filter(
-            record__vehicle=vehicle, category__is_fuel=True, liters__gt=0
-        ).order_by("actual_km")
-
-        fuel_history = []
-        last_full_tank = None
-        pending_liters = 0
-        pending_cost = 0
-
-        for trans in fuel_transactions:
-            item = {
-                "id": trans.id,
-                "date": trans.created_at.strftime("%d/%m/%Y"),
-                "km": trans.actual_km,
-                "liters": float(trans.liters),
-                "cost": float(trans.amount),
-                "is_full": trans.is_full_tank,
-                "avg": None,
-                "cost_per_km": None,
-            }
+        summary = vehicle_cache.get_or_build(
+            vehicle.pk, "statistics", lambda: self.build_summary(vehicle)
+        )
 
-            if last_full_tank and trans.is_full_tank:
-                km_driven = trans.actual_km - last_full_tank.actual_km
-                total_liters_cycle = pending_liters + trans.liters
-                total_cost_cycle = pending_cost + trans.amount
+        return Response(
+            {
+                **summary,
+                "vehicle_data": VehicleSerializer(
+                    vehicle, context={"include": METRIC_BLOCKS}
+                ).data,
+            }
+        )
 
-                if km_driven > 0 and total_liters_cycle > 0:
-                    item["avg"] = round(km_driven / float(total_liters_cycle), 2)
-                    item["cost_per_km"] = round(float(total_cost_cycle) / km_driven, 2)
+    def build_summary(self, vehicle):
+        """Totais de combustível e manutenção, guardados em vehicles.cache."""
+        fills = Transaction.objects.filter(
+            record__vehicle=vehicle, category__is_fuel=True, liters__gt=0
+        ).aggregate(
+            count=Count("id"),
+            liters=Coalesce(Sum("liters"), Value(Decimal(0))),
+            cost=Coalesce(Sum("amount"), Value(Decimal(0))),
+        )
+        cycles = FuelCycle.objects.filter(
+            vehicle=vehicle, km_per_liter__isnull=False
+        ).aggregate(
+            km=Sum(F("end_km") - F("start_km")),
+            liters=Sum("liters"),
+            cost=Sum("cost"),
+        )
 
-                pending_liters = 0
-                pending_cost = 0
-                last_full_tank = trans
+        avg = cost_per_km = None
+        if cycles["km"]:
+            avg = round(cycles["km"] / float(cycles["liters"]), 2)
+            cost_per_km = round(float(cycles["cost"]) / cycles["km"], 2)
 
-            elif trans.is_full_tank:
-                last_full_tank = trans
-                pending_liters = 0
-                pending_cost = 0
+        maint_stats = Maintenance.objects.filter(vehicle=vehicle).by_type()
 
-            else:
-                pending_liters += trans.liters
-                pending_cost += trans.amount
+        return {
+            "fuel_summary": {
+                "fills": fills["count"],
+                "total_liters": float(fills["liters"]),
+                "total_cost": float(fills["cost"]),
+                "avg": avg,
+                "cost_per_km": cost_per_km,
+            },
+            "maintenance_summary": {
+                "count": sum(m["count"] for m in maint_stats),
+                "total": sum(float(m["total"]) for m in maint_stats),
+            },
+            "maintenance_stats": [
+                {"name": m["name"], "total": float(m["total"])} for m in maint_stats
+            ],
+        }
 
-            fuel_history.insert(0, item)
+    @action(detail=True, methods=["get"], url_path="maintenance-costs")
+    def maintenance_costs(self, request, pk=None):
+        """
+        Custos de manutenção agrupados no banco por tipo e por período
+        (?period=month|quarter|year), opcionalmente entre ?start= e ?end=
+        (AAAA-MM-DD).
+        """
+        vehicle = self.get_object()
 
-        maintenances = Maintenance.objects.filter(vehicle=vehicle).order_by("-date")
-        maint_serializer = VehicleMaintenanceSerializer(maintenances, many=True)
+        period = request.query_params.get("period", "month")
+        if period not in MAINTENANCE_PERIODS:
+            raise serializers.ValidationError(
+                {"period": "Use month, quarter ou year."}
+            )
 
-        maint_stats = {}
-        for m in maintenances:
-            label = m.get_type_display()
-            if label not in maint_stats:
-                maint_stats[label] = 0
-            maint_stats[label] += float(m.cost)
+        dates = {}
+        for key in ("start", "end"):
+            value = request.query_params.get(key)
+            try:
+                dates[key] = parse_date(value) if value else None
+            except ValueError:
+                dates[key] = None
+            if value and dates[key] is None:
+                raise serializers.ValidationError(
+                    {key: "Data inválida. Use o formato AAAA-MM-DD."}
+                )
 
-        maint_stats_list = [{"name": k, "total": v} for k, v in maint_stats.items()]
+        maintenances = Maintenance.objects.filter(vehicle=vehicle).in_period(**dates)
+        by_type = maintenances.by_type()
 
         return Response(
             {
-                "fuel_history": fuel_history,
-                "maintenances": maint_serializer.data,
-                "maintenance_stats": maint_stats_list,
-                "vehicle_data": VehicleSerializer(vehicle).data,
+                "period": period,
+                "start": dates["start"],
+                "end": dates["end"],
+                "total": float(sum(m["total"] for m in by_type)),
+                "by_type": [{**m, "total": float(m["total"])} for m in by_type],
+                "series": [
+                    {**p, "total": float(p["total"])}
+                    for p in maintenances.by_period(period)
+                ],
             }
         )
+
+    @action(detail=True, methods=["get"], url_path="fuel-history")
+    def fuel_history(self, request, pk=None):
+        """
+        Abastecimentos do veículo, do maior KM para o menor, paginados por
+        cursor. Os sem KM aparecem no fim.
+        """
+        vehicle = self.get_object()
+        fills = (
+            Transaction.objects.filter(
+                record__vehicle=vehicle, category__is_fuel=True, liters__gt=0
+            )
+            .select_related("fuel_cycle")
+            .annotate(sort_km=Coalesce("actual_km", -1))
+        )
+        return self.paginate_history(
+            fills, FuelHistorySerializer, ("-sort_km", "-id")
+        )
+
+    @action(detail=True, methods=["get"], url_path="maintenance-history")
+    def maintenance_history(self, request, pk=None):
+        """Manutenções do veículo, da mais recente para a mais antiga."""
+        vehicle = self.get_object()
+        return self.paginate_history(
+            Maintenance.objects.filter(vehicle=vehicle),
+            VehicleMaintenanceSerializer,
+            ("-date", "-id"),
+        )
+
+    def paginate_history(self, queryset, serializer_class, ordering):
+        paginator = HistoryCursorPagination()
+        paginator.ordering = ordering
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
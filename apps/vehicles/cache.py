@@ -0,0 +1,25 @@
+"""
+Cache das estatísticas por veículo.
+
+Cada veículo tem uma versão de dados (common.cache); os blocos de
+estatística ficam em chaves que incluem essa versão. Toda escrita em
+plantões, transações ou manutenções chama bump_version(), e as chaves
+antigas deixam de ser lidas.
+"""
+
+from common.cache import VersionedCache
+
+versions = VersionedCache(
+    "vehicle-stats", "VEHICLE_STATS_CACHE", "VEHICLE_STATS_CACHE_TIMEOUT"
+)
+
+get_version = versions.get_version
+bump_version = versions.bump_version
+get_or_build_many = versions.get_or_build_many
+
+
+def get_or_build(vehicle_id, block, builder):
+    """Lê o bloco `block` da versão atual ou o monta com `builder()`."""
+    return versions.get_or_build(
+        vehicle_id, get_version(vehicle_id), block, builder
+    )
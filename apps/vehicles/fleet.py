@@ -0,0 +1,166 @@
+"""
+Estatísticas da frota (plano PRO).
+
+Tudo sai de consultas agrupadas por veículo (plantões, combustível, ciclos
+de tanque cheio e manutenções): o número de queries é o mesmo para um ou
+para cem veículos.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from operations.models import DailyRecord, FuelCycle, Maintenance, Transaction
+from .models import Vehicle
+
+MAINTENANCE_LABELS = dict(Maintenance.TYPE_CHOICES)
+
+
+def _ratio(numerator, denominator, places=2):
+    if not denominator:
+        return 0
+    return round(float(numerator) / float(denominator), places)
+
+
+def _summary(income, cost, km, days_active, span_days, fuel, cycles, maintenance):
+    profit = income - cost
+    return {
+        "income": float(income),
+        "cost": float(cost),
+        "profit": float(profit),
+        "km": km,
+        "profit_per_km": _ratio(profit, km),
+        "days_active": days_active,
+        "utilisation": _ratio(days_active, span_days, places=3),
+        "fuel": {
+            "liters": float(fuel["liters"]),
+            "cost": float(fuel["cost"]),
+            "avg": _ratio(cycles["km"], cycles["liters"]),
+        },
+        "maintenance": {
+            "total": float(sum(maintenance.values())),
+            "by_type": [
+                {
+                    "type": key,
+                    "name": MAINTENANCE_LABELS.get(key, key),
+                    "total": float(value),
+                }
+                for key, value in sorted(maintenance.items())
+            ],
+        },
+    }
+
+
+def fleet_statistics(user, today=None):
+    """
+    Totais por veículo e da frota: ganhos, custos, lucro/km, média de
+    consumo (ciclos de tanque cheio), gasto de manutenção por tipo e
+    utilização (dias com plantão encerrado sobre os dias desde o primeiro).
+    """
+    today = today or timezone.localdate()
+    vehicles = list(
+        Vehicle.objects.filter(user=user)
+        .order_by("-is_active", "-id")
+        .values("id", "model_name", "plate", "is_active")
+    )
+    ids = [v["id"] for v in vehicles]
+
+    closed = Q(is_active=False, end_km__gte=F("start_km"))
+    records = {
+        row["vehicle_id"]: row
+        for row in DailyRecord.objects.filter(vehicle_id__in=ids)
+        .order_by()
+        .values("vehicle_id")
+        .annotate(
+            income=Sum("total_income"),
+            cost=Sum("total_cost"),
+            km=Sum(F("end_km") - F("start_km"), filter=closed),
+            days_active=Count("date", filter=closed, distinct=True),
+            first_date=Min("date"),
+            last_date=Max("date"),
+        )
+    }
+    fuel = {
+        row["record__vehicle_id"]: row
+        for row in Transaction.objects.filter(
+            record__vehicle_id__in=ids, category__is_fuel=True, liters__gt=0
+        )
+        .order_by()
+        .values("record__vehicle_id")
+        .annotate(liters=Sum("liters"), cost=Sum("amount"))
+    }
+    cycles = {
+        row["vehicle_id"]: row
+        for row in FuelCycle.objects.filter(
+            vehicle_id__in=ids, km_per_liter__isnull=False
+        )
+        .order_by()
+        .values("vehicle_id")
+        .annotate(km=Sum(F("end_km") - F("start_km")), liters=Sum("liters"))
+    }
+    maintenance = defaultdict(dict)
+    for row in (
+        Maintenance.objects.filter(vehicle_id__in=ids)
+        .order_by()
+        .values("vehicle_id", "type")
+        .annotate(total=Sum("cost"))
+    ):
+        maintenance[row["vehicle_id"]][row["type"]] = row["total"]
+
+    totals = dict.fromkeys(("income", "cost", "km", "days_active", "span_days"), 0)
+    fleet_fuel = {"liters": 0, "cost": 0}
+    fleet_cycles = {"km": 0, "liters": 0}
+    fleet_maintenance = defaultdict(int)
+
+    result = []
+    for vehicle in vehicles:
+        pk = vehicle["id"]
+        rec = records.get(pk, {})
+        vehicle_fuel = {key: fuel.get(pk, {}).get(key) or 0 for key in fleet_fuel}
+        vehicle_cycles = {
+            key: cycles.get(pk, {}).get(key) or 0 for key in fleet_cycles
+        }
+        span_days = (today - rec["first_date"]).days + 1 if rec else 0
+        values = {
+            "income": rec.get("income") or 0,
+            "cost": rec.get("cost") or 0,
+            "km": rec.get("km") or 0,
+            "days_active": rec.get("days_active") or 0,
+            "span_days": span_days,
+        }
+
+        for key, value in values.items():
+            totals[key] += value
+        for key in fleet_fuel:
+            fleet_fuel[key] += vehicle_fuel[key]
+        for key in fleet_cycles:
+            fleet_cycles[key] += vehicle_cycles[key]
+        for key, value in maintenance[pk].items():
+            fleet_maintenance[key] += value
+
+        result.append(
+            {
+                **vehicle,
+                "last_shift": rec.get("last_date"),
+                **_summary(
+                    fuel=vehicle_fuel,
+                    cycles=vehicle_cycles,
+                    maintenance=maintenance[pk],
+                    **values,
+                ),
+            }
+        )
+
+    return {
+        "vehicles": result,
+        "fleet": {
+            "vehicle_count": len(vehicles),
+            **_summary(
+                fuel=fleet_fuel,
+                cycles=fleet_cycles,
+                maintenance=fleet_maintenance,
+                **totals,
+            ),
+        },
+    }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from vehicles.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "Recalcula o hodômetro armazenado (recorded_km) de todos os veículos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Quantidade de veículos atualizados por UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(Vehicle.objects.order_by("pk").values_list("pk", flat=True))
+
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start : start + batch_size]
+            updated += Vehicle.objects.filter(
+                pk__gte=chunk[0], pk__lte=chunk[-1]
+            ).refresh_odometer()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Hodômetro recalculado para {updated} veículos.")
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.10 on 2026-10-17 23:40
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_recorded_km(apps, schema_editor):
+    Vehicle = apps.get_model("vehicles", "Vehicle")
+    DailyRecord = apps.get_model("operations", "DailyRecord")
+    Transaction = apps.get_model("operations", "Transaction")
+
+    records = (
+        DailyRecord.objects.filter(vehicle_id=OuterRef("pk"))
+        .order_by()
+        .values("vehicle_id")
+    )
+    transactions = (
+        Transaction.objects.filter(record__vehicle_id=OuterRef("pk"))
+        .order_by()
+        .values("record__vehicle_id")
+    )
+
+    def highest(qs, field):
+        return Coalesce(Subquery(qs.annotate(m=Max(field)).values("m")[:1]), Value(0))
+
+    Vehicle.objects.update(
+        recorded_km=Greatest(
+            highest(records, "end_km"),
+            highest(records, "start_km"),
+            highest(transactions, "actual_km"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0004_alter_vehicle_created_at'),
+        ('operations', '0010_alter_category_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='recorded_km',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Maior KM Registrado'),
+        ),
+        migrations.RunPython(populate_recorded_km, migrations.RunPython.noop),
+    ]
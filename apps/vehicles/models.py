@@ -1,9 +1,181 @@
 from django.db import models
-from django.db.models import Max
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    Max,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from common.models import TimeStampedModel
 
 
+# Blocos pesados que o VehicleSerializer só monta quando pedidos.
+METRIC_BLOCKS = ("stats", "consumption", "maintenance")
+
+
+class VehicleQuerySet(models.QuerySet):
+    def bump_odometer(self, km):
+        """
+        Avança o KM registrado para `km` apenas onde ele ainda é menor.
+        Usado nas inclusões, que nunca fazem o hodômetro voltar.
+        """
+        if not km:
+            return 0
+        return self.filter(recorded_km__lt=km).update(recorded_km=km)
+
+    def refresh_odometer(self):
+        """
+        Recalcula o KM registrado a partir do histórico (plantões e transações)
+        em um único UPDATE, para um ou para todos os veículos do queryset.
+        """
+        from operations.models import DailyRecord, Transaction
+
+        records = (
+            DailyRecord.objects.filter(vehicle_id=OuterRef("pk"))
+            .order_by()
+            .values("vehicle_id")
+        )
+        transactions = (
+            Transaction.objects.filter(record__vehicle_id=OuterRef("pk"))
+            .order_by()
+            .values("record__vehicle_id")
+        )
+
+        def highest(qs, field):
+            return Coalesce(
+                Subquery(qs.annotate(m=Max(field)).values("m")[:1]), Value(0)
+            )
+
+        return self.update(
+            recorded_km=Greatest(
+                highest(records, "end_km"),
+                highest(records, "start_km"),
+                highest(transactions, "actual_km"),
+            )
+        )
+
+    def with_stats(self):
+        """
+        Anota o bloco "stats" do VehicleSerializer (ganhos, custos, km, dias
+        ativos, manutenções) com subqueries agrupadas.
+        """
+        from operations.models import DailyRecord, Maintenance
+
+        money = DecimalField(max_digits=12, decimal_places=2)
+
+        def total(qs, expression, output_field=None):
+            return Coalesce(
+                Subquery(
+                    qs.annotate(t=expression).values("t")[:1],
+                    output_field=output_field,
+                ),
+                Value(0, output_field=output_field),
+            )
+
+        records = (
+            DailyRecord.objects.filter(vehicle_id=OuterRef("pk"))
+            .order_by()
+            .values("vehicle_id")
+        )
+        closed_records = records.filter(is_active=False)
+        # Só plantões com os dois KMs preenchidos entram na soma de KM;
+        # os dias ativos contam todos os encerrados.
+        measured_records = closed_records.filter(start_km__gt=0, end_km__gt=0)
+        maintenances = (
+            Maintenance.objects.filter(vehicle_id=OuterRef("pk"))
+            .order_by()
+            .values("vehicle_id")
+        )
+
+        return self.annotate(
+            total_earnings=total(records, Sum("total_income"), money),
+            total_costs=total(records, Sum("total_cost"), money),
+            total_km_history=total(
+                measured_records, Sum(F("end_km") - F("start_km"))
+            ),
+            days_active=total(closed_records, Count("id")),
+            total_maintenance=total(maintenances, Sum("cost"), money),
+            last_maintenance_date=Subquery(
+                maintenances.annotate(d=Max("date")).values("d")[:1]
+            ),
+        )
+
+    def with_metrics(self, include=METRIC_BLOCKS):
+        """
+        Anota o resumo usado pelo VehicleSerializer (próxima manutenção,
+        previsão pré-calculada e últimos abastecimentos) e, conforme
+        `include`, os históricos "consumption" e "maintenance" via prefetch.
+        Tudo com subqueries agrupadas: o número de queries não depende da
+        quantidade de veículos. O bloco "stats" sai do cache (ver
+        VehicleSerializer.load_stats), e with_stats() só é chamado para os
+        veículos que não o têm na versão atual.
+        """
+        from operations.models import DailyRecord, Maintenance, Transaction
+
+        due_transactions = Transaction.objects.filter(
+            record__vehicle_id=OuterRef("pk"), next_due_km__isnull=False
+        ).order_by("-created_at")
+        # Os dois últimos abastecimentos por KM, não por ordem de inclusão:
+        # um abastecimento lançado com atraso não passa a ser o "último".
+        fills = Transaction.objects.filter(
+            record__vehicle_id=OuterRef("pk"),
+            category__is_fuel=True,
+            actual_km__isnull=False,
+            liters__isnull=False,
+        ).order_by("-actual_km", "-id")
+
+        qs = self.select_related("maintenance_forecast").annotate(
+            next_maintenance_km=Subquery(
+                due_transactions.values("next_due_km")[:1]
+            ),
+            last_fill_km=Subquery(fills.values("actual_km")[:1]),
+            last_fill_liters=Subquery(fills.values("liters")[:1]),
+            prev_fill_km=Subquery(fills.values("actual_km")[1:2]),
+        )
+
+        if "maintenance" in include:
+            qs = qs.prefetch_related(
+                Prefetch(
+                    "maintenance_set",
+                    queryset=Maintenance.objects.order_by("-date")[:5],
+                    to_attr="recent_maintenances",
+                )
+            )
+
+        if "consumption" in include:
+            qs = qs.prefetch_related(
+                Prefetch(
+                    "dailyrecord_set",
+                    queryset=DailyRecord.objects.filter(
+                        transactions__category__is_fuel=True,
+                        transactions__actual_km__isnull=False,
+                        transactions__liters__isnull=False,
+                    )
+                    .distinct()
+                    .prefetch_related(
+                        Prefetch(
+                            "transactions",
+                            queryset=Transaction.objects.filter(
+                                category__is_fuel=True,
+                                actual_km__isnull=False,
+                                liters__isnull=False,
+                            ),
+                            to_attr="fuel_fills",
+                        )
+                    ),
+                    to_attr="fuel_records",
+                )
+            )
+
+        return qs
+
+
 class Vehicle(TimeStampedModel):
     FUEL_CHOICES = (
         ("GASOLINA", "Gasolina"),
@@ -24,24 +196,63 @@ class Vehicle(TimeStampedModel):
     )
     initial_km = models.PositiveIntegerField("Km Inicial no App")
     is_active = models.BooleanField("Ativo?", default=True)
+    recorded_km = models.PositiveIntegerField(
+        "Maior KM Registrado", default=0, editable=False
+    )
+
+    objects = VehicleQuerySet.as_manager()
 
     @property
     def current_odometer(self):
-        last_shift_km = self.dailyrecord_set.aggregate(m=Max("end_km"))["m"] or 0
-        current_shift_km = self.dailyrecord_set.aggregate(m=Max("start_km"))["m"] or 0
+        return max(self.initial_km, self.recorded_km)
+
+    def get_fuel_fills(self):
+        """
+        Abastecimentos com KM e litros, em ordem de KM. Usa o prefetch de
+        with_metrics() quando disponível.
+        """
+        if hasattr(self, "fuel_records"):
+            return sorted(
+                (t for r in self.fuel_records for t in r.fuel_fills),
+                key=lambda t: (t.actual_km, t.id),
+            )
+
         from operations.models import Transaction
 
-        last_trans_km = (
-            Transaction.objects.filter(record__vehicle=self).aggregate(
-                m=Max("actual_km")
-            )["m"]
-            or 0
+        return list(
+            Transaction.objects.filter(
+                record__vehicle=self,
+                category__is_fuel=True,
+                actual_km__isnull=False,
+                liters__isnull=False,
+            )
+            .select_related("record")
+            .order_by("actual_km", "id")
         )
 
-        return max(self.initial_km, last_shift_km, current_shift_km, last_trans_km)
-
     @property
     def fuel_average(self):
+        """
+        Média (km/l) entre os dois abastecimentos de maior KM, pelo caminho
+        disponível: prefetch de with_metrics(), anotações ou uma query.
+        """
+        from operations.fuel import FuelSeries
+
+        if hasattr(self, "fuel_records"):
+            return FuelSeries.from_transactions(
+                self.get_fuel_fills()[-2:]
+            ).latest_average()
+
+        if hasattr(self, "last_fill_km"):
+            if self.prev_fill_km is None:
+                return None
+            return FuelSeries.from_rows(
+                [
+                    (0, self.prev_fill_km, 0, 0, False),
+                    (1, self.last_fill_km, self.last_fill_liters, 0, False),
+                ]
+            ).latest_average()
+
         from operations.models import Transaction
 
         fills = Transaction.objects.filter(
@@ -49,35 +260,30 @@ class Vehicle(TimeStampedModel):
             category__is_fuel=True,
             actual_km__isnull=False,
             liters__isnull=False,
-        ).order_by("-created_at")[:2]
+        ).order_by("-actual_km", "-id")[:2]
 
-        if len(fills) < 2:
-            return None
-
-        last_fill = fills[0]
-        prev_fill = fills[1]
-
-        km_driven = last_fill.actual_km - prev_fill.actual_km
-        if km_driven <= 0 or last_fill.liters <= 0:
-            return 0
-
-        return km_driven / float(last_fill.liters)
+        return FuelSeries.from_transactions(list(fills)[::-1]).latest_average()
 
     @property
     def maintenance_status(self):
-        from operations.models import Transaction
+        if hasattr(self, "next_maintenance_km"):
+            due = self.next_maintenance_km
+        else:
+            from operations.models import Transaction
 
-        last_maint = (
-            Transaction.objects.filter(record__vehicle=self, next_due_km__isnull=False)
-            .order_by("-created_at")
-            .first()
-        )
+            due = (
+                Transaction.objects.filter(
+                    record__vehicle=self, next_due_km__isnull=False
+                )
+                .order_by("-created_at")
+                .values_list("next_due_km", flat=True)
+                .first()
+            )
 
-        if not last_maint:
+        if due is None:
             return None
 
         current = self.current_odometer
-        due = last_maint.next_due_km
         remaining = due - current
 
         if remaining <= 0:
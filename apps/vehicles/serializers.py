@@ -1,8 +1,8 @@
 from rest_framework import serializers
-from django.apps import apps
-from django.db.models import Sum
+from . import cache as vehicle_cache
 from .models import Vehicle
-from operations.models import Maintenance, DailyRecord, Transaction
+from operations.fuel import FuelSeries
+from operations.models import Maintenance, MaintenanceForecast, Transaction
 
 
 class VehicleMaintenanceSerializer(serializers.ModelSerializer):
@@ -26,10 +26,71 @@ class VehicleMaintenanceSerializer(serializers.ModelSerializer):
         return obj.date.strftime("%d/%m/%Y")
 
 
+class FuelHistorySerializer(serializers.ModelSerializer):
+    """Abastecimento com a média do ciclo que ele fecha (FuelCycle)."""
+
+    date = serializers.DateTimeField(source="created_at", format="%d/%m/%Y")
+    km = serializers.IntegerField(source="actual_km")
+    liters = serializers.FloatField()
+    cost = serializers.FloatField(source="amount")
+    is_full = serializers.BooleanField(source="is_full_tank")
+    avg = serializers.SerializerMethodField()
+    cost_per_km = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Transaction
+        fields = ["id", "date", "km", "liters", "cost", "is_full", "avg", "cost_per_km"]
+
+    def _cycle_value(self, obj, field):
+        cycle = getattr(obj, "fuel_cycle", None)
+        value = getattr(cycle, field, None)
+        return float(value) if value is not None else None
+
+    def get_avg(self, obj):
+        return self._cycle_value(obj, "km_per_liter")
+
+    def get_cost_per_km(self, obj):
+        return self._cycle_value(obj, "cost_per_km")
+
+
+class MaintenanceForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MaintenanceForecast
+        fields = [
+            "as_of",
+            "km_per_day",
+            "next_due_km",
+            "remaining_km",
+            "due_date",
+            "items",
+        ]
+
+
+class VehicleListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        vehicles = list(data.all() if hasattr(data, "all") else data)
+        if "stats" in self.child.include:
+            self.child.load_stats(vehicles)
+        return super().to_representation(vehicles)
+
+
 class VehicleSerializer(serializers.ModelSerializer):
+    """
+    Representação enxuta por padrão. Os blocos pesados (stats,
+    consumption_history, maintenance_history) só entram quando listados em
+    context["include"] (ver VehicleViewSet e o parâmetro ?include=).
+    """
+
+    INCLUDE_FIELDS = {
+        "stats": "stats",
+        "consumption": "consumption_history",
+        "maintenance": "maintenance_history",
+    }
+
     odometer = serializers.ReadOnlyField(source="current_odometer")
     fuel_average = serializers.ReadOnlyField()
     maintenance_status = serializers.ReadOnlyField()
+    maintenance_forecast = serializers.SerializerMethodField()
     formatted_created_at = serializers.SerializerMethodField()
 
     stats = serializers.SerializerMethodField()
@@ -48,6 +109,7 @@ class VehicleSerializer(serializers.ModelSerializer):
             "odometer",
             "fuel_average",
             "maintenance_status",
+            "maintenance_forecast",
             "created_at",
             "formatted_created_at",
             "stats",
@@ -55,6 +117,15 @@ class VehicleSerializer(serializers.ModelSerializer):
             "maintenance_history",
         ]
         read_only_fields = ["user", "created_at", "updated_at"]
+        list_serializer_class = VehicleListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get("include", ())
+        self.include = tuple(key for key in self.INCLUDE_FIELDS if key in requested)
+        for key, field_name in self.INCLUDE_FIELDS.items():
+            if key not in self.include:
+                self.fields.pop(field_name)
 
     def validate(self, data):
         """
@@ -121,75 +192,95 @@ class VehicleSerializer(serializers.ModelSerializer):
             )
         return value
 
-    def get_stats(self, obj):
-        total_maint = Maintenance.objects.filter(vehicle=obj).aggregate(Sum('cost'))['cost__sum'] or 0
-        last_maint = Maintenance.objects.filter(vehicle=obj).order_by('-date').first()
+    def to_representation(self, instance):
+        """
+        As métricas vêm anotadas por Vehicle.objects.with_metrics(). Instâncias
+        que não passaram por ele (create/update) são recarregadas uma vez.
+        """
+        if not hasattr(instance, "next_maintenance_km"):
+            instance = Vehicle.objects.with_metrics(self.include).get(
+                pk=instance.pk
+            )
+        return super().to_representation(instance)
+
+    def get_maintenance_forecast(self, obj):
+        forecast = getattr(obj, "maintenance_forecast", None)
+        if forecast is None:
+            return None
+        return MaintenanceForecastSerializer(forecast).data
 
-        financial_data = DailyRecord.objects.filter(vehicle=obj).aggregate(
-            total_earnings=Sum('total_income'),
-            total_cost=Sum('total_cost')
+    def load_stats(self, vehicles):
+        """
+        Põe em cada veículo o bloco "stats" da versão atual, lido do cache de
+        uma vez. Só os veículos sem bloco em cache passam pelas subqueries de
+        with_stats(), numa única consulta.
+        """
+        pending = {v.pk: v for v in vehicles if not hasattr(v, "cached_stats")}
+        if not pending:
+            return
+
+        stats = vehicle_cache.get_or_build_many(pending, "stats", self.build_stats_many)
+        for pk, vehicle in pending.items():
+            vehicle.cached_stats = stats[pk]
+
+    def build_stats_many(self, vehicle_ids):
+        vehicles = (
+            Vehicle.objects.filter(pk__in=vehicle_ids)
+            .with_metrics(include=())
+            .with_stats()
         )
-        earnings = float(financial_data['total_earnings'] or 0)
-        costs = float(financial_data['total_cost'] or 0)
-        profit = earnings - costs
+        return {vehicle.pk: self.build_stats(vehicle) for vehicle in vehicles}
 
-        records = DailyRecord.objects.filter(vehicle=obj, is_active=False)
-        total_km_history = sum((r.end_km - r.start_km) for r in records if r.end_km and r.start_km)
+    def get_stats(self, obj):
+        self.load_stats([obj])
+        return obj.cached_stats
 
-        last_tx_with_next_due = Transaction.objects.filter(
-            record__vehicle=obj, 
-            next_due_km__isnull=False
-        ).order_by('-created_at').first()
-        
-        next_km = last_tx_with_next_due.next_due_km if last_tx_with_next_due else None
+    def build_stats(self, obj):
+        earnings = float(obj.total_earnings)
+        costs = float(obj.total_costs)
+        profit = earnings - costs
+        total_km_history = obj.total_km_history or 0
+        days_active = obj.days_active
+        fuel_average = obj.fuel_average
 
         return {
             "total_earnings": earnings,
             "total_cost": costs,
             "profit_total": profit,
             "profit_per_km": round(profit / total_km_history, 2) if total_km_history > 0 else 0,
-            "days_active": records.count(),
+            "days_active": days_active,
             "total_km_history": total_km_history,
-            "fuel_average": float(obj.fuel_average) if obj.fuel_average else 0,
-            "total_maintenance": float(total_maint),
-            "last_maintenance_date": last_maint.date if last_maint else None,
-            "next_maintenance_km": next_km, # Agora vai enviar o valor correto (53914)
-            "avg_daily_km": round(total_km_history / records.count(), 1) if records.count() > 0 else 0,
+            "fuel_average": float(fuel_average) if fuel_average else 0,
+            "total_maintenance": float(obj.total_maintenance),
+            "last_maintenance_date": obj.last_maintenance_date,
+            "next_maintenance_km": obj.next_maintenance_km,
+            "avg_daily_km": round(total_km_history / days_active, 1) if days_active > 0 else 0,
         }
 
     def get_consumption_history(self, obj):
-        Transaction = apps.get_model("operations", "Transaction")
-
-        txs = Transaction.objects.filter(
-            record__vehicle=obj,
-            category__is_fuel=True,
-            actual_km__isnull=False,
-            liters__isnull=False,
-        ).order_by("actual_km")
+        fills = obj.get_fuel_fills()
+        intervals = FuelSeries.from_transactions(fills).intervals()
 
+        # Só a faixa plausível, como sempre: o desvio da mediana móvel
+        # (intervals["is_outlier"]) esconderia médias que o motorista espera ver.
         history = []
-        tx_list = list(txs)
-
-        for i in range(1, len(tx_list)):
-            prev = tx_list[i - 1]
-            curr = tx_list[i]
-            km_diff = curr.actual_km - prev.actual_km
-
-            if km_diff > 0 and curr.liters > 0:
-                avg = km_diff / float(curr.liters)
-                if 4 < avg < 70:
-                    history.append({
-                        "distancia": km_diff,
-                        "media": round(avg, 1),
-                        "date": curr.record.date.strftime("%d/%m"),
-                    })
+        for i, km_diff, avg, implausible in zip(
+            intervals["index"],
+            intervals["km_driven"],
+            intervals["average"],
+            intervals["is_implausible"],
+        ):
+            if not implausible:
+                history.append({
+                    "distancia": int(km_diff),
+                    "media": round(float(avg), 1),
+                    "date": fills[i].record.date.strftime("%d/%m"),
+                })
         return history[-6:]
 
     def get_maintenance_history(self, obj):
-        maints = Maintenance.objects.filter(vehicle=obj).order_by("-date")[:5]
-
         data = []
-        for m in maints:
+        for m in obj.recent_maintenances:
             data.append(
                 {
                     "id": m.id,
@@ -1,3 +1,861 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from operations.models import Category, DailyRecord, Maintenance, Transaction
+from vehicles import cache as vehicle_cache
+from vehicles.models import Vehicle
+
+# As contagens de consultas medem o app, não o DatabaseCache das versões.
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+class OdometerTests(TestCase):
+    """
+    KM registrado do veículo: inclusões só avançam (bump_odometer), edições
+    e exclusões recalculam pelo histórico (refresh_odometer).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+
+    def setUp(self):
+        self.onix = Vehicle.objects.create(
+            user=self.user, model_name="Onix", initial_km=1000
+        )
+        self.hb20 = Vehicle.objects.create(
+            user=self.user, model_name="HB20", initial_km=500
+        )
+
+    def record(self, day, start_km, end_km=None, vehicle=None):
+        return DailyRecord.objects.create(
+            user=self.user,
+            vehicle=vehicle or self.onix,
+            date=datetime.date(2025, 1, day),
+            start_km=start_km,
+            end_km=end_km,
+            is_active=end_km is None,
+        )
+
+    def recorded_km(self, vehicle=None):
+        vehicle = vehicle or self.onix
+        vehicle.refresh_from_db()
+        return vehicle.recorded_km
+
+    def test_bump_odometer_only_moves_forward(self):
+        vehicles = Vehicle.objects.filter(pk=self.onix.pk)
+
+        self.assertEqual(vehicles.bump_odometer(1500), 1)
+        self.assertEqual(vehicles.bump_odometer(1200), 0)
+        self.assertEqual(vehicles.bump_odometer(None), 0)
+        self.assertEqual(self.recorded_km(), 1500)
+
+    def test_refresh_odometer_uses_records_and_transactions(self):
+        record = self.record(1, 1000, 1200)
+        Transaction.objects.create(
+            record=record,
+            type="COST",
+            category=self.fuel,
+            amount=100,
+            actual_km=1250,
+            liters=20,
+        )
+        Vehicle.objects.update(recorded_km=9999)
+
+        self.assertEqual(Vehicle.objects.all().refresh_odometer(), 2)
+        self.assertEqual(self.recorded_km(), 1250)
+        # Sem histórico o KM registrado zera e vale o KM inicial.
+        self.assertEqual(self.recorded_km(self.hb20), 0)
+        self.assertEqual(self.hb20.current_odometer, 500)
+
+    def test_writes_keep_the_odometer_in_sync(self):
+        record = self.record(1, 1000)
+        self.assertEqual(self.recorded_km(), 1000)
+
+        record.end_km, record.is_active = 1300, False
+        record.save()
+        self.assertEqual(self.recorded_km(), 1300)
+
+        fill = Transaction.objects.create(
+            record=record,
+            type="COST",
+            category=self.fuel,
+            amount=100,
+            actual_km=1350,
+            liters=20,
+        )
+        self.assertEqual(self.recorded_km(), 1350)
+
+        # Correções para baixo recalculam em vez de só avançar.
+        fill.actual_km = 1280
+        fill.save()
+        self.assertEqual(self.recorded_km(), 1300)
+
+        record.end_km = 1200
+        record.save()
+        self.assertEqual(self.recorded_km(), 1280)
+
+        fill.delete()
+        self.assertEqual(self.recorded_km(), 1200)
+
+        record.delete()
+        self.assertEqual(self.recorded_km(), 0)
+
+    def test_moving_a_record_refreshes_both_vehicles(self):
+        self.record(1, 1000, 1100)
+        record = self.record(2, 1100, 1400)
+        self.assertEqual(self.recorded_km(), 1400)
+
+        record.vehicle = self.hb20
+        record.save()
+
+        self.assertEqual(self.recorded_km(), 1100)
+        self.assertEqual(self.recorded_km(self.hb20), 1400)
+
+    def test_moving_a_transaction_refreshes_both_vehicles(self):
+        record = self.record(1, 1000, 1100)
+        other = self.record(2, 500, 600, vehicle=self.hb20)
+        fill = Transaction.objects.create(
+            record=record,
+            type="COST",
+            category=self.fuel,
+            amount=100,
+            actual_km=1500,
+            liters=20,
+        )
+
+        fill.record = other
+        fill.save()
+
+        self.assertEqual(self.recorded_km(), 1100)
+        self.assertEqual(self.recorded_km(self.hb20), 1500)
+
+    def test_rebuild_odometers_command(self):
+        self.record(1, 1000, 1300)
+        self.record(2, 500, 800, vehicle=self.hb20)
+        Vehicle.objects.update(recorded_km=0)
+
+        out = StringIO()
+        call_command("rebuild_odometers", "--batch-size", "1", stdout=out)
+
+        self.assertIn("Hodômetro recalculado para 2 veículos.", out.getvalue())
+        self.assertEqual(self.recorded_km(), 1300)
+        self.assertEqual(self.recorded_km(self.hb20), 800)
+
+
+class FuelAverageTests(TestCase):
+    """
+    Os dois últimos abastecimentos são os de maior KM em todos os caminhos
+    de Vehicle.fuel_average, não os incluídos por último.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=user, model_name="Onix", initial_km=1000
+        )
+        fuel = Category.objects.get(user=user, name="Abastecimento")
+        record = DailyRecord.objects.create(
+            user=user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+            end_km=1500,
+            is_active=False,
+        )
+        # O abastecimento do KM 1200 é lançado por último, com atraso.
+        for km, liters in [(1000, 30), (1400, 25), (1200, 20)]:
+            Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=fuel,
+                amount=100,
+                actual_km=km,
+                liters=liters,
+            )
+
+    def test_latest_fills_are_ordered_by_km(self):
+        vehicles = Vehicle.objects.filter(pk=self.vehicle.pk)
+        paths = {
+            "query": vehicles.get(),
+            "annotations": vehicles.with_metrics(include=()).get(),
+            "prefetch": vehicles.with_metrics().get(),
+        }
+
+        for path, vehicle in paths.items():
+            with self.subTest(path=path):
+                self.assertEqual(vehicle.fuel_average, (1400 - 1200) / 25)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VehicleMetricsQueryTests(TestCase):
+    """
+    with_stats() e with_metrics() usam subqueries agrupadas e prefetch: o
+    número de consultas não pode crescer com veículos ou histórico.
+    """
+
+    # Veículos (com previsão e últimos abastecimentos anotados), manutenções
+    # recentes, plantões com abastecimento e os abastecimentos deles.
+    QUERIES = 4
+    # A listagem monta o bloco "stats" que falta no cache numa consulta só.
+    API_QUERIES = QUERIES + 1
+    URL = "/api/vehicles/?include=stats,consumption,maintenance"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.dates = (
+            datetime.date(2025, 1, 1) + datetime.timedelta(days=n)
+            for n in range(365)
+        )
+
+    def add_vehicle(self, days):
+        vehicle = Vehicle.objects.create(
+            user=self.user, model_name="Onix", initial_km=1000
+        )
+        for day in range(1, days + 1):
+            km = 1000 + day * 100
+            record = DailyRecord.objects.create(
+                user=self.user,
+                vehicle=vehicle,
+                date=next(self.dates),
+                start_km=km - 100,
+                end_km=km,
+                is_active=False,
+            )
+            Transaction.objects.create(
+                record=record, type="INCOME", category=self.income, amount=200
+            )
+            Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=self.fuel,
+                amount=60,
+                actual_km=km,
+                liters=10,
+                next_due_km=km + 5000,
+            )
+            Maintenance.objects.create(
+                user=self.user,
+                vehicle=vehicle,
+                date=record.date,
+                odometer=km,
+                cost=50,
+                type="OIL",
+            )
+        return vehicle
+
+    def load(self):
+        vehicles = list(
+            Vehicle.objects.filter(user=self.user).with_metrics().with_stats()
+        )
+        for vehicle in vehicles:
+            vehicle.fuel_average
+            vehicle.maintenance_status
+            vehicle.get_fuel_fills()
+            vehicle.recent_maintenances
+        return vehicles
+
+    def test_query_count_does_not_grow(self):
+        self.add_vehicle(days=1)
+        with self.assertNumQueries(self.QUERIES):
+            self.load()
+        with self.assertNumQueries(self.API_QUERIES):
+            self.client.get(self.URL)
+
+        for _ in range(4):
+            self.add_vehicle(days=10)
+        cache.clear()
+
+        with self.assertNumQueries(self.QUERIES):
+            vehicles = self.load()
+        with self.assertNumQueries(self.API_QUERIES):
+            response = self.client.get(self.URL)
+
+        self.assertEqual(len(vehicles), 5)
+        self.assertEqual(response.status_code, 200)
+        days_active = sorted(v["stats"]["days_active"] for v in response.data)
+        self.assertEqual(days_active, [1, 10, 10, 10, 10])
+
+    def test_stats_block_comes_from_cache(self):
+        self.add_vehicle(days=3)
+        self.client.get(self.URL)
+
+        # Com o bloco na versão atual, só sobram as consultas de with_metrics().
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(self.URL)
+
+        self.assertEqual(response.data[0]["stats"]["total_earnings"], 600)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VehicleIncludeTests(TestCase):
+    """Blocos pesados do VehicleSerializer só entram com ?include=."""
+
+    URL = "/api/vehicles/"
+    BLOCKS = {"stats", "consumption_history", "maintenance_history"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+        record = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+            end_km=1500,
+            is_active=False,
+        )
+        for km, liters in [(1000, 30), (1300, 30)]:
+            Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=fuel,
+                amount=150,
+                actual_km=km,
+                liters=liters,
+            )
+        Maintenance.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=record.date,
+            odometer=1500,
+            cost=80,
+            type="OIL",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def blocks(self, data):
+        return self.BLOCKS & data.keys()
+
+    def test_list_is_slim_by_default(self):
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.blocks(response.data[0]), set())
+        self.assertEqual(response.data[0]["odometer"], 1500)
+        self.assertEqual(response.data[0]["fuel_average"], 10)
+
+    def test_each_block_is_opt_in(self):
+        cases = {
+            "stats": "stats",
+            "consumption": "consumption_history",
+            "maintenance": "maintenance_history",
+        }
+        for include, field in cases.items():
+            with self.subTest(include=include):
+                data = self.client.get(self.URL, {"include": include}).data[0]
+                self.assertEqual(self.blocks(data), {field})
+
+        data = self.client.get(
+            self.URL, {"include": "stats,consumption,maintenance"}
+        ).data[0]
+        self.assertEqual(data["stats"]["total_km_history"], 500)
+        self.assertEqual(
+            data["consumption_history"],
+            [{"distancia": 300, "media": 10.0, "date": "01/01"}],
+        )
+        self.assertEqual([m["km"] for m in data["maintenance_history"]], [1500])
+
+    def test_unknown_values_are_ignored(self):
+        response = self.client.get(self.URL, {"include": "stats,history,,STATS"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.blocks(response.data[0]), {"stats"})
+
+    def test_detail_includes_every_block(self):
+        response = self.client.get(f"{self.URL}{self.vehicle.pk}/")
+
+        self.assertEqual(self.blocks(response.data), self.BLOCKS)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VehicleStatsInvalidationTests(TestCase):
+    """
+    Toda escrita que muda as estatísticas troca a versão do veículo (e a do
+    veículo antigo, numa mudança), e o bloco "stats" em cache deixa de valer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.onix, self.hb20, self.other = (
+            Vehicle.objects.create(user=self.user, model_name=name, initial_km=1000)
+            for name in ("Onix", "HB20", "Kwid")
+        )
+        self.record = DailyRecord.objects.create(
+            user=self.user,
+            vehicle=self.onix,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+            end_km=1100,
+            is_active=False,
+        )
+        self.transaction = Transaction.objects.create(
+            record=self.record, type="INCOME", category=self.income, amount=100
+        )
+        self.maintenance = Maintenance.objects.create(
+            user=self.user,
+            vehicle=self.onix,
+            date=self.record.date,
+            odometer=1100,
+            cost=50,
+            type="OIL",
+        )
+
+    def assertInvalidates(self, write, *vehicles):
+        """`write` troca a versão de `vehicles`, e só deles."""
+        everyone = (self.onix, self.hb20, self.other)
+        before = {v.pk: vehicle_cache.get_version(v.pk) for v in everyone}
+        write()
+        changed = {
+            v.pk for v in everyone if vehicle_cache.get_version(v.pk) != before[v.pk]
+        }
+        self.assertEqual(changed, {v.pk for v in vehicles})
+
+    def fresh(self, instance):
+        """Instância relida, como numa nova requisição."""
+        return type(instance).objects.get(pk=instance.pk)
+
+    def stats(self, vehicle):
+        response = self.client.get("/api/vehicles/?include=stats")
+        return next(v["stats"] for v in response.data if v["id"] == vehicle.pk)
+
+    def test_daily_record_writes(self):
+        def edit():
+            self.record.end_km = 1200
+            self.record.save()
+
+        def move():
+            self.record.vehicle = self.hb20
+            self.record.save()
+
+        self.assertInvalidates(edit, self.onix)
+        self.assertInvalidates(move, self.onix, self.hb20)
+        self.assertInvalidates(self.fresh(self.record).delete, self.hb20)
+
+    def test_transaction_writes(self):
+        other_record = DailyRecord.objects.create(
+            user=self.user,
+            vehicle=self.hb20,
+            date=datetime.date(2025, 1, 2),
+            start_km=1000,
+            end_km=1100,
+            is_active=False,
+        )
+
+        def edit():
+            self.transaction.amount = 150
+            self.transaction.save()
+
+        def move():
+            self.transaction.record = other_record
+            self.transaction.save()
+
+        self.assertInvalidates(
+            lambda: Transaction.objects.create(
+                record=self.record, type="INCOME", category=self.income, amount=5
+            ),
+            self.onix,
+        )
+        self.assertInvalidates(edit, self.onix)
+        self.assertInvalidates(move, self.onix, self.hb20)
+        self.assertInvalidates(self.fresh(self.transaction).delete, self.hb20)
+
+    def test_maintenance_writes(self):
+        def move():
+            self.maintenance.vehicle = self.hb20
+            self.maintenance.save()
+
+        self.assertInvalidates(move, self.onix, self.hb20)
+        self.assertInvalidates(self.fresh(self.maintenance).delete, self.hb20)
+
+    def test_category_and_vehicle_writes(self):
+        def rename_vehicle():
+            self.hb20.plate = "ABC1D23"
+            self.hb20.save()
+
+        def flag_category():
+            self.income.is_fuel = True
+            self.income.save()
+
+        self.assertInvalidates(rename_vehicle, self.hb20)
+        # Uma categoria pode mudar as estatísticas de qualquer veículo.
+        self.assertInvalidates(flag_category, self.onix, self.hb20, self.other)
+
+    def test_cached_block_is_rebuilt_after_a_move(self):
+        self.assertEqual(self.stats(self.onix)["total_earnings"], 100)
+        self.assertEqual(self.stats(self.hb20)["total_earnings"], 0)
+
+        self.record.vehicle = self.hb20
+        self.record.save()
+
+        self.assertEqual(self.stats(self.onix)["total_earnings"], 0)
+        self.assertEqual(self.stats(self.hb20)["total_earnings"], 100)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VehicleHistoryPaginationTests(TestCase):
+    """Históricos do veículo paginados por cursor (fuel/maintenance-history)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+        cls.record = DailyRecord.objects.create(
+            user=cls.user,
+            vehicle=cls.vehicle,
+            date=datetime.date(2025, 1, 1),
+            start_km=1000,
+            end_km=2000,
+            is_active=False,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill(self, km, liters=10):
+        return Transaction.objects.create(
+            record=self.record,
+            type="COST",
+            category=self.fuel,
+            amount=60,
+            actual_km=km,
+            liters=liters,
+        )
+
+    def maintenance(self, day):
+        return Maintenance.objects.create(
+            user=self.user,
+            vehicle=self.vehicle,
+            date=datetime.date(2025, 1, 1) + datetime.timedelta(days=day),
+            odometer=1000,
+            cost=50,
+            type="OIL",
+        )
+
+    def url(self, name, **params):
+        return f"/api/vehicles/{self.vehicle.pk}/{name}/", params
+
+    def pages(self, url, params, between=None):
+        """Ids de cada página, seguindo o cursor `next` até o fim."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["id"] for row in response.data["results"]])
+            if not response.data["next"]:
+                return pages
+            if between and len(pages) == 1:
+                between()
+            response = self.client.get(response.data["next"])
+
+    def test_fuel_history_order_and_page_size(self):
+        low, mid, tie_a, tie_b, high = (
+            self.fill(km) for km in (1100, 1300, 1500, 1500, 1900)
+        )
+        # Abastecimento sem KM vai para o fim; sem litros não entra.
+        no_km = self.fill(None)
+        self.fill(1700, liters=0)
+
+        pages = self.pages(*self.url("fuel-history", page_size=2))
+
+        self.assertEqual(
+            pages,
+            [[high.pk, tie_b.pk], [tie_a.pk, mid.pk], [low.pk, no_km.pk]],
+        )
+
+    def test_fuel_history_is_stable_across_inserts(self):
+        fills = [self.fill(km) for km in (1100, 1200, 1300, 1400)]
+
+        def insert():
+            # Um à frente do cursor (já passou) e um adiante, ainda por vir.
+            self.fill(1900)
+            self.later = self.fill(1150)
+
+        pages = self.pages(*self.url("fuel-history", page_size=2), between=insert)
+
+        self.assertEqual(
+            pages,
+            [[fills[3].pk, fills[2].pk], [fills[1].pk, self.later.pk], [fills[0].pk]],
+        )
+
+    def test_maintenance_history_default_page_size(self):
+        maintenances = [self.maintenance(day) for day in range(25)]
+
+        pages = self.pages(*self.url("maintenance-history"))
+
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        self.assertEqual(sum(pages, []), [m.pk for m in reversed(maintenances)])
+
+    def test_maintenance_history_is_stable_across_inserts(self):
+        maintenances = [self.maintenance(day) for day in range(4)]
+
+        def insert():
+            self.maintenance(30)
+            self.older = self.maintenance(-1)
+
+        pages = self.pages(
+            *self.url("maintenance-history", page_size=3), between=insert
+        )
+
+        newest_first = [m.pk for m in reversed(maintenances)]
+        self.assertEqual(pages, [newest_first[:3], newest_first[3:] + [self.older.pk]])
+
+    def test_page_size_is_capped(self):
+        for day in range(101):
+            self.maintenance(day)
+
+        response = self.client.get(*self.url("maintenance-history", page_size=500))
+
+        self.assertEqual(len(response.data["results"]), 100)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FleetTests(TestCase):
+    """Comparativo da frota (GET /api/vehicles/fleet/), exclusivo PRO."""
+
+    URL = "/api/vehicles/fleet/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista",
+            "motorista@example.com",
+            "senha-forte-123",
+            is_pro_legacy=True,
+        )
+        cls.income = Category.objects.create(
+            user=cls.user, name="Corridas", type="INCOME"
+        )
+        cls.fuel = Category.objects.get(user=cls.user, name="Abastecimento")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.dates = (
+            datetime.date(2025, 1, 1) + datetime.timedelta(days=n)
+            for n in range(365)
+        )
+
+    def add_vehicle(self, name, days, income=200, liters=20):
+        vehicle = Vehicle.objects.create(
+            user=self.user, model_name=name, initial_km=1000
+        )
+        for day in range(days):
+            km = 1000 + day * 300
+            record = DailyRecord.objects.create(
+                user=self.user,
+                vehicle=vehicle,
+                date=next(self.dates),
+                start_km=km,
+                end_km=km + 300,
+                is_active=False,
+            )
+            Transaction.objects.create(
+                record=record, type="INCOME", category=self.income, amount=income
+            )
+            Transaction.objects.create(
+                record=record,
+                type="COST",
+                category=self.fuel,
+                amount=liters * 6,
+                actual_km=km + 300,
+                liters=liters,
+                is_full_tank=True,
+            )
+            Maintenance.objects.create(
+                user=self.user,
+                vehicle=vehicle,
+                date=record.date,
+                odometer=km,
+                cost=40,
+                type="OIL" if day % 2 else "TIRES",
+            )
+        return vehicle
+
+    def test_requires_pro(self):
+        self.user.is_pro_legacy = False
+        self.user.save()
+
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_fleet_totals_match_vehicle_stats(self):
+        self.add_vehicle("Onix", days=3)
+        self.add_vehicle("HB20", days=5, income=150, liters=30)
+        self.add_vehicle("Kwid", days=0)
+
+        # Veículos, plantões, combustível, ciclos e manutenções.
+        with self.assertNumQueries(5):
+            data = self.client.get(self.URL).data
+        listing = self.client.get("/api/vehicles/", {"include": "stats"}).data
+        stats = {vehicle["id"]: vehicle["stats"] for vehicle in listing}
+
+        self.assertEqual(len(data["vehicles"]), 3)
+        for vehicle in data["vehicles"]:
+            with self.subTest(vehicle=vehicle["model_name"]):
+                expected = stats[vehicle["id"]]
+                self.assertEqual(vehicle["income"], expected["total_earnings"])
+                self.assertEqual(vehicle["cost"], expected["total_cost"])
+                self.assertEqual(vehicle["profit"], expected["profit_total"])
+                self.assertEqual(vehicle["km"], expected["total_km_history"])
+                self.assertEqual(vehicle["days_active"], expected["days_active"])
+                self.assertEqual(
+                    vehicle["maintenance"]["total"], expected["total_maintenance"]
+                )
+
+        fleet = data["fleet"]
+        self.assertEqual(fleet["vehicle_count"], 3)
+        for key in ("income", "cost", "profit", "km", "days_active"):
+            self.assertEqual(fleet[key], sum(v[key] for v in data["vehicles"]))
+        self.assertEqual(fleet["fuel"]["liters"], 3 * 20 + 5 * 30)
+        self.assertEqual(fleet["maintenance"]["total"], 8 * 40)
+        self.assertEqual(
+            {item["type"]: item["total"] for item in fleet["maintenance"]["by_type"]},
+            {"OIL": 3 * 40, "TIRES": 5 * 40},
+        )
+        # Média da frota pelos ciclos de tanque cheio: (2 + 4) ciclos de 300 km.
+        self.assertEqual(fleet["fuel"]["avg"], round(6 * 300 / (2 * 20 + 4 * 30), 2))
+
+
+class MaintenanceCostsTests(TestCase):
+    """GET /api/vehicles/<id>/maintenance-costs/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "motorista", "motorista@example.com", "senha-forte-123"
+        )
+        cls.vehicle = Vehicle.objects.create(
+            user=cls.user, model_name="Onix", initial_km=1000
+        )
+        for date, type, cost in (
+            (datetime.date(2024, 12, 20), "OIL", 100),
+            (datetime.date(2025, 1, 10), "OIL", 150),
+            (datetime.date(2025, 2, 5), "TIRES", 400),
+            (datetime.date(2025, 4, 1), "OIL", 120),
+        ):
+            Maintenance.objects.create(
+                user=cls.user,
+                vehicle=cls.vehicle,
+                date=date,
+                odometer=1000,
+                cost=cost,
+                type=type,
+            )
+        cls.url = f"/api/vehicles/{cls.vehicle.pk}/maintenance-costs/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_defaults_to_monthly_series_of_everything(self):
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(
+            (data["period"], data["start"], data["end"]), ("month", None, None)
+        )
+        self.assertEqual(data["total"], 770)
+        self.assertEqual(
+            [(row["period"], row["total"]) for row in data["series"]],
+            [("2024-12", 100), ("2025-01", 150), ("2025-02", 400), ("2025-04", 120)],
+        )
+
+    def test_filtered_quarterly_series(self):
+        response = self.client.get(
+            self.url, {"period": "quarter", "start": "2025-01-01", "end": "2025-03-31"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "period": "quarter",
+                "start": "2025-01-01",
+                "end": "2025-03-31",
+                "total": 550.0,
+                "by_type": [
+                    {"type": "TIRES", "name": "Pneus", "total": 400.0, "count": 1},
+                    {
+                        "type": "OIL",
+                        "name": "Troca de Óleo",
+                        "total": 150.0,
+                        "count": 1,
+                    },
+                ],
+                "series": [
+                    {
+                        "period": "2025-T1",
+                        "start": "2025-01-01",
+                        "total": 550.0,
+                        "count": 2,
+                    }
+                ],
+            },
+        )
+
+    def test_invalid_parameters(self):
+        for params, field in (
+            ({"period": "week"}, "period"),
+            ({"start": "2025-13-01"}, "start"),
+            ({"start": "01/02/2025"}, "start"),
+            ({"end": "ontem"}, "end"),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
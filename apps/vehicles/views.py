@@ -12,7 +12,8 @@ from django.contrib import messages
 from django.shortcuts import redirect
 from .models import Vehicle
 from .forms import VehicleForm
-from django.db.models import Sum, Max, Min
+from django.core.paginator import Paginator
+from django.db.models import F
 from operations.models import Transaction, Maintenance
 
 
@@ -94,6 +95,7 @@ class VehicleDetailView(LoginRequiredMixin, DetailView):
     model = Vehicle
     template_name = "vehicles/vehicle_detail.html"
     context_object_name = "vehicle"
+    maintenances_per_page = 10
 
     def get_queryset(self):
         return Vehicle.objects.filter(user=self.request.user)
@@ -103,61 +105,42 @@ class VehicleDetailView(LoginRequiredMixin, DetailView):
         vehicle = self.object
         is_pro = self.request.user.is_pro
 
-        fuel_transactions = Transaction.objects.filter(
-            record__vehicle=vehicle, category__is_fuel=True, liters__gt=0
-        ).order_by("actual_km")
+        fuel_transactions = (
+            Transaction.objects.filter(
+                record__vehicle=vehicle, category__is_fuel=True, liters__gt=0
+            )
+            .select_related("fuel_cycle")
+            .order_by(F("actual_km").desc(nulls_last=True), "-id")
+        )
 
         fuel_history = []
-        last_full_tank = None
-
-        pending_liters = 0
-        pending_cost = 0
-
         for trans in fuel_transactions:
-            item = {
-                "date": trans.created_at,
-                "km": trans.actual_km,
-                "liters": trans.liters,
-                "cost": trans.amount,
-                "is_full": trans.is_full_tank,
-                "avg": None,
-                "cost_per_km": None,
-            }
-
-            if last_full_tank and trans.is_full_tank:
-                km_driven = trans.actual_km - last_full_tank.actual_km
-                total_liters_cycle = pending_liters + trans.liters
-                total_cost_cycle = pending_cost + trans.amount
-
-                if km_driven > 0 and total_liters_cycle > 0:
-                    item["avg"] = km_driven / float(total_liters_cycle)
-                    item["cost_per_km"] = float(total_cost_cycle) / km_driven
-
-                pending_liters = 0
-                pending_cost = 0
-                last_full_tank = trans
-
-            elif trans.is_full_tank:
-                last_full_tank = trans
-                pending_liters = 0
-                pending_cost = 0
-
-            else:
-                pending_liters += trans.liters
-                pending_cost += trans.amount
-            fuel_history.insert(0, item)
+            cycle = getattr(trans, "fuel_cycle", None)
+            fuel_history.append(
+                {
+                    "date": trans.created_at,
+                    "km": trans.actual_km,
+                    "liters": trans.liters,
+                    "cost": trans.amount,
+                    "is_full": trans.is_full_tank,
+                    "avg": cycle.km_per_liter if cycle else None,
+                    "cost_per_km": cycle.cost_per_km if cycle else None,
+                }
+            )
 
         context["fuel_history"] = fuel_history
-        maintenances = Maintenance.objects.filter(vehicle=vehicle).order_by("-date")
-        context["maintenances"] = maintenances
-
-        maint_stats = {}
-        for m in maintenances:
-            if m.get_type_display() not in maint_stats:
-                maint_stats[m.get_type_display()] = 0
-            maint_stats[m.get_type_display()] += m.cost
-
-        context["maint_stats"] = maint_stats
+        # Histórico paginado: o gráfico por tipo já vem agregado do banco.
+        maintenances = Maintenance.objects.filter(vehicle=vehicle).order_by(
+            "-date", "-id"
+        )
+        context["maintenances"] = Paginator(
+            maintenances, self.maintenances_per_page
+        ).get_page(self.request.GET.get("maint_page"))
+
+        context["maint_stats"] = {
+            m["name"]: m["total"]
+            for m in Maintenance.objects.filter(vehicle=vehicle).by_type()
+        }
         context["is_pro"] = is_pro
 
         return context
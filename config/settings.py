@@ -130,6 +130,9 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 
     "allauth.account.middleware.AccountMiddleware",
+
+    # Por último: mede só a view (ver common.metrics).
+    "common.metrics.WriteMetricsMiddleware",
 ]
 
 # ---------------------------------------------------------------------
@@ -175,6 +178,66 @@ if database_url:
         database_url, conn_max_age=600
     )
 
+# ---------------------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------------------
+# Compartilhado entre os processos (workers do gunicorn, run_workers e os
+# comandos em lote): as versões de dados de vehicles.cache e core.cache só
+# invalidam o que todos leem. common.checks recusa backends locais a cada
+# processo nesses aliases.
+#
+# Com REDIS_URL o cache fica no Redis e um 304 da dashboard não toca o
+# banco. Sem ele, o DatabaseCache (tabela criada por `createcachetable`)
+# custa uma leitura da tabela de cache por 304.
+redis_url = os.getenv("REDIS_URL")
+if redis_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": redis_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
+
+# Estatísticas por veículo (vehicles.cache): alias e validade das chaves.
+VEHICLE_STATS_CACHE = "default"
+VEHICLE_STATS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Resumo da dashboard por usuário (core.cache).
+DASHBOARD_CACHE = "default"
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Totais dos plantões: "incremental" (delta por escrita) ou "full"
+# (reagrupa as transações a cada escrita). Ver operations.totals.
+OPERATIONS_TOTALS_MODE = os.getenv("OPERATIONS_TOTALS_MODE", "incremental")
+
+# Jobs em segundo plano (common.jobs): "sync" roda o recálculo de dados
+# derivados na própria requisição; "queue" grava jobs que os workers de
+# `manage.py run_workers` executam.
+JOBS = {
+    "MODE": os.getenv("JOBS_MODE", "sync"),
+    "BATCH_SIZE": 20,
+    "POLL_SECONDS": 1.0,
+    "LEASE_SECONDS": 300,
+    "MAX_ATTEMPTS": 5,
+}
+
+# Métricas dos caminhos de escrita (common.metrics), expostas em
+# /api/common/metrics/writes/ para administradores.
+WRITE_METRICS = {
+    "ENABLED": os.getenv("WRITE_METRICS_ENABLED", "True") == "True",
+    # Compartilhado: report() junta os buffers de todos os processos.
+    "CACHE": "default",
+    "WINDOW": 500,
+    "FLUSH_SECONDS": 30,
+}
+
 # ---------------------------------------------------------------------
 # PASSWORD VALIDATION
 # ---------------------------------------------------------------------